@@ -1,6 +1,6 @@
 import os
 import yaml
-from .config_defaults import DEFAULT_CONFIG
+from .config_defaults import DEFAULT_CONFIG, DEFAULT_RETENTION
 from .constants import (
     EMOJI_ID_ACK as EMOJI_ID_ACK,
     EMOJI_ID_THINK as EMOJI_ID_THINK,
@@ -28,6 +28,7 @@ HISTORY_FILE = os.path.join(DATA_DIR, "chat_history.jsonl")
 EPISODIC_FILE = os.path.join(DATA_DIR, "episodic_memory.jsonl")
 PERSONA_FILE = os.path.join(DATA_DIR, "personas.jsonl")
 IMPRESSION_FILE = os.path.join(DATA_DIR, "user_impressions.jsonl")
+MEMORY_DB_FILE = os.path.join(DATA_DIR, "memory.db")
 ACTIVE_PERSONA_FILE = os.path.join(DATA_DIR, "active_personas.json")
 MEMORY_STATE_FILE = os.path.join(DATA_DIR, "memory_state.json")
 SOCIAL_STATE_FILE = os.path.join(DATA_DIR, "social_state.json")
@@ -68,13 +69,20 @@ class ConfigManager:
             return False
     
     def _apply_config(self):
-        global MEM_CONF, HIGH_WATERMARK, SUMMARY_INTERVAL, MAX_HISTORY_LENGTH
+        global MEM_CONF, HIGH_WATERMARK, SUMMARY_INTERVAL, MAX_HISTORY_LENGTH, MEMORY_STORAGE, MEMORY_CACHE_MAX_SESSIONS, MEMORY_CACHE_MAX_MB, MEMORY_CHECKPOINT_INTERVAL
         global INT_CONF, RESPONSE_WAIT_TIME, GROUP_RESPONSE_WAIT_TIME, GROUP_FOCUS_WINDOW
         global GROUP_PASSIVE_RECORD_CHANCE, GROUP_PASSIVE_SAMPLING_THRESHOLD
         global FOCUS_MICRO_INTERVAL, FOCUS_MACRO_INTERVAL, WHITELIST, GROUP_WHITELIST, DEFAULT_PERSONA_NAME, ENABLE_SOCIAL_ENERGY, ENABLE_TOPIC_DETECTION
         global BILIBILI_LINK_EXTRACT_PRIVATE, BILIBILI_LINK_EXTRACT_GROUPS
         global MULTI_CONF, COMPRESS_TO_WEBP, GROUP_IMAGE_MODE
         global AI_CONF, AI_GLOBAL_SWITCH, AI_MENTION_ONLY, AI_ENABLE_GROUP, AI_ENABLE_PRIVATE, AI_SHOW_THINKING, AI_FORCE_NO_THINK_INST, AI_INTRO_WAIT_TIME
+        global LLM_CONF, LLM_HTTP2, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_KEEPALIVE_EXPIRY, LLM_REQUEST_TIMEOUT, LLM_WARMUP
+        global LLM_MAX_CONCURRENCY, LLM_CLASS_LIMITS, LLM_STREAM_REPLIES, LLM_STRUCTURED_OUTPUT
+        global LLM_CONTEXT_CACHE, LLM_CONTEXT_CACHE_TTL, LLM_CONTEXT_CACHE_MIN_CHARS
+        global LLM_ENDPOINTS, LLM_DECISION_TIMEOUT, LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN, LLM_HEDGE_DECISIONS, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_DEFAULT_DELAY
+        global LLM_ROUTES
+        global BUDGET_CONF, BUDGET_ENABLED, BUDGET_SOFT_DAILY, BUDGET_HARD_DAILY, BUDGET_SOFT_MICRO_INTERVAL, BUDGET_SESSIONS
+        global MON_CONF, MONITOR_PAYLOAD_PER_MINUTE, MONITOR_THUMBNAIL_SIZE, MONITOR_RETENTION, MONITOR_PRUNE_INTERVAL, MONITOR_VACUUM_PAGES, MONITOR_METRICS_WINDOW, MONITOR_IPC_PORT, MONITOR_SEARCH_PROMPT_CHARS
         global BASE_PERSONA_CONFIG, INITIAL_TRAITS
         
         merged = DEFAULT_CONFIG.copy()
@@ -89,6 +97,13 @@ class ConfigManager:
         HIGH_WATERMARK = MEM_CONF.get("high_watermark", 50)
         SUMMARY_INTERVAL = MEM_CONF.get("summary_interval", 35)
         MAX_HISTORY_LENGTH = HIGH_WATERMARK
+        # 记忆存储后端：jsonl / sqlite，只在启动时读取
+        MEMORY_STORAGE = MEM_CONF.get("storage", "jsonl")
+        # 聊天记录与情节记忆按会话懒加载，驻留内存的会话数与估算大小上限（0 为不限）
+        MEMORY_CACHE_MAX_SESSIONS = MEM_CONF.get("cache_max_sessions", 500)
+        MEMORY_CACHE_MAX_MB = MEM_CONF.get("cache_max_mb", 256)
+        # memory_state.json / social_state.json 的变化合并后最多每隔多少秒写一次（0 为每次变化都写）
+        MEMORY_CHECKPOINT_INTERVAL = MEM_CONF.get("checkpoint_interval", 5)
         
         INT_CONF = self._config.get("interaction", {})
         RESPONSE_WAIT_TIME = INT_CONF.get("response_wait_time", 2)
@@ -121,6 +136,47 @@ class ConfigManager:
         AI_FORCE_NO_THINK_INST = AI_CONF.get("force_no_thinking_instruction", True)
         AI_INTRO_WAIT_TIME = AI_CONF.get("intro_wait_time", 2)
 
+        LLM_CONF = self._config.get("llm", {})
+        LLM_HTTP2 = LLM_CONF.get("http2", True)
+        LLM_MAX_CONNECTIONS = LLM_CONF.get("max_connections", 20)
+        LLM_MAX_KEEPALIVE = LLM_CONF.get("max_keepalive_connections", 10)
+        LLM_KEEPALIVE_EXPIRY = LLM_CONF.get("keepalive_expiry", 120)
+        LLM_REQUEST_TIMEOUT = LLM_CONF.get("request_timeout", 60)
+        LLM_WARMUP = LLM_CONF.get("warmup_on_startup", True)
+        LLM_MAX_CONCURRENCY = LLM_CONF.get("max_concurrency", 8)
+        LLM_CLASS_LIMITS = LLM_CONF.get("class_limits", {})
+        LLM_STREAM_REPLIES = LLM_CONF.get("stream_replies", False)
+        LLM_STRUCTURED_OUTPUT = LLM_CONF.get("structured_output", False)
+        LLM_CONTEXT_CACHE = LLM_CONF.get("context_cache", False)
+        LLM_CONTEXT_CACHE_TTL = LLM_CONF.get("context_cache_ttl", 3600)
+        LLM_CONTEXT_CACHE_MIN_CHARS = LLM_CONF.get("context_cache_min_chars", 4000)
+        LLM_ENDPOINTS = LLM_CONF.get("endpoints", []) or []
+        LLM_DECISION_TIMEOUT = LLM_CONF.get("decision_timeout", 12)
+        LLM_BREAKER_THRESHOLD = LLM_CONF.get("breaker_failure_threshold", 3)
+        LLM_BREAKER_COOLDOWN = LLM_CONF.get("breaker_cooldown", 30)
+        LLM_HEDGE_DECISIONS = LLM_CONF.get("hedge_decisions", False)
+        LLM_HEDGE_MIN_DELAY = LLM_CONF.get("hedge_min_delay", 1.0)
+        LLM_HEDGE_DEFAULT_DELAY = LLM_CONF.get("hedge_default_delay", 3.0)
+        LLM_ROUTES = LLM_CONF.get("routes", {}) or {}
+
+        BUDGET_CONF = self._config.get("token_budget", {})
+        BUDGET_ENABLED = BUDGET_CONF.get("enabled", False)
+        BUDGET_SOFT_DAILY = BUDGET_CONF.get("soft_daily_tokens", 200000)
+        BUDGET_HARD_DAILY = BUDGET_CONF.get("hard_daily_tokens", 500000)
+        BUDGET_SOFT_MICRO_INTERVAL = BUDGET_CONF.get("soft_micro_interval", 30)
+        BUDGET_SESSIONS = BUDGET_CONF.get("sessions", {}) or {}
+
+        MON_CONF = self._config.get("monitor", {})
+        MONITOR_PAYLOAD_PER_MINUTE = MON_CONF.get("payload_capture_per_minute", 120)
+        MONITOR_THUMBNAIL_SIZE = MON_CONF.get("thumbnail_size", 128)
+        # 未配置的表沿用默认策略
+        MONITOR_RETENTION = {**DEFAULT_RETENTION, **(MON_CONF.get("retention") or {})}
+        MONITOR_PRUNE_INTERVAL = MON_CONF.get("prune_interval", 3600)
+        MONITOR_VACUUM_PAGES = MON_CONF.get("vacuum_pages", 2000)
+        MONITOR_METRICS_WINDOW = MON_CONF.get("metrics_window", 300)
+        MONITOR_IPC_PORT = MON_CONF.get("ipc_port", 8765)
+        MONITOR_SEARCH_PROMPT_CHARS = MON_CONF.get("search_prompt_chars", 2000)
+
         self._base_persona_config, self._initial_traits = self._config.get("persona_definitions", {}), self._config.get("initial_traits", {})
         if 'BASE_PERSONA_CONFIG' in globals():
             BASE_PERSONA_CONFIG.clear()
@@ -233,11 +289,14 @@ class ConfigManager:
 
 config_manager = ConfigManager()
 config = config_manager.get_config()
-MEM_CONF, INT_CONF, MULTI_CONF, AI_CONF = (
+MEM_CONF, INT_CONF, MULTI_CONF, AI_CONF, LLM_CONF, BUDGET_CONF, MON_CONF = (
     config_manager.get_section("memory"),
     config_manager.get_section("interaction"),
     config_manager.get_section("multimodal"),
-    config_manager.get_section("ai")
+    config_manager.get_section("ai"),
+    config_manager.get_section("llm"),
+    config_manager.get_section("token_budget"),
+    config_manager.get_section("monitor")
 )
 BASE_PERSONA_CONFIG, INITIAL_TRAITS = (
     config_manager.get_base_persona_config(),
@@ -1,9 +1,22 @@
+# 监控库各表的默认保留策略（未在 monitor.retention 中配置的表沿用这里的值）
+DEFAULT_RETENTION = {
+    "ai_logs": {"max_age_days": 14, "max_rows": 200000},
+    "ai_decisions": {"max_age_days": 14, "max_rows": 200000},
+    "llm_json_stats": {"max_age_days": 30, "max_rows": 0},
+    "config_changes": {"max_age_days": 365, "max_rows": 0},
+    "user_activity": {"max_age_days": 90, "max_rows": 0}
+}
+
 # 默认配置
 DEFAULT_CONFIG = {
     "memory": {
         "high_watermark": 50,
         "summary_interval": 35,
-        "enable_episodic": True
+        "enable_episodic": True,
+        "storage": "jsonl",
+        "cache_max_sessions": 500,
+        "cache_max_mb": 256,
+        "checkpoint_interval": 5
     },
     "interaction": {
         "response_wait_time": 2,
@@ -37,6 +50,81 @@ DEFAULT_CONFIG = {
         "force_no_thinking_instruction": False,
         "intro_wait_time": 2
     },
+    "llm": {
+        # 进程级共享 HTTP 客户端（长连接 + HTTP/2 多路复用）
+        "http2": True,
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 120,
+        "request_timeout": 60,
+        "warmup_on_startup": True,
+        # 流式回复：基于 streamGenerateContent，replies 中每闭合一条就立即发送
+        "stream_replies": False,
+        # 原生结构化输出：responseMimeType=application/json + 由格式说明自动生成的 responseSchema
+        "structured_output": False,
+        # 上下文缓存：回复提示词的稳定前缀（人格/印象/情节记忆）按 session_id:persona 存入 cachedContents
+        "context_cache": False,
+        "context_cache_ttl": 3600,
+        "context_cache_min_chars": 4000,
+        # 多端点故障转移：Gemini 兼容端点的基础地址列表（如 https://host/v1beta），为空时使用 GEMINI_URL
+        "endpoints": [],
+        # 决策类调用 (entry/micro/macro) 的单次请求超时，需小于专注循环的 15s 等待上限
+        "decision_timeout": 12,
+        # 断路器：连续失败次数阈值与熔断冷却时间（秒）
+        "breaker_failure_threshold": 3,
+        "breaker_cooldown": 30,
+        # 对冲请求：决策调用超过 p95 延迟仍未返回时向另一个端点再发一次（需至少两个端点）
+        "hedge_decisions": False,
+        "hedge_min_delay": 1.0,
+        "hedge_default_delay": 3.0,
+        # 按调用类型路由：model 为空时使用 GEMINI_URL 中的模型；thinking_budget 为 null 时使用调用方传入值/模型默认，
+        # 0 关闭思考、-1 动态预算；max_output_tokens 为 null 时不限制（思考 token 也计入该上限）
+        "routes": {
+            "entry": {"model": "", "thinking_budget": 128, "max_output_tokens": None},
+            "micro": {"model": "", "thinking_budget": 128, "max_output_tokens": None},
+            "macro": {"model": "", "thinking_budget": 128, "max_output_tokens": None},
+            "reply": {"model": "", "thinking_budget": None, "max_output_tokens": None},
+            "summary": {"model": "", "thinking_budget": None, "max_output_tokens": None},
+            "evolution": {"model": "", "thinking_budget": None, "max_output_tokens": None},
+            "trait_consolidation": {"model": "", "thinking_budget": None, "max_output_tokens": None}
+        },
+        # 请求调度：全局并发上限 + 各优先级类别并发上限 (reply > entry > micro > macro > background)
+        "max_concurrency": 8,
+        "class_limits": {
+            "reply": 4,
+            "entry": 3,
+            "micro": 3,
+            "macro": 2,
+            "background": 1
+        }
+    },
+    "token_budget": {
+        # 按会话统计每日 token 消耗 (prompt + candidates + thoughts)，超出预算后限制微观决策
+        "enabled": False,
+        "soft_daily_tokens": 200000,
+        "hard_daily_tokens": 500000,
+        # 超出软预算后，同一会话两次微观决策之间的最小间隔（秒）
+        "soft_micro_interval": 30,
+        # 按会话覆盖预算，如 {"123456": {"soft_daily_tokens": 50000, "hard_daily_tokens": 100000}}
+        "sessions": {}
+    },
+    "monitor": {
+        # 每分钟最多完整记录多少个 LLM 请求体（0 为不限）；超出后只记录耗时、token 与响应
+        "payload_capture_per_minute": 120,
+        # 请求中的图片只保存一份原图（按哈希去重），日志里保留该尺寸的缩略图
+        "thumbnail_size": 128,
+        # 按表的保留策略：max_age_days 按天数、max_rows 按行数（0 为不限），由机器人进程的后台写入线程定期清理
+        "retention": DEFAULT_RETENTION,
+        # 清理间隔（秒）与每次清理后增量 VACUUM 回收的最大页数
+        "prune_interval": 3600,
+        "vacuum_pages": 2000,
+        # 延迟指标中“最近”分位数的统计窗口（秒）
+        "metrics_window": 300,
+        # 机器人进程的本地事件通道端口（仅监听 127.0.0.1），监控网页据此实时获取活跃任务与调用记录；0 为关闭
+        "ipc_port": 8765,
+        # 全文搜索中每条 LLM 请求只索引提示词文本的最后若干字符（最新的上下文），0 为不索引提示词
+        "search_prompt_chars": 2000
+    },
     "persona_definitions": {
         "default": "我是 @Moeblack 开发的人工智能bot。性格友好、专业且简练。我具备长期记忆和性格演化功能。注意：我厌恶在群聊中长篇大论，更倾向于言简意赅的表达。"
     },
@@ -1,73 +1,36 @@
 import re
-import os
-import json
+import asyncio
 from typing import Union
 from ncatbot.core.event import PrivateMessageEvent, GroupMessageEvent
 from ncatbot.utils import ncatbot_config
 
-from ..memory import memory_manager
+from ..memory import memory_manager, persistence
 from .. import config
 from . import base
 
 
 async def _clear_session_from_files(session_id: str):
     """从持久化文件中清除指定会话的记录"""
-    data_dir = "data"
-    files_to_filter = ["chat_history.jsonl", "episodic_memory.jsonl"]
+    # 经由存储后端替换为空列表（JSONL 与 SQLite 通用）；否则会话被移出内存后会从存储重新加载
+    await asyncio.to_thread(persistence.rewrite_chat_history, session_id, [])
+    await asyncio.to_thread(persistence.rewrite_episodic_memory, session_id, [])
     
-    for fname in files_to_filter:
-        fpath = os.path.join(data_dir, fname)
-        if not os.path.exists(fpath):
-            continue
-        
-        kept = []
-        with open(fpath, 'r', encoding='utf-8') as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    record = json.loads(line)
-                    if record.get("session_id") != session_id:
-                        kept.append(line)
-                except json.JSONDecodeError:
-                    kept.append(line)
-        
-        with open(fpath, 'w', encoding='utf-8') as f:
-            f.writelines(kept)
-    
-    # 清理 memory_state.json 中该会话的计数器
-    state_file = os.path.join(data_dir, "memory_state.json")
-    if os.path.exists(state_file):
-        try:
-            with open(state_file, 'r', encoding='utf-8') as f:
-                state = json.load(f)
-            
-            # 从各计数器中移除该会话
-            for key in ["evolution_pity_counter", "unconsolidated_count", "current_topics"]:
-                if key in state and session_id in state[key]:
-                    del state[key][session_id]
-            
-            with open(state_file, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
-        except (json.JSONDecodeError, IOError):
-            pass  # 文件损坏时忽略
+    # 清理该会话的计数器：改内存中的状态再写入 memory_state.json（直接改文件会被下一次状态写入覆盖）
+    for counters in (memory_manager.evolution_pity_counter, memory_manager.unconsolidated_count, memory_manager.current_topics):
+        counters.pop(session_id, None)
+    memory_manager.save_memory_state()
 
 
 async def _clear_all_files():
     """清空所有记忆持久化文件"""
-    data_dir = "data"
-    files_to_clear = ["chat_history.jsonl", "episodic_memory.jsonl"]
+    # 经由存储后端清空（JSONL 与 SQLite 通用）；在线程中执行，等待进行中的压缩时不阻塞事件循环
+    await asyncio.to_thread(persistence.clear_all_records)
     
-    for fname in files_to_clear:
-        fpath = os.path.join(data_dir, fname)
-        if os.path.exists(fpath):
-            open(fpath, 'w').close()  # 清空文件
-    
-    # 重置状态文件
-    state_file = os.path.join(data_dir, "memory_state.json")
-    if os.path.exists(state_file):
-        with open(state_file, 'w', encoding='utf-8') as f:
-            json.dump({"evolution_pity_counter": {}, "unconsolidated_count": {}, "current_topics": {}}, f, ensure_ascii=False)
+    # 重置计数器（经由内存中的状态写入 memory_state.json）
+    memory_manager.evolution_pity_counter.clear()
+    memory_manager.unconsolidated_count.clear()
+    memory_manager.current_topics.clear()
+    memory_manager.save_memory_state()
 
 async def handle_commands(event: Union[PrivateMessageEvent, GroupMessageEvent], session_id: str, raw_msg: str, is_group: bool = False):
     """指令处理器"""
@@ -213,10 +176,8 @@ async def handle_commands(event: Union[PrivateMessageEvent, GroupMessageEvent],
             hard_mode = "--hard" in parts
             
             # 清除内存
-            if full_sid in memory_manager.chat_history:
-                memory_manager.chat_history[full_sid] = []
-            if full_sid in memory_manager.episodic_memory:
-                memory_manager.episodic_memory[full_sid] = []
+            memory_manager.chat_history[full_sid] = []
+            memory_manager.episodic_memory[full_sid] = []
             
             result = f"[Memory] 已清除 {full_sid} 的内存记忆"
             
@@ -225,7 +186,7 @@ async def handle_commands(event: Union[PrivateMessageEvent, GroupMessageEvent],
                 await _clear_session_from_files(full_sid)
                 result += "\n[Memory] 已从持久化文件中移除该会话记录"
             else:
-                result += "\n(软重置，重启后会从文件恢复。使用 --hard 彻底清除)"
+                result += "\n(软重置，会话被移出内存或重启后会从文件恢复。使用 --hard 彻底清除)"
             
             await send_reply(result)
             return
@@ -235,9 +196,11 @@ async def handle_commands(event: Union[PrivateMessageEvent, GroupMessageEvent],
             hard_mode = "--hard" in parts
             count = len(memory_manager.chat_history)
             
-            # 清除内存
-            memory_manager.chat_history.clear()
-            memory_manager.episodic_memory.clear()
+            # 清除内存：驻留的会话置为空列表（直接 clear 的话下次访问会立即从文件重新加载）
+            for sid in list(memory_manager.chat_history.keys()):
+                memory_manager.chat_history[sid] = []
+            for sid in list(memory_manager.episodic_memory.keys()):
+                memory_manager.episodic_memory[sid] = []
             
             result = f"[Memory] 已清除所有 {count} 个会话的内存记忆"
             
@@ -245,14 +208,14 @@ async def handle_commands(event: Union[PrivateMessageEvent, GroupMessageEvent],
                 await _clear_all_files()
                 result += "\n[Memory] 已清空所有持久化文件"
             else:
-                result += "\n(软重置，重启后会从文件恢复。使用 --hard 彻底清除)"
+                result += "\n(软重置，会话被移出内存或重启后会从文件恢复。使用 --hard 彻底清除)"
             
             await send_reply(result)
             return
         
         # 默认显示帮助
         help_text = """记忆管理指令 (仅 Root):
-/memory list - 列出所有活跃会话
+/memory list - 列出驻留内存的活跃会话
 /memory clear - 清除当前会话的记忆（软重置）
 /memory clear --hard - 彻底清除当前会话（含文件）
 /memory clear-all - 清除所有会话（软重置）
@@ -5,7 +5,8 @@ from ncatbot.core.event import PrivateMessageEvent, GroupMessageEvent
 from .. import config
 from ..memory import memory_manager
 from ..llm import get_json_response
-from ..utils import load_emoji_list
+from ..llm_budget import token_budget
+from ..utils import load_emoji_list, debug_print
 from ..monitor import log_ai_decision
 
 from .processor_utils import format_batch_to_xml, format_history_to_xml
@@ -85,7 +86,7 @@ async def fast_entry_decision(session_id: str, batch: list[Union[PrivateMessageE
     schema = '{' + ", ".join(schema_parts) + '}'
     
     sys_instr = "SPECIAL INSTRUCTION: not think silently at all. Silent thinking token budget: 0." if config.AI_FORCE_NO_THINK_INST else ""
-    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr)
+    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr, call_type="entry", session_id=session_id)
     if result and config.ENABLE_TOPIC_DETECTION and result.get("current_topic"):
         memory_manager.update_topic(full_session_id, result["current_topic"])
     if config.AI_FORCE_NO_THINK_INST and isinstance(result, dict) and result.get("reason"):
@@ -101,6 +102,12 @@ async def fast_entry_decision(session_id: str, batch: list[Union[PrivateMessageE
 async def fast_micro_decision(session_id: str, batch: list[Union[PrivateMessageEvent, GroupMessageEvent]], is_group: bool = False) -> dict:
     """微观决策：专注模式下每 5s 执行一次，判断是否回复或发表情或忽略"""
     start_time = time.time()
+    allowed, budget_reason = token_budget.allow_micro(session_id)
+    if not allowed:
+        debug_print(1, f"会话 {session_id} 跳过微观决策: {budget_reason}")
+        result = {"action": "ignore", "reason": budget_reason}
+        log_ai_decision("micro", session_id, result, budget_reason, "", 0)
+        return result
     combined_text = format_batch_to_xml(batch)
     persona_name = memory_manager.active_personas.get(session_id, config.DEFAULT_PERSONA_NAME)
     full_session_id = f"{session_id}:{persona_name}"
@@ -151,7 +158,7 @@ async def fast_micro_decision(session_id: str, batch: list[Union[PrivateMessageE
     schema = '{' + ", ".join(schema_parts) + '}'
     
     sys_instr = "SPECIAL INSTRUCTION: not think silently at all. Silent thinking token budget: 0." if config.AI_FORCE_NO_THINK_INST else ""
-    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr)
+    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr, call_type="micro", session_id=session_id)
     if result and config.ENABLE_TOPIC_DETECTION and result.get("current_topic"):
         memory_manager.update_topic(full_session_id, result["current_topic"])
     if config.AI_FORCE_NO_THINK_INST and isinstance(result, dict) and result.get("reason"):
@@ -211,7 +218,7 @@ async def fast_macro_decision(session_id: str, is_group: bool = False) -> dict:
     schema = '{' + ", ".join(schema_parts) + '}'
     
     sys_instr = "SPECIAL INSTRUCTION: not think silently at all. Silent thinking token budget: 0." if config.AI_FORCE_NO_THINK_INST else ""
-    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr)
+    result = await get_json_response(prompt, schema, thinking_budget=config.DEFAULT_THINKING_BUDGET, system_instruction=sys_instr, call_type="macro", session_id=session_id)
     if result and config.ENABLE_TOPIC_DETECTION and result.get("current_topic"):
         memory_manager.update_topic(full_session_id, result["current_topic"])
     if config.AI_FORCE_NO_THINK_INST and isinstance(result, dict) and result.get("reason"):
@@ -10,7 +10,7 @@ from ..utils import get_now_timestamp, debug_print
 from . import base
 from .base import SessionState
 from .processor import wait_and_trigger
-from .processor_utils import record_session_batch, fetch_and_inject_history
+from .processor_utils import record_session_batch, fetch_and_inject_history, enqueue_message
 from .commands import handle_commands
 from .link_utils.card_shortener import try_extract_and_shorten_bilibili_from_event
 
@@ -105,7 +105,7 @@ async def handle_group_message(event: GroupMessageEvent):
     # 5. 进入决策模式：将消息入队 + 防抖触发 AI 处理
     # 说明：白名单群在 @ / 唤醒词 / 专注窗口内，都会走到这里。
     # 之前的更新误删了这一段，导致消息通过鉴权后直接 return，从而看起来“没进入决策模式”。
-    state.message_queue.append(event)
+    enqueue_message(state, group_id, event, is_group=True)
     if state.timer_task:
         state.timer_task.cancel()
     state.timer_task = asyncio.create_task(wait_and_trigger(group_id, is_group=True, is_auto_trigger=False))
@@ -8,7 +8,7 @@ from ..utils import get_now_timestamp, debug_print
 from . import base
 from .base import SessionState
 from .processor import wait_and_trigger
-from .processor_utils import record_session_batch
+from .processor_utils import record_session_batch, enqueue_message
 from .commands import handle_commands
 from .link_utils.card_shortener import try_extract_and_shorten_bilibili_from_event
 
@@ -79,7 +79,7 @@ async def handle_private_message(event: PrivateMessageEvent):
     # 3. 消息记录与入队
     event.receive_time = get_now_timestamp()  # type: ignore
     await record_session_batch(user_id, [event], is_group=False)
-    state.message_queue.append(event)
+    enqueue_message(state, user_id, event, is_group=False)
     
     # 4. 触发回复逻辑 (私聊不使用专注模式)
     if state.timer_task:
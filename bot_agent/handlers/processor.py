@@ -9,6 +9,7 @@ from . import base
 from .decisions import fast_entry_decision, fast_micro_decision
 from .reply import execute_persona_reply
 from .processor_focus import start_focus_mode
+from .processor_utils import record_batch_taken
 
 async def wait_and_trigger(session_id: str, is_group: bool = False, is_auto_trigger: bool = False) -> None:
     try:
@@ -37,6 +38,7 @@ async def process_session_queue(session_id: str, is_group: bool, is_auto_trigger
                     await asyncio.sleep(wait_needed)
                     continue
                 batch, state.message_queue = state.message_queue[:], []
+                record_batch_taken(state, session_id, batch, is_group)
                 if is_group:
                     # 群聊：如果已经在专注模式里，则不再走准入决策，直接走微观决策
                     if state.is_in_focus:
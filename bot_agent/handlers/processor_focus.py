@@ -3,7 +3,7 @@ from .. import config
 from ..utils import get_now_timestamp, debug_print
 from ..monitor import update_active_task, remove_active_task
 from . import base
-from .processor_utils import fetch_and_inject_history
+from .processor_utils import fetch_and_inject_history, record_batch_taken
 from .decisions import fast_micro_decision, fast_macro_decision
 from .reply import execute_persona_reply
 
@@ -52,6 +52,7 @@ async def run_focus_loop(session_id: str, is_group: bool) -> None:
             if state.message_queue:
                 async with state.lock:
                     batch, state.message_queue = state.message_queue[:], []
+                    record_batch_taken(state, session_id, batch, is_group)
                     try:
                         update_active_task(session_id, "专注模式 (微观决策中...)", len(batch))
                         micro = await asyncio.wait_for(fast_micro_decision(session_id, batch, is_group), timeout=15.0)
@@ -1,3 +1,4 @@
+import time
 from typing import Union
 from ncatbot.core.event import PrivateMessageEvent, GroupMessageEvent
 from ncatbot.core.event.message_segment import Image, Text, At, Face, PlainText, AtAll, Reply, Json, XML, Share
@@ -6,6 +7,7 @@ from ..memory import memory_manager
 from .. import config
 from ..utils import format_timestamp
 from ..monitor import record_user_activity
+from ..metrics import MESSAGES_RECEIVED, DEBOUNCE_WAIT, SESSION_QUEUE_DEPTH, REPLY_LATENCY
 
 def parse_event_message(event: Union[PrivateMessageEvent, GroupMessageEvent], bot_uin: str) -> str:
     """解析消息事件中的消息段，转换为文本描述
@@ -35,6 +37,26 @@ def parse_event_message(event: Union[PrivateMessageEvent, GroupMessageEvent], bo
 
     return "".join(content_parts).strip() or event.raw_message
 
+def enqueue_message(state, session_id: str, event: Union[PrivateMessageEvent, GroupMessageEvent], is_group: bool) -> None:
+    """消息入队，记下精确的接收时刻（event.time 只精确到秒，且是服务端时间）供延迟指标使用"""
+    event.received_at = time.time()  # type: ignore
+    state.message_queue.append(event)
+    MESSAGES_RECEIVED.inc(chat="group" if is_group else "private")
+    SESSION_QUEUE_DEPTH.set(len(state.message_queue), session_id=session_id)
+
+def batch_received_at(batch: list[Union[PrivateMessageEvent, GroupMessageEvent]]) -> float:
+    """一批消息中最早一条的接收时刻"""
+    return min(getattr(e, "received_at", e.time) for e in batch)
+
+def record_batch_taken(state, session_id: str, batch: list[Union[PrivateMessageEvent, GroupMessageEvent]], is_group: bool) -> None:
+    """一批消息出队开始处理：记录防抖等待时间与会话剩余队列深度"""
+    DEBOUNCE_WAIT.observe(time.time() - batch_received_at(batch), chat="group" if is_group else "private")
+    SESSION_QUEUE_DEPTH.set(len(state.message_queue), session_id=session_id)
+
+def record_reply_sent(batch: list[Union[PrivateMessageEvent, GroupMessageEvent]], is_group: bool) -> None:
+    """本批的第一条回复已发出：记录端到端耗时"""
+    REPLY_LATENCY.observe(time.time() - batch_received_at(batch), chat="group" if is_group else "private")
+
 def format_batch_to_xml(batch: list[Union[PrivateMessageEvent, GroupMessageEvent]]) -> str:
     """将消息批次格式化为 XML 文本"""
     bot_uin = str(ncatbot_config.bt_uin) if ncatbot_config.bt_uin else ""
@@ -77,7 +99,7 @@ async def record_session_batch(session_id: str, batch: list[Union[PrivateMessage
         role_name = f"{nick}({uid})"
         msg_obj = {"role": role_name, "nickname": nick, "user_id": uid, "content": content, "time": time_str}
         memory_manager.chat_history[full_session_id].append(msg_obj)
-        memory_manager.save_message_to_file(full_session_id, role_name, content, event.time, nickname=nick, user_id=uid)
+        msg_obj["id"] = memory_manager.save_message_to_file(full_session_id, role_name, content, event.time, nickname=nick, user_id=uid)
         record_user_activity(session_id, uid, nick)
     
     # 检查是否需要触发记忆归档
@@ -130,7 +152,7 @@ async def fetch_and_inject_history(session_id: str, is_group: bool, count: int =
                 }
                 new_msgs.append(msg_obj)
                 # 同时持久化到文件
-                memory_manager.save_message_to_file(
+                msg_obj["id"] = memory_manager.save_message_to_file(
                     full_session_id, 
                     f"{nick}({uid})", 
                     content, 
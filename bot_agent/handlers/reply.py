@@ -1,5 +1,6 @@
 import base64
 import io
+import time
 import httpx
 import asyncio
 from typing import Any, Union, Dict
@@ -12,10 +13,12 @@ from ncatbot.utils import ncatbot_config
 from .. import config
 from ..memory import memory_manager
 from ..llm import get_json_response
+from ..llm_stream import get_streaming_json_response
 from ..utils import (
     format_timestamp, get_now_timestamp, debug_print, parse_cq_codes
 )
 from ..monitor import update_active_task
+from .processor_utils import record_reply_sent
 
 async def process_image_segment(seg: Image, session_id: str, is_group: bool, current_image_count: int, total_count: int) -> tuple[dict, str]:
     """处理消息段中的图片，返回 (image_part, debug_text)"""
@@ -53,6 +56,19 @@ async def process_image_segment(seg: Image, session_id: str, is_group: bool, cur
         debug_print(1, f"图片下载或转换失败: {e}")
         return {}, "[图片(处理失败)]"
 
+async def send_persona_reply(session_id: str, full_session_id: str, reply_text: str, bot: BotClient, is_group: bool = False) -> None:
+    """发送单条回复并写入工作记忆"""
+    if not reply_text.strip():
+        return
+    try:
+        await (bot.api.send_group_msg(group_id=int(session_id), message=parse_cq_codes(reply_text)) if is_group else bot.api.send_private_msg(user_id=int(session_id), message=parse_cq_codes(reply_text)))
+    except Exception as e:
+        debug_print(2, f"发送回复失败: {e}")
+    now_ts = get_now_timestamp()
+    msg_obj = {"role": "assistant", "content": reply_text, "time": format_timestamp(now_ts)}
+    memory_manager.chat_history[full_session_id].append(msg_obj)
+    msg_obj["id"] = memory_manager.save_message_to_file(full_session_id, "assistant", reply_text, now_ts)
+
 async def execute_persona_reply(session_id: str, batch: list[Union[PrivateMessageEvent, GroupMessageEvent]], bot: BotClient, is_group: bool = False) -> None:
     """执行正式的人格回复逻辑"""
     persona_name = memory_manager.active_personas.get(session_id, config.DEFAULT_PERSONA_NAME)
@@ -87,14 +103,16 @@ async def execute_persona_reply(session_id: str, batch: list[Union[PrivateMessag
         msg_text = "".join(content_parts).strip() or event.raw_message
         batch_texts.append(f'<user nick="{event.sender.nickname}" id="{event.user_id}">{msg_text}</user>')
 
-    full_prompt = memory_manager.generate_prompt(full_session_id, "\n".join(batch_texts).strip(), batch[-1].time, is_group=is_group)
+    # 稳定前缀（人格/印象/情节记忆）与易变后缀分开传递，前缀可被服务端缓存
+    prompt_prefix, full_prompt = memory_manager.generate_prompt_parts(full_session_id, "\n".join(batch_texts).strip(), batch[-1].time, is_group=is_group)
     if not full_prompt:
         return
     
     if is_group:
+        # 成员印象随本批发言者变化，放在后缀开头
         m_imps = [f"{e.sender.nickname}: {'；'.join(memory_manager.impressions.get(f'{session_id}:{e.user_id}:{persona_name}', []))}" for e in {ev.user_id: ev for ev in batch}.values() if memory_manager.impressions.get(f'{session_id}:{e.user_id}:{persona_name}', [])]
         if m_imps:
-            full_prompt = full_prompt.replace("</personality>", "</personality>\n<member_impressions>\n" + "\n".join(m_imps) + "\n</member_impressions>")
+            full_prompt = "<member_impressions>\n" + "\n".join(m_imps) + "\n</member_impressions>\n" + full_prompt
 
     update_active_task(session_id, "正在生成回复内容...", len(batch))
     
@@ -106,32 +124,55 @@ async def execute_persona_reply(session_id: str, batch: list[Union[PrivateMessag
     schema = '{' + ", ".join(schema_parts) + '}'
     
     sys_instr = "SPECIAL INSTRUCTION: not think silently at all. Silent thinking token budget: 0." if config.AI_FORCE_NO_THINK_INST else ""
-    result = await get_json_response(full_prompt, schema, files=image_parts, system_instruction=sys_instr)
+    result, streamed = None, 0
+    first_sent = False
+
+    async def send(reply_text: str):
+        # 第一条回复发出时记录端到端耗时（从本批最早一条消息到达算起）
+        nonlocal first_sent
+        await send_persona_reply(session_id, full_session_id, reply_text, bot, is_group)
+        if not first_sent and reply_text.strip():
+            first_sent = True
+            record_reply_sent(batch, is_group)
+
+    if config.LLM_STREAM_REPLIES:
+        last_send = 0.0
+
+        async def on_reply(reply_text: str):
+            # 流式模式：replies 中每闭合一条就立即发送，条与条之间仍保持最少 0.5s 间隔
+            nonlocal last_send
+            wait = 0.5 - (time.time() - last_send)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await send(reply_text)
+            last_send = time.time()
+
+        result = await get_streaming_json_response(full_prompt, schema, on_reply, files=image_parts, system_instruction=sys_instr, call_type="reply", session_id=session_id, prompt_prefix=prompt_prefix, cache_key=full_session_id)
+        streamed = result.get("streamed_count", 0) if isinstance(result, dict) else 0
+    if result is None:
+        result = await get_json_response(full_prompt, schema, files=image_parts, system_instruction=sys_instr, call_type="reply", session_id=session_id, prompt_prefix=prompt_prefix, cache_key=full_session_id)
     
     if not result:
         await (bot.api.send_group_msg(group_id=int(session_id), message=[{"type": "text", "data": {"text": "AI 思考超时了喵，请稍后再试。"}}] ) if is_group else bot.api.send_private_msg(user_id=int(session_id), message=[{"type": "text", "data": {"text": "AI 思考超时了喵，请稍后再试。"}}] ))
         return
 
-    replies = result.get("replies", []) or ([result["raw_error_content"]] if "raw_error_content" in result else ["AI 陷入了沉思，没有给出具体回复。"])
+    replies = result.get("replies", [])
+    if not replies and not streamed:
+        replies = [result["raw_error_content"]] if "raw_error_content" in result else ["AI 陷入了沉思，没有给出具体回复。"]
     if result.get("mood"):
         memory_manager.change_mood(session_id, result["mood"])
     if config.ENABLE_TOPIC_DETECTION and result.get("current_topic"):
         memory_manager.update_topic(full_session_id, result["current_topic"])
     
     # 仅在启用时扣除能量，否则按回复条数记录（内部 logic 会拦截但这里调用的语义更清晰）
-    energy_used = len(replies) - float(result.get("energy_adjustment", 0)) if config.ENABLE_SOCIAL_ENERGY else 0
+    energy_used = max(len(replies), streamed) - float(result.get("energy_adjustment", 0)) if config.ENABLE_SOCIAL_ENERGY else 0
     memory_manager.consume_social_energy(session_id, energy_used)
 
-    for reply_text in replies:
+    # 流式模式下已发送的条目跳过，只补发增量解析遗漏的部分
+    for reply_text in replies[streamed:]:
         if not reply_text.strip():
             continue
-        try:
-            await (bot.api.send_group_msg(group_id=int(session_id), message=parse_cq_codes(reply_text)) if is_group else bot.api.send_private_msg(user_id=int(session_id), message=parse_cq_codes(reply_text)))
-        except Exception as e:
-            debug_print(2, f"发送回复失败: {e}")
-        now_ts = get_now_timestamp()
-        memory_manager.chat_history[full_session_id].append({"role": "assistant", "content": reply_text, "time": format_timestamp(now_ts)})
-        memory_manager.save_message_to_file(full_session_id, "assistant", reply_text, now_ts)
+        await send(reply_text)
         await asyncio.sleep(0.5)
 
     memory_manager.check_and_trigger_consolidation(full_session_id, is_group=is_group)
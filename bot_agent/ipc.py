@@ -0,0 +1,155 @@
+import asyncio
+import inspect
+import json
+import time
+from . import config
+from .utils import get_now_str, debug_print
+
+# 每个订阅者最多积压的事件数，超出后断开该订阅者（重连时会重新拿到完整快照）
+_SUBSCRIBER_QUEUE = 1000
+# 单行消息上限
+_LINE_LIMIT = 16 * 1024 * 1024
+
+def _close_queue(queue: asyncio.Queue):
+    """丢弃未发送的事件并放入结束标记 None，让对应连接退出"""
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+class LiveHub:
+    """机器人进程内的实时状态与本地事件通道
+
+    活跃任务只保存在内存中（不再写入监控库），每次变化连同 LLM 调用、决策的摘要一起
+    推送给订阅者。监控网页进程通过 127.0.0.1:monitor.ipc_port 上的 TCP 连接订阅，
+    协议为按行分隔的 JSON：客户端发送 {"op": "subscribe"}，服务端先回一条 snapshot，
+    之后每行一个事件 (task / ai_log / ai_decision)。
+    客户端发送 {"op": "call", "method": ..., "params": {...}} 时调用 register() 注册的方法，
+    回复一行 {"ok": true, "result": ...} 或 {"ok": false, "error": ...} 后关闭连接。
+    方法在机器人的事件循环中执行，读写的是运行中的内存状态。
+    """
+    def __init__(self):
+        self.active_tasks: dict[str, dict] = {}
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._methods: dict[str, object] = {}
+        self.dropped_subscribers = 0
+
+    def register(self, name: str, func):
+        """注册可供监控网页调用的方法（普通函数或协程函数），参数与返回值须可 JSON 序列化"""
+        self._methods[name] = func
+
+    def set_task(self, session_id: str, status: str, message_count: int = 0):
+        task = {"session_id": session_id, "status": status, "message_count": message_count, "last_update": get_now_str(), "updated_at": time.time()}
+        self.active_tasks[session_id] = task
+        self.publish({"type": "task", "session_id": session_id, "task": task})
+
+    def remove_task(self, session_id: str):
+        if self.active_tasks.pop(session_id, None) is not None:
+            self.publish({"type": "task", "session_id": session_id, "task": None})
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "active_tasks": list(self.active_tasks.values())}
+
+    def publish(self, event: dict):
+        """向所有订阅者广播事件；可在任意线程调用，没有订阅者时几乎没有开销"""
+        if not self._subscribers or self._loop is None:
+            return
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._fan_out(event)
+        else:
+            self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _fan_out(self, event: dict):
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        for queue in list(self._subscribers):
+            if queue.full():
+                # 消费过慢：断开，由客户端重连后重新同步
+                self._subscribers.discard(queue)
+                self.dropped_subscribers += 1
+                _close_queue(queue)
+                continue
+            queue.put_nowait(line)
+
+    async def start(self):
+        """在当前事件循环中监听本地端口（monitor.ipc_port 为 0 时不启动）"""
+        if self._server is not None or not config.MONITOR_IPC_PORT:
+            return
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._server = await asyncio.start_server(self._handle, "127.0.0.1", int(config.MONITOR_IPC_PORT), limit=_LINE_LIMIT)
+            debug_print(1, f"本地事件通道已启动: 127.0.0.1:{config.MONITOR_IPC_PORT}")
+        except OSError as e:
+            debug_print(2, f"本地事件通道启动失败: {e}")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for queue in list(self._subscribers):
+            _close_queue(queue)
+        self._subscribers.clear()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            request = json.loads(line or b"{}")
+            if request.get("op") == "subscribe":
+                await self._stream(reader, writer)
+            elif request.get("op") == "call":
+                await self._call(request, writer)
+        except (ConnectionError, json.JSONDecodeError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            debug_print(2, f"本地事件通道连接出错: {e}")
+        finally:
+            writer.close()
+
+    async def _call(self, request: dict, writer: asyncio.StreamWriter):
+        name = request.get("method")
+        method = self._methods.get(name)
+        if method is None:
+            response = {"ok": False, "error": f"未知方法: {name}"}
+        else:
+            try:
+                result = method(**(request.get("params") or {}))
+                if inspect.isawaitable(result):
+                    result = await result
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                debug_print(2, f"本地调用 {name} 失败: {e}")
+                response = {"ok": False, "error": str(e)}
+        writer.write((json.dumps(response, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def _stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queue: asyncio.Queue = asyncio.Queue(_SUBSCRIBER_QUEUE)
+        # 快照与注册之间没有 await，不会漏掉事件
+        writer.write((json.dumps(self.snapshot(), ensure_ascii=False) + "\n").encode("utf-8"))
+        self._subscribers.add(queue)
+        # 订阅后客户端不再发送数据，read() 返回即表示连接已断开
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            await writer.drain()
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if closed in done:
+                    getter.cancel()
+                    return
+                line = getter.result()
+                if line is None:
+                    return
+                writer.write(line)
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+            closed.cancel()
+
+live_hub = LiveHub()
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+from . import config
+
+# 超过该时长未更新的活跃任务视为已失效（与旧版从监控库清理的阈值一致）
+_TASK_STALE_SECONDS = 300
+# 每个浏览器连接最多积压的事件数，超出后丢弃最早的事件
+_LISTENER_QUEUE = 500
+# 重连间隔（秒）：从 1 秒开始翻倍，最长 10 秒
+_RECONNECT_MIN, _RECONNECT_MAX = 1.0, 10.0
+# 本地调用：连接超时与等待结果的超时（秒）
+_CONNECT_TIMEOUT, _CALL_TIMEOUT = 2.0, 30.0
+
+class BotUnavailable(Exception):
+    """机器人未运行或本地事件通道已关闭 (monitor.ipc_port 为 0)"""
+
+async def call(method: str, **params):
+    """调用机器人进程中注册的方法（见 LiveHub.register）并返回结果
+
+    机器人不可达时抛出 BotUnavailable，方法执行出错时抛出 RuntimeError。
+    """
+    if not config.MONITOR_IPC_PORT:
+        raise BotUnavailable("本地事件通道已关闭 (monitor.ipc_port 为 0)")
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", int(config.MONITOR_IPC_PORT), limit=16 * 1024 * 1024), _CONNECT_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise BotUnavailable("机器人未运行，无法读取实时数据") from e
+    try:
+        writer.write((json.dumps({"op": "call", "method": method, "params": params}, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), _CALL_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise BotUnavailable(f"调用 {method} 时与机器人的连接中断") from e
+    finally:
+        writer.close()
+    if not line:
+        raise BotUnavailable(f"调用 {method} 时与机器人的连接中断")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error") or f"调用 {method} 失败")
+    return response.get("result")
+
+class LiveSubscriber:
+    """监控网页进程：订阅机器人进程的本地事件通道，缓存活跃任务并转发给浏览器 (SSE)
+
+    机器人未运行或连接断开时自动重连，重连后以快照覆盖本地缓存。
+    """
+    def __init__(self):
+        self.active_tasks: dict[str, dict] = {}
+        self.connected = False
+        self._listeners: set[asyncio.Queue] = set()
+
+    def tasks(self) -> list[dict]:
+        now = time.time()
+        tasks = [t for t in self.active_tasks.values() if now - t.get("updated_at", now) < _TASK_STALE_SECONDS]
+        return sorted(tasks, key=lambda t: t.get("updated_at", 0), reverse=True)
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "connected": self.connected, "active_tasks": self.tasks()}
+
+    def listen(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(_LISTENER_QUEUE)
+        self._listeners.add(queue)
+        return queue
+
+    def unlisten(self, queue: asyncio.Queue):
+        self._listeners.discard(queue)
+
+    def _broadcast(self, event: dict):
+        for queue in self._listeners:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _apply(self, event: dict):
+        kind = event.get("type")
+        if kind == "snapshot":
+            self.active_tasks = {t["session_id"]: t for t in event.get("active_tasks", [])}
+            # 浏览器收到的快照中附带连接状态
+            event = self.snapshot()
+        elif kind == "task":
+            if event.get("task") is None:
+                self.active_tasks.pop(event["session_id"], None)
+            else:
+                self.active_tasks[event["session_id"]] = event["task"]
+        self._broadcast(event)
+
+    def _disconnected(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self.active_tasks = {}
+        self._broadcast(self.snapshot())
+
+    async def run(self):
+        """在监控网页的事件循环中常驻运行"""
+        delay = _RECONNECT_MIN
+        while config.MONITOR_IPC_PORT:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", int(config.MONITOR_IPC_PORT), limit=16 * 1024 * 1024)
+                writer.write(b'{"op": "subscribe"}\n')
+                await writer.drain()
+                while line := await reader.readline():
+                    event = json.loads(line)
+                    if event.get("type") == "snapshot":
+                        self.connected, delay = True, _RECONNECT_MIN
+                    self._apply(event)
+            except (OSError, json.JSONDecodeError, ValueError):
+                pass
+            finally:
+                if writer is not None:
+                    writer.close()
+            self._disconnected()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RECONNECT_MAX)
+
+live_subscriber = LiveSubscriber()
@@ -3,19 +3,94 @@ import json
 import time
 import asyncio
 from typing import Any
-from .config import GEMINI_URL, GEMINI_API_KEY
-from .monitor import log_ai_interaction
+from . import config
+from .config import GEMINI_API_KEY
+from .monitor import log_ai_interaction, log_json_outcome, extract_usage, reset_request_trace
 from .utils import debug_print
+from .llm_scheduler import llm_scheduler
+from .llm_json import build_structured_config, repair_json
+from .llm_cache import resolve_prompt_prefix
+from .llm_budget import token_budget
+from .llm_endpoints import endpoint_pool
+from .llm_routes import resolve_route, apply_route
+from .metrics import LLM_LATENCY, LLM_QUEUE_WAIT, LLM_REQUESTS
 
-async def get_gemini_response(prompt: str, role: str = "user", files: list[dict[str, Any]] | None = None, thinking_budget: int | None = None, system_instruction: str | None = None):
-    """调用 Gemini API 获取响应"""
-    start_time = time.time()
-    headers = {
+# 进程级共享的 HTTP 客户端：复用 TCP/TLS 连接，避免每次调用都重新握手
+_http_client: httpx.AsyncClient | None = None
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 AsyncClient（懒加载；被关闭后会自动重建）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        use_http2 = config.LLM_HTTP2 and _http2_available()
+        if config.LLM_HTTP2 and not use_http2:
+            debug_print(2, "未安装 h2，LLM 客户端降级为 HTTP/1.1 (pip install 'httpx[http2]')")
+        _http_client = httpx.AsyncClient(
+            verify=False,
+            http2=use_http2,
+            timeout=config.LLM_REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+            )
+        )
+    return _http_client
+
+async def warmup_http_client():
+    """预热连接池：提前完成到各 LLM 端点所在主机的 TCP + TLS 握手"""
+    if not config.LLM_WARMUP:
+        return
+    client = get_http_client()
+    origins = {str(httpx.URL(ep.base_url).copy_with(path="/", query=None)) for ep in endpoint_pool.endpoints()}
+
+    async def warmup(origin: str):
+        start_time = time.time()
+        try:
+            # 只为建立连接，响应状态码无关紧要
+            await client.head(origin, timeout=10)
+            debug_print(1, f"LLM 连接预热完成 ({httpx.URL(origin).host}, {time.time() - start_time:.2f}s)")
+        except Exception as e:
+            debug_print(2, f"LLM 连接预热失败 ({origin}): {e}")
+
+    await asyncio.gather(*(warmup(o) for o in origins))
+
+async def close_http_client():
+    """关闭共享客户端，释放连接池"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+class _ConnectTimer:
+    """httpcore trace 回调：统计单次请求中 TCP 建连与 TLS 握手的耗时"""
+    def __init__(self):
+        self.connect_time = 0.0
+        self._started: dict[str, float] = {}
+
+    async def __call__(self, event_name: str, info: dict):
+        if not event_name.startswith(("connection.connect_tcp.", "connection.start_tls.")):
+            return
+        step, _, phase = event_name.rpartition(".")
+        if phase == "started":
+            self._started[step] = time.perf_counter()
+        elif phase in ("complete", "failed") and step in self._started:
+            self.connect_time += time.perf_counter() - self._started.pop(step)
+
+def _build_headers() -> dict:
+    return {
         "Content-Type": "application/json",
         "x-goog-api-key": GEMINI_API_KEY
     }
-    # ... (中间代码省略，apply_diff 会处理)
-    
+
+def _build_payload(prompt: str, role: str = "user", files: list[dict[str, Any]] | None = None, system_instruction: str | None = None, generation_config: dict | None = None, cached_content: str | None = None) -> dict:
     actual_prompt = prompt
     if system_instruction:
         actual_prompt = f"# SYSTEM PROMPT: {system_instruction}\n\n{prompt}"
@@ -33,69 +108,143 @@ async def get_gemini_response(prompt: str, role: str = "user", files: list[dict[
         ]
     }
 
-    # if thinking_budget is not None:
-    #     payload["generationConfig"] = {
-    #         "thinking_config": {
-    #             "include_thoughts": True,
-    #             "thinking_budget_tokens": thinking_budget
-    #         }
-    #     }
-    
-    async with httpx.AsyncClient(verify=False) as client:
-        try:
-            resp = await client.post(GEMINI_URL, headers=headers, json=payload, timeout=60)
+    # 思考预算与输出上限由路由合并进 generation_config（见 llm_routes.apply_route）
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    if cached_content:
+        # 稳定前缀已在 cachedContents 中，contents 只携带易变后缀
+        payload["cachedContent"] = cached_content
+    return payload
+
+def _extract_text(parts: list[dict]) -> str:
+    """拼接 parts 中的文本，过滤掉推理部分 (thought)"""
+    final_text = ""
+    for part in parts:
+        if "text" in part:
+            # 如果 AI 返回了 thought 字段，说明启用了 thinking 模式
+            if "thought" in part:
+                from .config import AI_SHOW_THINKING
+                if AI_SHOW_THINKING:
+                    final_text += f"> [Thinking]\n> {part['thought']}\n\n"
+            else:
+                final_text += part["text"]
+    return final_text
+
+class GeminiCallError(Exception):
+    """调用失败（HTTP 错误、网络错误、没有候选结果或文本），str 为失败说明"""
+
+async def _request_gemini(prompt: str, role: str = "user", files: list[dict[str, Any]] | None = None, thinking_budget: int | None = None, system_instruction: str | None = None, call_type: str | None = None, session_id: str | None = None, generation_config: dict | None = None, cached_content: str | None = None) -> str:
+    """调用 Gemini API，返回模型文本；失败时抛出 GeminiCallError
+
+    call_type 决定调度优先级 (reply/entry/micro/macro/summary/evolution/trait_consolidation)
+    以及 llm.routes 中的模型、思考预算与输出上限，session_id 用于同优先级内的会话轮询与监控归因。
+    """
+    route = resolve_route(call_type, thinking_budget)
+    headers = _build_headers()
+    payload = _build_payload(prompt, role, files, system_instruction, apply_route(generation_config, route), cached_content)
+
+    client = get_http_client()
+    resp = None
+    try:
+        connect_timer = _ConnectTimer()
+        async with llm_scheduler.slot(call_type, session_id) as queue_wait:
+            start_time = time.time()
+            # 由端点池选择端点，失败时故障转移；决策调用可对冲
+            resp, endpoint = await endpoint_pool.post(client, payload, headers, model=route["model"], call_type=call_type, trace=connect_timer)
             duration = time.time() - start_time
-            resp.raise_for_status()
-            data = resp.json()
-            
-            # 记录原始交互到监控数据库
-            from .config import GEMINI_MODEL
-            log_ai_interaction(payload, data, GEMINI_MODEL, duration)
-
-            # 提取生成的文本内容，过滤掉推理部分 (thought)
-            candidates = data.get('candidates', [])
-            if not candidates:
-                return f"Gemini 没有返回候选结果 (可能是内容被屏蔽): {data}"
-            
-            parts = candidates[0].get('content', {}).get('parts', [])
-            final_text = ""
-            for part in parts:
-                if "text" in part:
-                    # 如果 AI 返回了 thought 字段，说明启用了 thinking 模式
-                    if "thought" in part:
-                        from .config import AI_SHOW_THINKING
-                        if AI_SHOW_THINKING:
-                            final_text += f"> [Thinking]\n> {part['thought']}\n\n"
-                    else:
-                        final_text += part["text"]
-            return final_text.strip() or "AI 没有返回有效文本"
-        except httpx.HTTPStatusError as e:
-            error_detail = e.response.text
-            return f"Gemini 调用失败: {e.response.status_code} - {error_detail}"
-        except Exception as e:
-            return f"Gemini 调用失败: {e}"
+        LLM_LATENCY.observe(duration, call_type=call_type, model=route["model"])
+        LLM_QUEUE_WAIT.observe(queue_wait, call_type=call_type)
+        LLM_REQUESTS.inc(call_type=call_type, model=route["model"], status=resp.status_code)
+        resp.raise_for_status()
+        data = resp.json()
+        
+        # 记录原始交互到监控数据库（connect_time 为 0 说明复用了已有连接）
+        # 先计入预算再写库：跨天/首次调用时预算会从库中加载当天累计值，避免本次被重复计算
+        token_budget.record(session_id, extract_usage(data))
+        log_ai_interaction(payload, data, route["model"], duration, connect_time=connect_timer.connect_time, call_type=call_type, session_id=session_id, queue_wait=queue_wait, endpoint=endpoint.base_url)
+    except httpx.HTTPStatusError as e:
+        error_detail = e.response.text
+        raise GeminiCallError(f"Gemini 调用失败: {e.response.status_code} - {error_detail}") from e
+    except Exception as e:
+        if resp is None:
+            # 未拿到响应（网络错误、超时、端点全部熔断）
+            LLM_REQUESTS.inc(call_type=call_type, model=route["model"], status="error")
+        # 超时类异常的 str 为空，退回到异常类型名
+        raise GeminiCallError(f"Gemini 调用失败: {str(e) or type(e).__name__}") from e
 
-async def get_json_response(prompt: str, schema_desc: str, files: list[dict[str, Any]] | None = None, max_retries: int = 3, thinking_budget: int | None = None, system_instruction: str | None = None):
-    """获取 AI 的 JSON 响应，支持重试和清理"""
-    full_prompt = f"{prompt}\n\n请严格按照以下 JSON 格式输出：\n{schema_desc}\n注意：只返回 JSON 字符串，不要包含任何 markdown 格式标记。"
+    candidates = data.get('candidates', [])
+    if not candidates:
+        raise GeminiCallError(f"Gemini 没有返回候选结果 (可能是内容被屏蔽): {data}")
+    final_text = _extract_text(candidates[0].get('content', {}).get('parts', [])).strip()
+    if not final_text:
+        raise GeminiCallError("AI 没有返回有效文本")
+    return final_text
+
+async def get_gemini_response(prompt: str, role: str = "user", files: list[dict[str, Any]] | None = None, thinking_budget: int | None = None, system_instruction: str | None = None, call_type: str | None = None, session_id: str | None = None, generation_config: dict | None = None, cached_content: str | None = None) -> str:
+    """调用 Gemini API 获取响应文本；失败时返回失败说明（需要区分失败的调用方用 _request_gemini）"""
+    try:
+        return await _request_gemini(prompt, role, files, thinking_budget, system_instruction, call_type, session_id, generation_config, cached_content)
+    except GeminiCallError as e:
+        return str(e)
+
+def build_json_prompt(prompt: str, schema_desc: str) -> str:
+    return f"{prompt}\n\n请严格按照以下 JSON 格式输出：\n{schema_desc}\n注意：只返回 JSON 字符串，不要包含任何 markdown 格式标记。"
+
+def strip_json_fences(response: str) -> str:
+    """尝试清理可能存在的 markdown 代码块"""
+    clean_response = response.strip()
+    if clean_response.startswith("```json"):
+        clean_response = clean_response[7:]
+    if clean_response.endswith("```"):
+        clean_response = clean_response[:-3]
+    return clean_response.strip()
+
+async def get_json_response(prompt: str, schema_desc: str, files: list[dict[str, Any]] | None = None, max_retries: int = 3, thinking_budget: int | None = None, system_instruction: str | None = None, call_type: str | None = None, session_id: str | None = None, prompt_prefix: str | None = None, cache_key: str | None = None):
+    """获取 AI 的 JSON 响应，支持重试和清理
+
+    开启 llm.structured_output 时，以原生结构化输出 (responseMimeType + responseSchema) 请求，
+    schema 由 schema_desc 自动转换。每次调用的尝试次数与解析失败次数写入监控库。
+    标准解析失败时先用 repair_json 在本地修复（截断、围栏、尾随说明等），修复不了才重新请求。
+    prompt_prefix 为可缓存的稳定前缀（见 build_prompt_parts），cache_key 为其 cachedContents 归属 (session_id:persona)。
+    """
+    reset_request_trace()
+    # cachedContents 绑定模型，按路由后的模型创建
+    full_prompt, cached_content = await resolve_prompt_prefix(build_json_prompt(prompt, schema_desc), prompt_prefix, cache_key, resolve_route(call_type)["model"])
+    generation_config = build_structured_config(schema_desc) if config.LLM_STRUCTURED_OUTPUT else None
+    parse_failures = 0
     
     for attempt in range(max_retries):
-        response = await get_gemini_response(full_prompt, files=files, thinking_budget=thinking_budget, system_instruction=system_instruction)
-        # 尝试清理可能存在的 markdown 代码块
-        clean_response = response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
+        try:
+            response = await _request_gemini(full_prompt, files=files, thinking_budget=thinking_budget, system_instruction=system_instruction, call_type=call_type, session_id=session_id, generation_config=generation_config, cached_content=cached_content)
+        except GeminiCallError as e:
+            # 调用本身失败（5xx、429、内容被屏蔽等）：失败说明不是模型输出，不解析也不修复，直接重试
+            debug_print(0, f"LLM 调用失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)
+                continue
+            log_json_outcome(call_type, session_id, generation_config is not None, attempt + 1, parse_failures, False)
+            return {"raw_error_content": str(e)}
+        clean_response = strip_json_fences(response)
 
         try:
-            return json.loads(clean_response)
+            result = json.loads(clean_response)
+            # 调用方都按对象取字段，顶层为数组等其他类型时按解析失败处理
+            if not isinstance(result, dict):
+                raise json.JSONDecodeError("顶层不是 JSON 对象", clean_response, 0)
+            log_json_outcome(call_type, session_id, generation_config is not None, attempt + 1, parse_failures, True)
+            return result
         except json.JSONDecodeError as e:
+            parse_failures += 1
+            repaired = repair_json(response)
+            if repaired is not None:
+                debug_print(0, f"JSON 解析失败，已在本地修复 (尝试 {attempt + 1}/{max_retries}): {e}")
+                log_json_outcome(call_type, session_id, generation_config is not None, attempt + 1, parse_failures, True, repaired=True)
+                return repaired
             debug_print(0, f"JSON 解析失败 (尝试 {attempt + 1}/{max_retries}): {e}")
             debug_print(0, f"原始响应内容: {clean_response[:200]}...") # 打印前200字符辅助排查
             if attempt < max_retries - 1:
                 await asyncio.sleep(1) # 重试前稍作等待
             else:
+                log_json_outcome(call_type, session_id, generation_config is not None, attempt + 1, parse_failures, False)
                 return {"raw_error_content": response}
     return None
@@ -0,0 +1,73 @@
+import datetime
+import time
+from . import config
+from .utils import get_timezone
+
+def get_session_limits(session_id: str | None) -> tuple[int, int]:
+    """会话的 (软预算, 硬预算)，token_budget.sessions 中的配置优先"""
+    override = (config.BUDGET_SESSIONS or {}).get(str(session_id), {}) if session_id else {}
+    return int(override.get("soft_daily_tokens", config.BUDGET_SOFT_DAILY)), int(override.get("hard_daily_tokens", config.BUDGET_HARD_DAILY))
+
+def get_budget_status(session_id: str | None, used_tokens: int) -> str:
+    """ok / soft（超出软预算）/ hard（超出硬预算）"""
+    soft, hard = get_session_limits(session_id)
+    if hard and used_tokens >= hard:
+        return "hard"
+    if soft and used_tokens >= soft:
+        return "soft"
+    return "ok"
+
+class TokenBudget:
+    """按会话累计当天（本地时区）的 token 消耗，用于限制微观决策
+
+    - 超出软预算：同一会话两次微观决策之间至少间隔 soft_micro_interval 秒
+    - 超出硬预算：跳过微观决策并退出专注，直到次日
+    进程重启或跨天时从监控库重新加载当天的累计值。
+    """
+    def __init__(self):
+        self._day: str | None = None
+        self._usage: dict[str, int] = {}
+        self._last_micro: dict[str, float] = {}
+
+    def _roll_day(self):
+        today = datetime.datetime.now(get_timezone()).date().isoformat()
+        if today == self._day:
+            return
+        self._day, self._last_micro = today, {}
+        from .monitor_query import get_token_usage_by_session
+        self._usage = {row["session_id"]: row["total_tokens"] for row in get_token_usage_by_session(1)}
+
+    def record(self, session_id: str | None, usage: dict):
+        if not session_id or not usage:
+            return
+        self._roll_day()
+        self._usage[session_id] = self._usage.get(session_id, 0) + usage.get("total_tokens", 0)
+
+    def used(self, session_id: str) -> int:
+        self._roll_day()
+        return self._usage.get(session_id, 0)
+
+    def allow_micro(self, session_id: str) -> tuple[bool, str]:
+        """是否允许本次微观决策，不允许时返回原因"""
+        if not config.BUDGET_ENABLED:
+            return True, ""
+        status = get_budget_status(session_id, self.used(session_id))
+        if status == "hard":
+            # 原因中包含“退出专注”，专注循环据此退出
+            return False, "今日 token 预算已耗尽，退出专注并静默"
+        if status == "soft":
+            now = time.time()
+            if now - self._last_micro.get(session_id, 0) < config.BUDGET_SOFT_MICRO_INTERVAL:
+                return False, "已超出今日 token 软预算，微观决策降频"
+            self._last_micro[session_id] = now
+        return True, ""
+
+    def snapshot(self) -> dict:
+        self._roll_day()
+        result = {}
+        for session_id, used in self._usage.items():
+            soft, hard = get_session_limits(session_id)
+            result[session_id] = {"used": used, "soft": soft, "hard": hard, "status": get_budget_status(session_id, used)}
+        return result
+
+token_budget = TokenBudget()
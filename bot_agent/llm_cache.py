@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import time
+import httpx
+from . import config
+from .utils import debug_print
+from .llm_routes import default_model
+from .llm_endpoints import endpoint_pool
+
+# 创建失败的前缀指纹在这段时间（秒）内不再重试
+_FAILURE_BACKOFF = 600
+
+def get_cache_url(base_url: str) -> str:
+    """端点基础地址对应的 cachedContents 地址"""
+    return f"{base_url}/cachedContents"
+
+class PromptCacheManager:
+    """按 session_id:persona 管理 Gemini cachedContents
+
+    缓存内容即 build_prompt_parts 的稳定前缀；cachedContents 绑定模型与端点，指纹包含路由后的模型名和端点地址。
+    cachedContents 只存在于创建它的端点上，而请求由端点池选择端点并可能故障转移，
+    因此配置了多个端点时不使用缓存（仍保持前缀在最前，可命中服务端的隐式前缀缓存）。
+    人格特质、印象或情节记忆变化（或路由改到其他模型）后前缀指纹随之改变，
+    下次调用时自动重建缓存并删除旧缓存。创建失败（如前缀低于最小 token 数）的指纹会被记住，
+    一段时间内不再尝试，直接回退为完整提示词。
+    """
+    def __init__(self):
+        # cache_key -> {"fingerprint", "name", "expire_at", "endpoint"}
+        self._entries: dict[str, dict] = {}
+        # fingerprint -> 下次允许重试的时间
+        self._failed: dict[str, float] = {}
+        # 同一会话并发回复时只创建一次缓存
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _fingerprint(prefix: str, model: str, base_url: str) -> str:
+        return hashlib.sha256(f"{base_url}\n{model}\n{prefix}".encode("utf-8")).hexdigest()
+
+    async def get(self, cache_key: str, prefix: str, model: str | None = None) -> str | None:
+        """返回可用的 cachedContents 名称，不可用时返回 None"""
+        if len(prefix) < config.LLM_CONTEXT_CACHE_MIN_CHARS:
+            return None
+        endpoints = endpoint_pool.endpoints()
+        if len(endpoints) != 1:
+            return None
+        async with self._locks.setdefault(cache_key, asyncio.Lock()):
+            return await self._get_locked(cache_key, prefix, model or default_model(), endpoints[0].base_url)
+
+    async def _get_locked(self, cache_key: str, prefix: str, model: str, base_url: str) -> str | None:
+        fingerprint = self._fingerprint(prefix, model, base_url)
+        entry = self._entries.get(cache_key)
+        # 留出 60 秒余量，避免请求途中缓存过期
+        if entry and entry["fingerprint"] == fingerprint and entry["expire_at"] - 60 > time.time():
+            return entry["name"]
+        if self._failed.get(fingerprint, 0) > time.time():
+            return None
+
+        name = await self._create(prefix, model, base_url)
+        if entry:
+            await self._delete(entry["name"], entry["endpoint"])
+            self._entries.pop(cache_key, None)
+        if not name:
+            self._failed[fingerprint] = time.time() + _FAILURE_BACKOFF
+            return None
+        self._entries[cache_key] = {"fingerprint": fingerprint, "name": name, "expire_at": time.time() + config.LLM_CONTEXT_CACHE_TTL, "endpoint": base_url}
+        debug_print(0, f"已为 {cache_key} 创建上下文缓存 {name}")
+        return name
+
+    async def _create(self, prefix: str, model: str, base_url: str) -> str | None:
+        from .llm import get_http_client, _build_headers
+        body = {
+            "model": f"models/{model}",
+            "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+            "ttl": f"{int(config.LLM_CONTEXT_CACHE_TTL)}s"
+        }
+        try:
+            resp = await get_http_client().post(get_cache_url(base_url), headers=_build_headers(), json=body)
+            resp.raise_for_status()
+            return resp.json().get("name")
+        except httpx.HTTPStatusError as e:
+            debug_print(1, f"创建上下文缓存失败: {e.response.status_code} - {e.response.text[:200]}")
+        except Exception as e:
+            debug_print(1, f"创建上下文缓存失败: {e}")
+        return None
+
+    async def _delete(self, name: str, base_url: str):
+        from .llm import get_http_client, _build_headers
+        try:
+            await get_http_client().delete(f"{get_cache_url(base_url)}/{name.split('/')[-1]}", headers=_build_headers())
+        except Exception as e:
+            debug_print(0, f"删除上下文缓存失败: {e}")
+
+    def snapshot(self) -> dict:
+        return {key: {"name": e["name"], "expires_in": max(0, int(e["expire_at"] - time.time()))} for key, e in self._entries.items()}
+
+prompt_cache = PromptCacheManager()
+
+async def resolve_prompt_prefix(prompt: str, prompt_prefix: str | None, cache_key: str | None, model: str | None = None) -> tuple[str, str | None]:
+    """把稳定前缀与易变后缀组装为最终提示词，返回 (提示词, cachedContent 名称)
+
+    启用 llm.context_cache 且缓存可用时只发送后缀并引用缓存，否则前缀原样拼在最前面
+    （保持前缀在最前，服务端的隐式前缀缓存依然可以命中）。model 为本次调用路由到的模型。
+    """
+    if not prompt_prefix:
+        return prompt, None
+    if config.LLM_CONTEXT_CACHE and cache_key:
+        name = await prompt_cache.get(cache_key, prompt_prefix, model)
+        if name:
+            return prompt, name
+    return f"{prompt_prefix}\n{prompt}", None
@@ -0,0 +1,228 @@
+import asyncio
+import time
+from collections import deque
+import httpx
+from . import config
+from .config import GEMINI_URL
+from .monitor import update_endpoint_state
+from .llm_routes import default_model
+from .utils import debug_print
+
+# 断路器状态
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# 决策类调用：延迟敏感，使用更短的超时并可对冲
+DECISION_CALL_TYPES = ("entry", "micro", "macro")
+
+# p95 至少需要这么多样本才可信，之前使用 hedge_default_delay
+_MIN_SAMPLES = 20
+# 健康状态写入监控库的最小间隔（状态切换时立即写入）
+_PERSIST_INTERVAL = 5
+
+class EndpointError(Exception):
+    """端点返回 429 / 5xx，可以换一个端点重试"""
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"{response.status_code}")
+        self.response = response
+
+class NoEndpointAvailable(Exception):
+    pass
+
+class Endpoint:
+    """一个 Gemini 兼容端点及其健康状态"""
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.ewma_latency: float | None = None
+        self.latencies: deque[float] = deque(maxlen=100)
+        self._last_persist = 0.0
+
+    def url(self, model: str | None = None, action: str = "generateContent") -> str:
+        return f"{self.base_url}/models/{model or default_model()}:{action}"
+
+    def p95(self) -> float | None:
+        return _percentile(self.latencies, 0.95)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.base_url, "state": self.state, "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests, "total_failures": self.total_failures,
+            "ewma_latency": self.ewma_latency, "p95_latency": self.p95(), "in_flight": self.in_flight,
+            "opened_at": self.opened_at or None
+        }
+
+def _percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class EndpointPool:
+    """多端点故障转移
+
+    - 断路器：连续失败 breaker_failure_threshold 次后熔断，冷却 breaker_cooldown 秒后放行一个探测请求（半开），
+      探测成功即恢复，失败则重新熔断
+    - 选择：在可用端点中优先连续失败次数少的，再按延迟 EWMA × (1 + 进行中请求数) 选最小者，尚无样本的端点优先（用于探索）
+    - 对冲：决策类调用在 p95 延迟后仍未返回时，向另一个端点发出第二个请求，先返回者胜出，另一个被取消
+    """
+    def __init__(self):
+        self._endpoints: dict[str, Endpoint] = {}
+        self._call_latencies: dict[str, deque[float]] = {}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def endpoints(self) -> list[Endpoint]:
+        """按配置同步端点列表（支持热更新），未配置时使用 GEMINI_URL 所在的端点"""
+        urls = [u.rstrip("/") for u in (config.LLM_ENDPOINTS or []) if u] or [GEMINI_URL.split("/models/")[0]]
+        for url in urls:
+            if url not in self._endpoints:
+                self._endpoints[url] = Endpoint(url)
+        return [self._endpoints[u] for u in urls]
+
+    def _is_available(self, ep: Endpoint) -> bool:
+        if ep.state == CLOSED:
+            return True
+        if ep.state == OPEN and time.time() - ep.opened_at >= config.LLM_BREAKER_COOLDOWN:
+            self._set_state(ep, HALF_OPEN)
+        # 半开状态同一时间只放行一个探测请求
+        return ep.state == HALF_OPEN and ep.in_flight == 0
+
+    def select(self, exclude: set[str] | None = None) -> Endpoint | None:
+        candidates = [ep for ep in self.endpoints() if ep.base_url not in (exclude or set()) and self._is_available(ep)]
+        if not candidates:
+            return None
+        # 先看连续失败次数（尚未熔断但已在出错的端点靠后），再看负载加权的延迟
+        return min(candidates, key=lambda ep: (ep.consecutive_failures, (ep.ewma_latency or 0.0) * (1 + ep.in_flight)))
+
+    def _set_state(self, ep: Endpoint, state: str):
+        if ep.state != state:
+            debug_print(2 if state == OPEN else 1, f"LLM 端点 {ep.base_url}: {ep.state} -> {state}")
+            ep.state = state
+            if state == OPEN:
+                ep.opened_at = time.time()
+            self._persist(ep, force=True)
+
+    def _persist(self, ep: Endpoint, force: bool = False):
+        if force or time.time() - ep._last_persist >= _PERSIST_INTERVAL:
+            ep._last_persist = time.time()
+            update_endpoint_state(ep.to_dict())
+
+    def record_success(self, ep: Endpoint, latency: float | None = None, call_type: str | None = None):
+        """latency 为 None 时只更新健康状态（如流式请求，耗时不可与普通请求比较）"""
+        ep.total_requests += 1
+        ep.consecutive_failures = 0
+        if latency is not None:
+            ep.latencies.append(latency)
+            ep.ewma_latency = latency if ep.ewma_latency is None else 0.7 * ep.ewma_latency + 0.3 * latency
+            if call_type:
+                self._call_latencies.setdefault(call_type, deque(maxlen=200)).append(latency)
+        if ep.state != CLOSED:
+            self._set_state(ep, CLOSED)
+        else:
+            self._persist(ep)
+
+    def record_failure(self, ep: Endpoint):
+        ep.total_requests += 1
+        ep.total_failures += 1
+        ep.consecutive_failures += 1
+        if ep.state == HALF_OPEN or ep.consecutive_failures >= config.LLM_BREAKER_THRESHOLD:
+            if ep.state == OPEN:
+                ep.opened_at = time.time()
+            self._set_state(ep, OPEN)
+        else:
+            self._persist(ep)
+
+    def hedge_delay(self, call_type: str | None) -> float:
+        samples = self._call_latencies.get(call_type or "")
+        if not samples or len(samples) < _MIN_SAMPLES:
+            return config.LLM_HEDGE_DEFAULT_DELAY
+        return max(config.LLM_HEDGE_MIN_DELAY, _percentile(samples, 0.95) or 0)
+
+    async def _send(self, client: httpx.AsyncClient, ep: Endpoint, payload: dict, headers: dict, model: str | None, timeout: float | None, call_type: str | None, trace) -> httpx.Response:
+        ep.in_flight += 1
+        start = time.perf_counter()
+        transport_failed = False
+        try:
+            kwargs = {"headers": headers, "json": payload, "extensions": {"trace": trace} if trace else {}}
+            if timeout:
+                kwargs["timeout"] = timeout
+            resp = await client.post(ep.url(model), **kwargs)
+        except httpx.TransportError:
+            transport_failed = True
+            raise
+        finally:
+            # 对冲败者被取消时不计入失败
+            ep.in_flight -= 1
+            if transport_failed:
+                # 连接失败、超时等：计入断路器
+                self.record_failure(ep)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            self.record_failure(ep)
+            raise EndpointError(resp)
+        # 4xx 是请求本身的问题，不计入端点健康度
+        self.record_success(ep, time.perf_counter() - start, call_type)
+        return resp
+
+    async def _hedged(self, client, first: Endpoint, tried: set[str], payload, headers, model, timeout, call_type, trace) -> tuple[httpx.Response, Endpoint]:
+        tasks = {asyncio.create_task(self._send(client, first, payload, headers, model, timeout, call_type, trace)): first}
+        try:
+            done, _ = await asyncio.wait(tasks.keys(), timeout=self.hedge_delay(call_type))
+            if not done:
+                second = self.select(exclude=tried)
+                if second is not None:
+                    tried.add(second.base_url)
+                    self.hedges_fired += 1
+                    debug_print(0, f"{call_type} 请求超过对冲延迟，向 {second.base_url} 发出对冲请求")
+                    tasks[asyncio.create_task(self._send(client, second, payload, headers, model, timeout, call_type, trace))] = second
+            pending, last_exc = set(tasks.keys()), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] is not first:
+                            self.hedges_won += 1
+                        return task.result(), tasks[task]
+                    last_exc = task.exception()
+            raise last_exc or NoEndpointAvailable("对冲请求全部失败")
+        finally:
+            # 败者（以及调用方被取消时的全部请求）一律取消
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def post(self, client: httpx.AsyncClient, payload: dict, headers: dict, model: str | None = None, call_type: str | None = None, trace=None) -> tuple[httpx.Response, Endpoint]:
+        """发送 generateContent 请求，失败时依次转移到其他可用端点
+
+        所有端点都返回 429/5xx 时返回最后一个响应，由调用方按原有方式处理错误状态码。
+        """
+        is_decision = call_type in DECISION_CALL_TYPES
+        timeout = config.LLM_DECISION_TIMEOUT if is_decision else None
+        hedge = is_decision and config.LLM_HEDGE_DECISIONS
+        tried: set[str] = set()
+        last_error: Exception | None = None
+        last_ep: Endpoint | None = None
+        while (ep := self.select(exclude=tried)) is not None:
+            tried.add(ep.base_url)
+            last_ep = ep
+            try:
+                if hedge:
+                    return await self._hedged(client, ep, tried, payload, headers, model, timeout, call_type, trace)
+                return await self._send(client, ep, payload, headers, model, timeout, call_type, trace), ep
+            except (EndpointError, httpx.TransportError) as e:
+                debug_print(1, f"LLM 端点 {ep.base_url} 请求失败 ({type(e).__name__}: {e})，尝试故障转移")
+                last_error = e
+        if isinstance(last_error, EndpointError) and last_ep is not None:
+            return last_error.response, last_ep
+        if last_error:
+            raise last_error
+        raise NoEndpointAvailable("所有 LLM 端点均处于熔断状态")
+
+    def snapshot(self) -> dict:
+        return {"endpoints": [ep.to_dict() for ep in self.endpoints()], "hedges_fired": self.hedges_fired, "hedges_won": self.hedges_won}
+
+endpoint_pool = EndpointPool()
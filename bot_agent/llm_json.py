@@ -0,0 +1,267 @@
+import re
+import json
+from functools import lru_cache
+
+# 调用方沿用的 JSON 格式说明是一种"伪 JSON"：
+#   {"reply": boolean, "action": "ignore"|"emoji"|"reply", "reason": "理由", "replies": ["string"]}
+# 这里把它转换成 Gemini generationConfig.responseSchema 所需的 OpenAPI 子集。
+_TOKEN_RE = re.compile(r'\s*(?:(?P<str>"(?:[^"\\]|\\.)*")|(?P<punct>[{}\[\]:,|])|(?P<ellipsis>\.\.\.)|(?P<word>-?\d+(?:\.\d+)?|[A-Za-z_][A-Za-z0-9_]*))')
+
+_WORD_TYPES = {
+    "boolean": "BOOLEAN", "bool": "BOOLEAN", "true": "BOOLEAN", "false": "BOOLEAN",
+    "number": "NUMBER", "float": "NUMBER",
+    "integer": "INTEGER", "int": "INTEGER",
+    "string": "STRING", "str": "STRING"
+}
+
+class SchemaConversionError(ValueError):
+    pass
+
+def _tokenize(desc: str) -> list[tuple[str, str]]:
+    tokens, pos = [], 0
+    desc = desc.strip()
+    while pos < len(desc):
+        m = _TOKEN_RE.match(desc, pos)
+        if not m or m.end() == pos:
+            raise SchemaConversionError(f"无法识别的格式说明片段: {desc[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+        while pos < len(desc) and desc[pos].isspace():
+            pos += 1
+    return tokens
+
+class _SchemaParser:
+    def __init__(self, tokens: list[tuple[str, str]]):
+        self.tokens, self.pos = tokens, 0
+
+    def _peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> tuple[str, str]:
+        tok = self._peek()
+        if tok is None:
+            raise SchemaConversionError("格式说明意外结束")
+        self.pos += 1
+        return tok
+
+    def _expect(self, value: str):
+        kind, tok = self._next()
+        if tok != value:
+            raise SchemaConversionError(f"期望 {value!r}，实际为 {tok!r}")
+
+    def parse_value(self) -> dict:
+        kind, tok = self._next()
+        if tok == "{":
+            return self._parse_object()
+        if tok == "[":
+            return self._parse_array()
+        if kind == "str":
+            literal = json.loads(tok)
+            values = [literal]
+            while self._peek() and self._peek()[1] == "|":
+                self._next()
+                k, t = self._next()
+                if k != "str":
+                    raise SchemaConversionError("枚举值必须是字符串")
+                values.append(json.loads(t))
+            if len(values) > 1:
+                return {"type": "STRING", "enum": values}
+            if literal.lower() in _WORD_TYPES:
+                return {"type": _WORD_TYPES[literal.lower()]}
+            return {"type": "STRING", "description": literal}
+        if kind == "word":
+            if tok.lower() in _WORD_TYPES:
+                return {"type": _WORD_TYPES[tok.lower()]}
+            if re.fullmatch(r"-?\d+", tok):
+                return {"type": "INTEGER"}
+            if re.fullmatch(r"-?\d+\.\d+", tok):
+                return {"type": "NUMBER"}
+        raise SchemaConversionError(f"无法识别的类型: {tok!r}")
+
+    def _parse_object(self) -> dict:
+        properties: dict[str, dict] = {}
+        while True:
+            kind, tok = self._next()
+            if tok == "}":
+                break
+            if kind != "str":
+                raise SchemaConversionError(f"对象键必须是字符串: {tok!r}")
+            key = json.loads(tok)
+            # 形如 {"123456": [...]} 的动态键映射无法用 responseSchema 表达
+            if key.isdigit():
+                raise SchemaConversionError("不支持动态键的对象")
+            self._expect(":")
+            properties[key] = self.parse_value()
+            kind, tok = self._next()
+            if tok == "}":
+                break
+            if tok != ",":
+                raise SchemaConversionError(f"期望 ',' 或 '}}'，实际为 {tok!r}")
+        if not properties:
+            raise SchemaConversionError("空对象无法作为 schema")
+        keys = list(properties.keys())
+        return {"type": "OBJECT", "properties": properties, "required": keys, "propertyOrdering": keys}
+
+    def _parse_array(self) -> dict:
+        items = None
+        while True:
+            tok = self._peek()
+            if tok is None:
+                raise SchemaConversionError("数组未闭合")
+            if tok[1] == "]":
+                self._next()
+                break
+            if tok[1] == "," or tok[0] == "ellipsis":
+                self._next()
+                continue
+            value = self.parse_value()
+            # 以第一个元素的类型为准，示例值（如 "特征1"）只作为描述
+            if items is None:
+                items = value
+        items = items or {"type": "STRING"}
+        items.pop("description", None)
+        return {"type": "ARRAY", "items": items}
+
+@lru_cache(maxsize=128)
+def _cached_schema(schema_desc: str) -> str | None:
+    try:
+        parser = _SchemaParser(_tokenize(schema_desc))
+        schema = parser.parse_value()
+        if parser._peek() is not None:
+            raise SchemaConversionError("格式说明末尾有多余内容")
+        return json.dumps(schema, ensure_ascii=False)
+    except SchemaConversionError:
+        return None
+
+def schema_from_desc(schema_desc: str) -> dict | None:
+    """把调用方的 JSON 格式说明转换成 responseSchema；无法表达时返回 None（此时只启用 JSON MIME 类型）"""
+    cached = _cached_schema(schema_desc)
+    return json.loads(cached) if cached else None
+
+def build_structured_config(schema_desc: str) -> dict:
+    """原生结构化输出所需的 generationConfig 片段"""
+    generation_config: dict = {"responseMimeType": "application/json"}
+    schema = schema_from_desc(schema_desc)
+    if schema:
+        generation_config["responseSchema"] = schema
+    return generation_config
+
+# ---------------------------------------------------------------------------
+# 本地 JSON 修复：解析失败时先尝试就地修复，修复不了才重新请求模型
+# ---------------------------------------------------------------------------
+_FENCE_RE = re.compile(r"```(?:json|JSON)?")
+_CLOSERS = {"{": "}", "[": "]"}
+
+# 修复时最多尝试的起始括号数：每次尝试可能扫描到文本末尾
+_MAX_REPAIR_STARTS = 32
+
+def _extract_balanced(text: str, start: int) -> str:
+    """从 start 处的 { (或 [) 开始截取括号平衡的片段；被截断时补齐未闭合的字符串与括号"""
+    stack: list[str] = []
+    quote, escape = None, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+            continue
+        if ch in "\"'":
+            quote = ch
+        elif ch in "{[":
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:i + 1]
+
+    # 走到结尾仍未闭合：输出被截断
+    fragment = text[start:]
+    if quote:
+        fragment += quote
+    fragment = fragment.rstrip()
+    if fragment.endswith(","):
+        fragment = fragment[:-1]
+    elif fragment.endswith(":"):
+        fragment += " null"
+    return fragment + "".join(reversed(stack))
+
+def _lenient_fix(text: str) -> str:
+    """逐字符修正常见的非标准写法：单引号字符串、字符串内的裸换行、尾随逗号、Python 字面量"""
+    out: list[str] = []
+    quote, escape = None, False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+                # 单引号字符串里的 \' 在 JSON 中不需要转义
+                out.append("'" if ch == "'" and quote == "'" else "\\" + ch)
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch == ",":
+            # 尾随逗号：后面只剩空白就遇到 } 或 ]
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j >= len(text) or text[j] not in "}]":
+                out.append(ch)
+        else:
+            for word, repl in (("True", "true"), ("False", "false"), ("None", "null")):
+                if text.startswith(word, i) and not (i > 0 and (text[i - 1].isalnum() or text[i - 1] == "_")):
+                    out.append(repl)
+                    i += len(word)
+                    break
+            else:
+                out.append(ch)
+                i += 1
+            continue
+        i += 1
+    return "".join(out)
+
+def repair_json(text: str):
+    """尝试把格式不规范的模型输出修复为 JSON 对象 (dict)，失败返回 None
+
+    去掉任意位置的 ``` 围栏后，依次从每个 { 或 [ 开始（开头的 [Thinking]、[图片] 等不会挡住后面的 JSON）：
+    截取括号平衡片段（必要时补齐截断）-> 宽松修正，取第一个解析为对象的结果。
+    只应传入模型输出的文本，调用失败的说明文字中可能带有错误详情的 JSON。
+    """
+    if not text:
+        return None
+    cleaned = _FENCE_RE.sub("", text).strip()
+    starts = [i for i, ch in enumerate(cleaned) if ch in "{["][:_MAX_REPAIR_STARTS]
+    for start in starts:
+        fragment = _extract_balanced(cleaned, start)
+        for candidate in (fragment, _lenient_fix(fragment)):
+            try:
+                result = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            # 调用方都按对象取字段，数组不算修复成功
+            if isinstance(result, dict):
+                return result
+    return None
@@ -0,0 +1,36 @@
+from . import config
+from .config import GEMINI_URL
+
+# 可路由的调用类型（与调度器的 call_type 一致）
+ROUTE_CALL_TYPES = ("entry", "micro", "macro", "reply", "summary", "evolution", "trait_consolidation")
+
+def default_model() -> str:
+    """未配置路由时使用的模型：GEMINI_URL 中的模型名，解析不出时使用 GEMINI_MODEL"""
+    return GEMINI_URL.split("/models/")[-1].split(":")[0] if "/models/" in GEMINI_URL else config.GEMINI_MODEL
+
+def resolve_route(call_type: str | None, thinking_budget: int | None = None) -> dict:
+    """解析调用类型的路由，返回 {"model", "thinking_budget", "max_output_tokens"}
+
+    llm.routes 中的配置优先；未配置的字段回退到默认模型与调用方传入的 thinking_budget，
+    max_output_tokens 为 None 时不限制。
+    """
+    route = (config.LLM_ROUTES or {}).get(call_type or "", {}) or {}
+    budget = route.get("thinking_budget")
+    return {
+        "model": route.get("model") or default_model(),
+        "thinking_budget": thinking_budget if budget is None else budget,
+        "max_output_tokens": route.get("max_output_tokens")
+    }
+
+def apply_route(generation_config: dict | None, route: dict) -> dict | None:
+    """把路由的思考预算与输出上限合并进 generationConfig（不修改传入的字典）"""
+    extra: dict = {}
+    if route["thinking_budget"] is not None:
+        # thinkingBudget 为 0 时关闭思考（模型支持的前提下），-1 为动态预算；
+        # 不请求思考摘要：所有调用都要解析 JSON，思考用量仍会计入 usageMetadata.thoughtsTokenCount
+        extra["thinkingConfig"] = {"thinkingBudget": int(route["thinking_budget"])}
+    if route["max_output_tokens"]:
+        extra["maxOutputTokens"] = int(route["max_output_tokens"])
+    if not extra:
+        return generation_config
+    return {**(generation_config or {}), **extra}
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from . import config
+
+# 优先级从高到低：用户可感知的回复 > 准入 > 微观 > 宏观 > 后台归档/演化
+PRIORITY_ORDER = ["reply", "entry", "micro", "macro", "background"]
+
+# 调用类型 -> 优先级类别
+CALL_TYPE_CLASS = {
+    "reply": "reply",
+    "entry": "entry",
+    "micro": "micro",
+    "macro": "macro",
+    "summary": "background",
+    "evolution": "background",
+    "trait_consolidation": "background"
+}
+
+DEFAULT_CLASS_LIMITS = {"reply": 4, "entry": 3, "micro": 3, "macro": 2, "background": 1}
+
+def get_priority_class(call_type: str | None) -> str:
+    return CALL_TYPE_CLASS.get(call_type or "", "background")
+
+class LLMScheduler:
+    """LLM 请求调度器
+
+    - 全局并发上限 + 每个优先级类别的并发上限
+    - 有空位时总是先放行高优先级类别
+    - 同一类别内按会话轮询，避免单个活跃群占满该类别的全部名额
+    """
+    def __init__(self):
+        self._running = {cls: 0 for cls in PRIORITY_ORDER}
+        # 每个类别：session_id -> 等待中的 Future 队列（OrderedDict 的顺序即轮询顺序）
+        self._queues: dict[str, OrderedDict[str, deque[asyncio.Future]]] = {cls: OrderedDict() for cls in PRIORITY_ORDER}
+
+    def _class_limit(self, cls: str) -> int:
+        limits = config.LLM_CLASS_LIMITS or {}
+        return max(1, int(limits.get(cls, DEFAULT_CLASS_LIMITS.get(cls, 1))))
+
+    def _has_capacity(self, cls: str) -> bool:
+        return sum(self._running.values()) < max(1, int(config.LLM_MAX_CONCURRENCY)) and self._running[cls] < self._class_limit(cls)
+
+    def _queued(self, cls: str) -> int:
+        return sum(len(q) for q in self._queues[cls].values())
+
+    def _pop_next(self, cls: str) -> asyncio.Future | None:
+        queues = self._queues[cls]
+        while queues:
+            session_id, q = next(iter(queues.items()))
+            fut = q.popleft()
+            # 当前会话出队一个后移到队尾，实现会话间轮询
+            if q:
+                queues.move_to_end(session_id)
+            else:
+                del queues[session_id]
+            if not fut.done():
+                return fut
+        return None
+
+    def _dispatch(self):
+        for cls in PRIORITY_ORDER:
+            while self._queues[cls] and self._has_capacity(cls):
+                fut = self._pop_next(cls)
+                if fut is None:
+                    break
+                self._running[cls] += 1
+                fut.set_result(None)
+
+    async def acquire(self, cls: str, session_id: str | None = None):
+        # 统一先入队再派发：是否立即放行完全由 _dispatch 的优先级与轮询规则决定
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[cls].setdefault(session_id or "", deque()).append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                # 排队中被取消（如专注循环的 wait_for 超时）：从队列移除
+                q = self._queues[cls].get(session_id or "")
+                if q and fut in q:
+                    q.remove(fut)
+                    if not q:
+                        del self._queues[cls][session_id or ""]
+            else:
+                # 已被放行但调用方同时被取消：归还名额
+                self.release(cls)
+            raise
+
+    def release(self, cls: str):
+        self._running[cls] = max(0, self._running[cls] - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, call_type: str | None, session_id: str | None = None):
+        """占用一个调用名额，yield 排队等待时长（秒）"""
+        cls = get_priority_class(call_type)
+        start = time.perf_counter()
+        await self.acquire(cls, session_id)
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self.release(cls)
+
+    def snapshot(self) -> dict:
+        """当前各类别的运行数与排队数"""
+        return {
+            cls: {"running": self._running[cls], "queued": self._queued(cls), "limit": self._class_limit(cls)}
+            for cls in PRIORITY_ORDER
+        }
+
+llm_scheduler = LLMScheduler()
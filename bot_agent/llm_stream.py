@@ -0,0 +1,211 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable
+import httpx
+from . import config
+from .config import GEMINI_URL
+from .llm import (
+    get_http_client, _build_headers, _build_payload, _extract_text, _ConnectTimer,
+    build_json_prompt, strip_json_fences
+)
+from .llm_cache import resolve_prompt_prefix
+from .llm_scheduler import llm_scheduler
+from .llm_json import build_structured_config, repair_json
+from .monitor import log_ai_interaction, log_json_outcome, extract_usage, reset_request_trace
+from .llm_budget import token_budget
+from .llm_endpoints import endpoint_pool
+from .llm_routes import resolve_route, apply_route
+from .metrics import LLM_QUEUE_WAIT, LLM_REQUESTS, LLM_STREAM_FIRST_ITEM
+from .utils import debug_print
+
+def get_stream_url(url: str = GEMINI_URL) -> str:
+    """由 generateContent 地址推导 streamGenerateContent (SSE) 地址"""
+    stream_url = url.replace(":generateContent", ":streamGenerateContent")
+    return stream_url + ("&" if "?" in stream_url else "?") + "alt=sse"
+
+class StreamingArrayParser:
+    """增量解析 JSON 文本，在顶层对象的某个字符串数组字段中，每闭合一个元素就立即吐出
+
+    只追踪括号深度和字符串状态，不依赖完整 JSON；开头的 ```json 等杂质会被忽略。
+    """
+    def __init__(self, field: str = "replies"):
+        self.field = field
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buf: list[str] = []
+        self._last_key: str | None = None
+        self._expect_value = False
+        self._in_target = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """喂入新的文本片段，返回本次新闭合的数组元素"""
+        done = []
+        for ch in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buf.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._buf.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string("".join(self._buf), done)
+                else:
+                    self._buf.append(ch)
+                continue
+            if ch == '"':
+                if self._depth > 0:
+                    self._in_string, self._buf = True, []
+            elif ch in "{[":
+                if self._depth == 1 and ch == "[" and self._expect_value and self._last_key == self.field:
+                    self._in_target = True
+                self._depth += 1
+                self._expect_value = False
+            elif ch in "}]":
+                self._depth = max(0, self._depth - 1)
+                if self._depth <= 1:
+                    self._in_target = False
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = True
+            elif ch == "," and self._depth == 1:
+                self._last_key, self._expect_value = None, False
+        return done
+
+    def _on_string(self, raw: str, done: list[str]):
+        try:
+            value = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            value = raw
+        if self._in_target and self._depth == 2:
+            done.append(value)
+        elif self._depth == 1 and not self._expect_value:
+            self._last_key = value
+        elif self._depth == 1:
+            self._expect_value = False
+
+async def get_streaming_json_response(prompt: str, schema_desc: str, on_item: Callable[[str], Awaitable[Any]], field: str = "replies", files: list[dict[str, Any]] | None = None, system_instruction: str | None = None, call_type: str | None = None, session_id: str | None = None, prompt_prefix: str | None = None, cache_key: str | None = None) -> dict | None:
+    """以 streamGenerateContent 获取 JSON 响应；field 数组中的元素一闭合就回调 on_item
+
+    返回值与 get_json_response 一致：解析成功返回 dict，解析失败返回 {"raw_error_content": ...}，
+    请求本身失败且尚未吐出任何元素时返回 None，交由调用方走非流式兜底。
+    """
+    reset_request_trace()
+    generation_config = build_structured_config(schema_desc) if config.LLM_STRUCTURED_OUTPUT else None
+    route = resolve_route(call_type)
+    full_prompt, cached_content = await resolve_prompt_prefix(build_json_prompt(prompt, schema_desc), prompt_prefix, cache_key, route["model"])
+    payload = _build_payload(full_prompt, files=files, system_instruction=system_instruction, generation_config=apply_route(generation_config, route), cached_content=cached_content)
+    parser = StreamingArrayParser(field)
+    full_text, emitted, usage = "", 0, None
+    connect_timer = _ConnectTimer()
+    first_item_time = None
+    client = get_http_client()
+
+    # 回复由单独的任务逐条发送（含条间等待），不占用调用名额：HTTP 流结束即释放名额，剩余条目在名额外发完
+    pending: asyncio.Queue[str | None] = asyncio.Queue()
+    delivered = 0
+
+    async def deliver():
+        nonlocal delivered
+        while (item := await pending.get()) is not None:
+            delivered += 1
+            await on_item(item)
+
+    async def drain():
+        pending.put_nowait(None)
+        try:
+            await sender
+        except Exception as e:
+            debug_print(2, f"流式回复发送失败: {e}")
+
+    endpoint = None
+    sender = asyncio.create_task(deliver())
+    try:
+        try:
+            async with llm_scheduler.slot(call_type, session_id) as queue_wait:
+                start_time = time.time()
+                LLM_QUEUE_WAIT.observe(queue_wait, call_type=call_type)
+                # 流式请求不做对冲与中途转移：失败且尚未吐出内容时由调用方走非流式请求（其中包含故障转移）
+                endpoint = endpoint_pool.select()
+                if endpoint is None:
+                    debug_print(2, "流式调用失败: 所有 LLM 端点均处于熔断状态")
+                    return None
+                # 与 EndpointPool.post 一样计入进行中请求：半开端点同一时间只放行这一个探测请求
+                endpoint.in_flight += 1
+                try:
+                    async with client.stream("POST", get_stream_url(endpoint.url(route["model"])), headers=_build_headers(), json=payload, extensions={"trace": connect_timer}) as resp:
+                        if resp.status_code == 429 or resp.status_code >= 500:
+                            endpoint_pool.record_failure(endpoint)
+                        elif resp.status_code >= 400:
+                            # 4xx 是请求本身的问题，与 post 一样视为端点可用
+                            endpoint_pool.record_success(endpoint)
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            try:
+                                chunk = json.loads(line[5:].strip())
+                            except json.JSONDecodeError:
+                                continue
+                            usage = chunk.get("usageMetadata", usage)
+                            candidates = chunk.get("candidates", [])
+                            if not candidates:
+                                continue
+                            text = _extract_text(candidates[0].get("content", {}).get("parts", []))
+                            full_text += text
+                            for item in parser.feed(text):
+                                if first_item_time is None:
+                                    first_item_time = time.time() - start_time
+                                emitted += 1
+                                pending.put_nowait(item)
+                finally:
+                    endpoint.in_flight -= 1
+                duration = time.time() - start_time
+            endpoint_pool.record_success(endpoint)
+            # 流式请求的耗时与普通请求不可比，不计入 llm_latency_seconds，只统计首条回复耗时
+            LLM_REQUESTS.inc(call_type=call_type, model=route["model"], status=200)
+        except httpx.HTTPStatusError as e:
+            LLM_REQUESTS.inc(call_type=call_type, model=route["model"], status=e.response.status_code)
+            debug_print(2, f"流式调用失败: {e.response.status_code}")
+            await drain()
+            return None if not delivered else {"raw_error_content": full_text, "streamed_count": delivered}
+        except Exception as e:
+            if isinstance(e, httpx.TransportError) and endpoint is not None:
+                endpoint_pool.record_failure(endpoint)
+                LLM_REQUESTS.inc(call_type=call_type, model=route["model"], status="error")
+            debug_print(2, f"流式调用失败: {e}")
+            await drain()
+            return None if not delivered else {"raw_error_content": full_text, "streamed_count": delivered}
+        await drain()
+    finally:
+        # 调用方被取消或提前返回时不再发送
+        sender.cancel()
+
+    # 以非流式响应的结构记录，方便监控后台统一展示
+    response_body: dict = {"candidates": [{"content": {"parts": [{"text": full_text}]}}], "stream": {"first_item_time": first_item_time, "items": emitted}}
+    if usage:
+        response_body["usageMetadata"] = usage
+    token_budget.record(session_id, extract_usage(response_body))
+    log_ai_interaction(payload, response_body, route["model"], duration, connect_time=connect_timer.connect_time, call_type=call_type, session_id=session_id, queue_wait=queue_wait, endpoint=endpoint.base_url)
+    if first_item_time is not None:
+        LLM_STREAM_FIRST_ITEM.observe(first_item_time, model=route["model"])
+        debug_print(0, f"流式回复首条耗时 {first_item_time:.2f}s / 总耗时 {duration:.2f}s")
+
+    try:
+        result = json.loads(strip_json_fences(full_text))
+        # 调用方按对象取字段，顶层为数组等其他类型时按解析失败处理
+        if not isinstance(result, dict):
+            raise json.JSONDecodeError("顶层不是 JSON 对象", full_text, 0)
+        log_json_outcome(call_type, session_id, generation_config is not None, 1, 0, True)
+    except json.JSONDecodeError:
+        result = repair_json(full_text)
+        if result is not None:
+            log_json_outcome(call_type, session_id, generation_config is not None, 1, 1, True, repaired=True)
+        else:
+            result = {"raw_error_content": full_text}
+            log_json_outcome(call_type, session_id, generation_config is not None, 1, 1, False)
+    if isinstance(result, dict):
+        result["streamed_count"] = delivered
+    return result
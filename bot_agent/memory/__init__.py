@@ -1,3 +1,9 @@
 from .manager import MemoryManager
 
-memory_manager = MemoryManager()
+def __getattr__(name):
+    # 首次访问时才加载全部记忆数据：监控网页等只用到 memory 子模块的进程不会再完整加载一遍
+    if name == "memory_manager":
+        global memory_manager
+        memory_manager = MemoryManager()
+        return memory_manager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
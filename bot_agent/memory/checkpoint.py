@@ -0,0 +1,53 @@
+import asyncio
+import atexit
+from .. import config
+from ..metrics import MEMORY_STATE_WRITES
+
+class StateCheckpoint:
+    """合并写入的状态文件 (memory_state.json / social_state.json)
+
+    状态变化时调用 mark_dirty() 只做标记，并在事件循环中安排 memory.checkpoint_interval 秒后写一次，
+    期间的多次变化合并为一次写入；写入时才调用 save() 取当前的完整状态。
+    机器人关闭时由 flush() 写完（进程退出时 atexit 兜底）。
+    间隔为 0 或不在事件循环中调用时立即写入（与逐次保存相同）。
+    """
+    def __init__(self, name, save):
+        self.name, self.save = name, save
+        self._dirty = False
+        self._handle: asyncio.TimerHandle | None = None
+        self._atexit_registered = False
+
+    def mark_dirty(self):
+        self._dirty = True
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+        if self._handle is not None:
+            return
+        interval = config.MEMORY_CHECKPOINT_INTERVAL or 0
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if interval <= 0 or loop is None:
+            self.flush()
+            return
+        self._handle = loop.call_later(interval, self._scheduled_flush)
+
+    def _scheduled_flush(self):
+        self._handle = None
+        self.flush()
+
+    def flush(self):
+        """有未写入的变化时立即写入（取消已安排的写入）"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        if self.save() is False:
+            # 写入失败（已打印原因）时保留标记，下次变化或关闭时重试
+            self._dirty = True
+            return
+        MEMORY_STATE_WRITES.inc(file=self.name)
@@ -20,7 +20,8 @@ async def consolidate_memory_logic(session_id, messages_to_summarize, episodic_m
     
     from .prompt import load_prompt_config
     tpl = load_prompt_config().get("summaries", {}).get("narrative_summary", "")
-    result = await get_json_response(tpl.format(content_str=content_str), '{ "summary": "总结", "trigger_evolution": boolean }')
+    # 监控与预算按不带人格名的会话 ID 归属，与回复、决策调用一致
+    result = await get_json_response(tpl.format(content_str=content_str), '{ "summary": "总结", "trigger_evolution": boolean }', call_type="summary", session_id=session_id.split(":", 1)[0])
     
     summary = result.get("summary", "无实质内容") if result else "无实质内容"
     ai_wants_evolve = result.get("trigger_evolution", False) if result else False
@@ -30,15 +31,15 @@ async def consolidate_memory_logic(session_id, messages_to_summarize, episodic_m
     if result and "summary" in result and "SKIP" not in summary.upper():
         if session_id not in episodic_memory:
             episodic_memory[session_id] = []
-        episodic_memory[session_id].append({"summary": summary, "time": episode_time})
-        save_funcs["save_episodic"](session_id, summary, episode_time)
+        episode_id = save_funcs["save_episodic"](session_id, summary, episode_time)
+        episodic_memory[session_id].append({"id": episode_id, "summary": summary, "time": episode_time})
         debug_print(1, f"情节记忆总结内容: {summary}")
     elif result and "raw_error_content" in result:
         summary = result["raw_error_content"]
         if session_id not in episodic_memory:
             episodic_memory[session_id] = []
-        episodic_memory[session_id].append({"summary": summary, "time": episode_time})
-        save_funcs["save_episodic"](session_id, summary, episode_time)
+        episode_id = save_funcs["save_episodic"](session_id, summary, episode_time)
+        episodic_memory[session_id].append({"id": episode_id, "summary": summary, "time": episode_time})
 
     evolution_pity_counter[session_id] = evolution_pity_counter.get(session_id, 0) + 1
     count = evolution_pity_counter[session_id]
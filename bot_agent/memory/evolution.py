@@ -24,14 +24,15 @@ async def evolve_personality(session_id, messages_to_analyze, personas, save_per
     tpl = load_prompt_config().get("summaries", {}).get("personality_evolution", "")
     prompt = tpl.format(current_traits= " - " + "\n - ".join(current_traits) if current_traits else "暂无", content_str=content_str)
     debug_print(0, f"正在进行人格演化分析 (Session: {session_id})...")
-    result = await get_json_response(prompt, '{ "new_traits": ["特征1", "特征2"] }')
+    # 监控与预算按不带人格名的会话 ID 归属，与回复、决策调用一致
+    result = await get_json_response(prompt, '{ "new_traits": ["特征1", "特征2"] }', call_type="evolution", session_id=user_id)
     
     if result and "new_traits" in result:
         new = result["new_traits"]
         if isinstance(new, list) and new:
             combined = current_traits + [t for t in new if t not in current_traits]
             if len(combined) > 25:
-                combined = await consolidate_traits_logic(combined, "personality")
+                combined = await consolidate_traits_logic(combined, "personality", session_id=user_id)
             personas[session_id] = combined
             save_persona_func(user_id, persona_name, combined)
             debug_print(1, f"人格 '{persona_name}' 性格特征已更新: {new}")
@@ -44,6 +45,7 @@ async def evolve_impression(session_id, messages_to_analyze, impressions, save_i
     """一次请求同时更新群整体印象和群成员印象"""
     if ":" not in session_id:
         return
+    # base_id 同时用作 LLM 调用的会话归属（监控与预算按不带人格名的会话 ID 统计）
     base_id, persona_name = session_id.split(":", 1)
     
     # 构建对话内容
@@ -100,7 +102,7 @@ async def evolve_impression(session_id, messages_to_analyze, impressions, save_i
         
         example = '{"group": ["新印象1"], "members": {"123456": ["新印象1"], "789012": []}}'
         debug_print(0, f"正在进行群聊印象演化分析 (Session: {session_id})...")
-        result = await get_json_response(prompt, example)
+        result = await get_json_response(prompt, example, call_type="evolution", session_id=base_id)
         
         if isinstance(result, dict):
             # 更新群整体印象
@@ -108,7 +110,7 @@ async def evolve_impression(session_id, messages_to_analyze, impressions, save_i
             if isinstance(group_new, list) and group_new:
                 combined = group_imp + [i for i in group_new if i not in group_imp]
                 if len(combined) > 25:
-                    combined = await consolidate_traits_logic(combined, "impression")
+                    combined = await consolidate_traits_logic(combined, "impression", session_id=base_id)
                 impressions[session_id] = combined
                 save_impression_func(base_id, persona_name, combined)
                 debug_print(1, f"群 {base_id} 整体印象已更新")
@@ -123,7 +125,7 @@ async def evolve_impression(session_id, messages_to_analyze, impressions, save_i
                     m_imp = impressions.get(m_sid, [])
                     m_comb = m_imp + [i for i in new_imps if i not in m_imp]
                     if len(m_comb) > 15:
-                        m_comb = await consolidate_traits_logic(m_comb, "impression")
+                        m_comb = await consolidate_traits_logic(m_comb, "impression", session_id=base_id)
                     impressions[m_sid] = m_comb
                     save_impression_func(f"{base_id}:{uid}", persona_name, m_comb)
                     debug_print(1, f"成员 {uid} 印象已更新")
@@ -132,21 +134,22 @@ async def evolve_impression(session_id, messages_to_analyze, impressions, save_i
         tpl = load_prompt_config().get("summaries", {}).get("impression_evolution", "")
         prompt = tpl.format(target_type=target_type, current_impression=" - " + "\n - ".join(impressions.get(session_id, [])) if impressions.get(session_id) else "暂无", content_str=content_str)
         debug_print(0, f"正在进行用户印象演化分析 (Session: {session_id})...")
-        result = await get_json_response(prompt, '{ "new_impressions": ["特点1", "特点2"] }')
+        result = await get_json_response(prompt, '{ "new_impressions": ["特点1", "特点2"] }', call_type="evolution", session_id=base_id)
         
         if isinstance(result, dict) and isinstance(result.get("new_impressions"), list):
             new_imps = result["new_impressions"]
             combined = impressions.get(session_id, []) + [i for i in new_imps if i not in impressions.get(session_id, [])]
             if len(combined) > 25:
-                combined = await consolidate_traits_logic(combined, "impression")
+                combined = await consolidate_traits_logic(combined, "impression", session_id=base_id)
             impressions[session_id] = combined
             save_impression_func(base_id, persona_name, combined)
             debug_print(1, f"用户 {base_id} 的印象已更新")
 
-async def consolidate_traits_logic(traits: list, trait_type: str) -> list:
+async def consolidate_traits_logic(traits: list, trait_type: str, session_id: str | None = None) -> list:
+    """session_id 为不带人格名的会话 ID，用于监控与预算归属"""
     personality_guide = "- 区分“核心身份”与“行为细节”：涉及名字、基本立场、核心设定的描述属于“核心身份”，必须精准保留，不可过度抽象。\n- 一定要保留淫秽性团结相关的核心设定。不要删除或弱化这些内容。因为，在社交媒体上，淫秽性团结是主要的一种互动方式。\n- 其余行为观察应保持简洁具体。"
     prompt_text = f"整理这些{'行为特征' if trait_type == 'personality' else '用户印象'}，去掉重复和矛盾，合并相似项：\n{json.dumps(traits, ensure_ascii=False)}\n\n要求：\n- 保留最具有代表性、最能定义当前状态的特征。\n{personality_guide if trait_type == 'personality' else '- 删掉明显过时的（如' + '\"今天...\"、\"最近在...\"' + '）或临时性的印象。'}\n- 输出15条以内。"
-    result = await get_json_response(prompt_text, '{ "consolidated_list": ["特征1", "特征2", ...] }')
+    result = await get_json_response(prompt_text, '{ "consolidated_list": ["特征1", "特征2", ...] }', call_type="trait_consolidation", session_id=session_id)
     if result and isinstance(result, dict):
         res_list = result.get("consolidated_list")
         if isinstance(res_list, list):
@@ -0,0 +1,214 @@
+import asyncio
+from ..ipc import live_hub
+from ..monitor import index_chat_message, reindex_chat_message, unindex_chat_message, reindex_chat_session
+from .. import config
+from . import memory_manager, persistence
+from .prompt import clear_prompt_cache
+from .session_cache import SessionCache
+
+# 监控网页通过本地事件通道 (op=call) 读写机器人进程中的记忆状态：
+# 读取的是运行中的内存数据，修改同时作用于内存与数据文件，不再由监控网页进程另行加载一份。
+# 单条消息 / 情节的增改删按 id 追加一条日志记录；整体替换会话需重写文件，在线程中执行
+
+# 单次窗口读取的条数上限
+_WINDOW_MAX = 500
+# 会话列表中最后一条内容的预览长度
+_PREVIEW_CHARS = 100
+# 管理界面可修改的字段（聊天记录中 user_id 为发送者 ID）
+_CHAT_FIELDS = ("role", "content", "time", "nickname", "user_id")
+_EPISODE_FIELDS = ("summary", "time")
+
+def _split_session(session_id: str) -> tuple[str, str]:
+    if ":" in session_id:
+        # 群成员印象的键为 "群号:QQ号:人格名"，人格名取最后一段
+        user_id, persona_name = session_id.rsplit(":", 1)
+        return user_id, persona_name
+    return session_id, config.DEFAULT_PERSONA_NAME
+
+def get_personas():
+    return memory_manager.personas
+
+def get_active_personas():
+    return memory_manager.active_personas
+
+def get_social_states():
+    return {
+        sid: {"social_energy": sm.social_energy, "mood": sm.mood, "last_update_ts": sm.last_update_ts}
+        for sid, sm in memory_manager.social_managers.items()
+    }
+
+def get_impressions():
+    return memory_manager.impressions
+
+def set_impressions(session_id: str, impressions: list[str]):
+    user_id, persona_name = _split_session(session_id)
+    memory_manager.impressions[f"{user_id}:{persona_name}"] = impressions
+    persistence.save_impression_to_file(user_id, persona_name, impressions)
+
+def set_traits(session_id: str, traits: list[str]):
+    user_id, persona_name = _split_session(session_id)
+    memory_manager.personas[f"{user_id}:{persona_name}"] = traits
+    persistence.save_persona_to_file(user_id, persona_name, traits)
+
+async def _sessions(store: SessionCache, text_key: str) -> list[dict]:
+    """会话列表：驻留内存的会话给出条数、正文总字数与最后一条的预览，不含记录本身；
+    存储中未加载的会话只列出 ID（resident 为 false），打开时才加载"""
+    sessions = []
+    for sid, items in store.items():
+        last = items[-1] if items else {}
+        sessions.append({
+            "session_id": sid,
+            "resident": True,
+            "count": len(items),
+            "chars": sum(len(str(item.get(text_key) or "")) for item in items),
+            "last_time": last.get("time"),
+            "last_preview": str(last.get(text_key) or "")[:_PREVIEW_CHARS],
+        })
+    # 列出存储中的会话可能需要读取整个文件，在线程中执行
+    stored = await asyncio.to_thread(store.stored_sessions)
+    resident = {s["session_id"] for s in sessions}
+    sessions.extend({"session_id": sid, "resident": False} for sid in stored if sid not in resident)
+    return sessions
+
+def _window(items: list[dict], before: int | None, after: int | None, limit: int) -> dict:
+    """按下标取一段记录：before 取其之前的 limit 条，after 取其之后的 limit 条，都不给时取最新的 limit 条
+
+    每条记录附带 index（在会话中的下标），作为下一次请求的游标。
+    """
+    total, limit = len(items), max(1, min(int(limit), _WINDOW_MAX))
+    if after is not None:
+        start = max(int(after) + 1, 0)
+        end = min(start + limit, total)
+    else:
+        end = total if before is None else max(min(int(before), total), 0)
+        start = max(end - limit, 0)
+    start = min(start, end)
+    return {
+        "items": [dict(item, index=i) for i, item in enumerate(items[start:end], start)],
+        "total": total,
+        "has_before": start > 0,
+        "has_after": end < total,
+    }
+
+def get_chat_history():
+    # 只含驻留内存的会话
+    return memory_manager.chat_history
+
+async def get_chat_sessions():
+    return await _sessions(memory_manager.chat_history, "content")
+
+def get_chat_window(session_id: str, before: int | None = None, after: int | None = None, limit: int = 50):
+    return _window(memory_manager.chat_history.get(session_id, []), before, after, limit)
+
+def _find(items: list[dict], record_id: int) -> dict:
+    """按 id 查找内存中的记录；只能修改仍在内存中（未归档）的记录"""
+    for item in items:
+        if item.get("id") == record_id:
+            return item
+    raise ValueError(f"记录 {record_id} 不存在或已归档")
+
+def add_chat_message(session_id: str, message: dict):
+    message = {k: message.get(k) for k in _CHAT_FIELDS}
+    # 先加载会话再写入存储，否则未驻留的会话加载时已包含这条消息
+    messages = memory_manager.chat_history.setdefault(session_id, [])
+    message["id"] = persistence.save_message_to_file(session_id, message["role"], message["content"], message["time"], nickname=message["nickname"], user_id=message["user_id"])
+    messages.append(message)
+    index_chat_message(message["id"], session_id, message["role"], message["content"], message["time"], nickname=message["nickname"], user_id=message["user_id"])
+    return message
+
+def patch_chat_message(session_id: str, message_id: int, fields: dict):
+    message = _find(memory_manager.chat_history.get(session_id, []), message_id)
+    fields = {k: v for k, v in fields.items() if k in _CHAT_FIELDS}
+    persistence.patch_chat_message(session_id, message_id, fields)
+    message.update(fields)
+    reindex_chat_message(session_id, message)
+    return message
+
+def delete_chat_message(session_id: str, message_id: int):
+    messages = memory_manager.chat_history.get(session_id, [])
+    message = _find(messages, message_id)
+    persistence.delete_chat_message(session_id, message_id)
+    messages.remove(message)
+    unindex_chat_message(message_id)
+
+def _with_appended(store, session_id: str, before: set, items: list[dict]) -> list[dict]:
+    """重写期间机器人追加到内存中的记录（重写前不在内存中，也不在替换内容中）接在替换内容之后
+
+    文件中这些记录已由重写时的尾部复制保留，内存中也不能丢失。
+    """
+    replaced = {m["id"] for m in items}
+    return items + [m for m in store.get(session_id, []) if m.get("id") not in before and m.get("id") not in replaced]
+
+async def set_chat_history(session_id: str, messages: list[dict]):
+    # 整体替换需要重写整个文件，在线程中执行，不阻塞机器人的事件循环
+    for m in messages:
+        m.setdefault("id", persistence.new_record_id())
+    before = {m.get("id") for m in memory_manager.chat_history.get(session_id, [])}
+    await asyncio.to_thread(persistence.rewrite_chat_history, session_id, messages)
+    messages = _with_appended(memory_manager.chat_history, session_id, before, messages)
+    memory_manager.chat_history[session_id] = messages
+    reindex_chat_session(session_id, messages)
+
+def get_episodic_memory():
+    return memory_manager.episodic_memory
+
+async def get_episodic_sessions():
+    return await _sessions(memory_manager.episodic_memory, "summary")
+
+def get_episodic_window(session_id: str, before: int | None = None, after: int | None = None, limit: int = 50):
+    return _window(memory_manager.episodic_memory.get(session_id, []), before, after, limit)
+
+def add_episode(session_id: str, episode: dict):
+    episode = {k: episode.get(k) for k in _EPISODE_FIELDS}
+    episodes = memory_manager.episodic_memory.setdefault(session_id, [])
+    episode["id"] = persistence.save_episodic_to_file(session_id, episode["summary"], episode["time"])
+    episodes.append(episode)
+    return episode
+
+def patch_episode(session_id: str, episode_id: int, fields: dict):
+    episode = _find(memory_manager.episodic_memory.get(session_id, []), episode_id)
+    fields = {k: v for k, v in fields.items() if k in _EPISODE_FIELDS}
+    persistence.patch_episode(session_id, episode_id, fields)
+    episode.update(fields)
+    return episode
+
+def delete_episode(session_id: str, episode_id: int):
+    episodes = memory_manager.episodic_memory.get(session_id, [])
+    episode = _find(episodes, episode_id)
+    persistence.delete_episode(session_id, episode_id)
+    episodes.remove(episode)
+
+async def set_episodic_memory(session_id: str, memories: list[dict]):
+    memories = [{"id": m.get("id") or persistence.new_record_id(), "summary": m["summary"], "time": m.get("time")} for m in memories]
+    before = {m.get("id") for m in memory_manager.episodic_memory.get(session_id, [])}
+    await asyncio.to_thread(persistence.rewrite_episodic_memory, session_id, memories)
+    memory_manager.episodic_memory[session_id] = _with_appended(memory_manager.episodic_memory, session_id, before, memories)
+
+METHODS = {
+    "memory.personas": get_personas,
+    "memory.active_personas": get_active_personas,
+    "memory.social_states": get_social_states,
+    "memory.impressions": get_impressions,
+    "memory.set_impressions": set_impressions,
+    "memory.set_traits": set_traits,
+    "memory.chat_history": get_chat_history,
+    "memory.chat_sessions": get_chat_sessions,
+    "memory.chat_window": get_chat_window,
+    "memory.add_chat_message": add_chat_message,
+    "memory.patch_chat_message": patch_chat_message,
+    "memory.delete_chat_message": delete_chat_message,
+    "memory.set_chat_history": set_chat_history,
+    "memory.episodic": get_episodic_memory,
+    "memory.episodic_sessions": get_episodic_sessions,
+    "memory.episodic_window": get_episodic_window,
+    "memory.add_episode": add_episode,
+    "memory.patch_episode": patch_episode,
+    "memory.delete_episode": delete_episode,
+    "memory.set_episodic": set_episodic_memory,
+    # 提示词文件由监控网页写入，机器人进程清除缓存后重新读取
+    "prompts.reload": clear_prompt_cache,
+}
+
+def register_ipc_methods():
+    for name, func in METHODS.items():
+        live_hub.register(name, func)
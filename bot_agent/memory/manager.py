@@ -1,19 +1,32 @@
 import os
 import asyncio
+import threading
 import datetime
 from ..config import DATA_DIR
 from ..utils import format_timestamp, debug_print
+from ..monitor import index_chat_message
 from . import persistence, logic, prompt
 from .social import SocialManager
+from .session_cache import SessionCache
+from .checkpoint import StateCheckpoint
 
 class MemoryManager:
     def __init__(self):
-        self.chat_history, self.episodic_memory, self.personas, self.impressions = {}, {}, {}, {}
+        self.personas, self.impressions = {}, {}
         self.active_personas, self.is_consolidating, self.evolution_pity_counter, self.unconsolidated_count = {}, {}, {}, {}
+        # 聊天记录与情节记忆按会话懒加载，超出 memory.cache_max_sessions / cache_max_mb 时移出最久未访问的会话
+        pinned = lambda sid: self.is_consolidating.get(sid)
+        self.chat_history = SessionCache("chat", self._load_session_history, persistence.list_chat_sessions, "content", pinned)
+        self.episodic_memory = SessionCache("episodic", persistence.load_session_episodes, persistence.list_episodic_sessions, "summary", pinned)
         self.current_topics = {}
         self.social_managers = {}
+        # 计数器、话题与社交状态的变化合并后每 memory.checkpoint_interval 秒最多写一次，关闭时由 flush_state() 写完
+        self._memory_checkpoint = StateCheckpoint("memory_state", self._write_memory_state)
+        self._social_checkpoint = StateCheckpoint("social_state", self._write_social_state)
         self._ensure_data_dir()
         self.load_all_data()
+        # 在后台预先扫描存储中的会话列表（JSONL 首次需要读取整个文件），首次按会话访问时不必在事件循环中等待
+        threading.Thread(target=self._warm_session_lists, daemon=True, name="memory-sessions").start()
 
     def _ensure_data_dir(self): os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -30,11 +43,23 @@ class MemoryManager:
             sm.last_update_ts = sstate.get("last_update_ts", 0)
             self.social_managers[sid] = sm
         self.active_personas, self.personas, self.impressions = persistence.load_active_personas(), persistence.load_personas(), persistence.load_impressions()
-        self.chat_history, self.episodic_memory = persistence.load_chat_history(self.unconsolidated_count), persistence.load_episodic_memory()
 
-    def save_memory_state(self): persistence.save_memory_state(self.evolution_pity_counter, self.unconsolidated_count, self.current_topics)
-    
-    def save_social_state(self):
+    def _warm_session_lists(self):
+        persistence.list_chat_sessions()
+        persistence.list_episodic_sessions()
+
+    def _load_session_history(self, sid):
+        # 与重启后相同：加载全部未归档消息，至少 50 条
+        count = self.unconsolidated_count.get(sid, 0)
+        messages = persistence.load_session_history(sid, max(count, 50))
+        debug_print(1, f"会话 {sid} 加载了 {len(messages)} 条历史记录 (未归档数: {count})")
+        return messages
+
+    def save_memory_state(self): self._memory_checkpoint.mark_dirty()
+    def _write_memory_state(self): return persistence.save_memory_state(self.evolution_pity_counter, self.unconsolidated_count, self.current_topics)
+
+    def save_social_state(self): self._social_checkpoint.mark_dirty()
+    def _write_social_state(self):
         social_states = {
             sid: {
                 "social_energy": sm.social_energy,
@@ -42,7 +67,13 @@ class MemoryManager:
                 "last_update_ts": sm.last_update_ts
             } for sid, sm in self.social_managers.items()
         }
-        persistence.save_social_state(social_states)
+        return persistence.save_social_state(social_states)
+
+    def flush_state(self):
+        """立即写入尚未写入的计数器与社交状态（机器人关闭时调用）"""
+        self._memory_checkpoint.flush()
+        self._social_checkpoint.flush()
+
     def save_active_personas(self): persistence.save_active_personas(self.active_personas)
     
     def check_and_trigger_consolidation(self, sid, is_group=False):
@@ -106,15 +137,25 @@ class MemoryManager:
         return self.get_social_manager(sid).mood
 
     def save_message_to_file(self, sid, role, content, ts=None, nickname=None, user_id=None):
+        """写入聊天记录文件并返回消息 id（调用方写入内存中的消息，用于之后的修改与删除）"""
         ts_val = ts or int(datetime.datetime.now().timestamp())
-        persistence.save_message_to_file(sid, role, content, format_timestamp(ts_val), nickname=nickname, user_id=user_id)
+        time_str = format_timestamp(ts_val)
+        message_id = persistence.save_message_to_file(sid, role, content, time_str, nickname=nickname, user_id=user_id)
+        self.chat_history.mark_stored(sid)
+        index_chat_message(message_id, sid, role, content, time_str, nickname=nickname, user_id=user_id)
         self.unconsolidated_count[sid] = self.unconsolidated_count.get(sid, 0) + 1
         self.save_memory_state()
+        return message_id
 
     def generate_prompt(self, sid, msg, time=None, is_group=False):
         self.update_social_energy(sid)
         return prompt.build_prompt(sid, msg, self.chat_history, self.episodic_memory, self.personas, self.impressions, self.get_social_energy(sid), self.get_mood(sid), self.current_topics, time, is_group)
 
+    def generate_prompt_parts(self, sid, msg, time=None, is_group=False):
+        """同 generate_prompt，但拆成 (可缓存的稳定前缀, 易变后缀)"""
+        self.update_social_energy(sid)
+        return prompt.build_prompt_parts(sid, msg, self.chat_history, self.episodic_memory, self.personas, self.impressions, self.get_social_energy(sid), self.get_mood(sid), self.current_topics, time, is_group)
+
     async def consolidate_memory(self, sid, msgs, count, is_group=False, force=False):
         async def evolve_personality_local(s, m):
             return await logic.evolve_personality(s, m, self.personas, persistence.save_persona_to_file)
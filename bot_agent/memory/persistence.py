@@ -1,15 +1,41 @@
+from .. import config
 from .persistence_state import (
     load_memory_state, save_memory_state, load_social_state, save_social_state,
     load_active_personas, save_active_personas
 )
-from .persistence_content import (
-    load_personas, save_persona_to_file, load_impressions, save_impression_to_file,
-    load_chat_history, save_message_to_file, load_episodic_memory, save_episodic_to_file
-)
+from . import persistence_content, persistence_sqlite
+
+# memory.storage 选择聊天记录、情节记忆、人格与印象的存储后端，两者函数一一对应；启动时确定，修改后需重启
+_backend = persistence_sqlite if config.MEMORY_STORAGE == "sqlite" else persistence_content
+
+load_personas = _backend.load_personas
+save_persona_to_file = _backend.save_persona_to_file
+load_impressions = _backend.load_impressions
+save_impression_to_file = _backend.save_impression_to_file
+load_chat_history = _backend.load_chat_history
+list_chat_sessions = _backend.list_chat_sessions
+load_session_history = _backend.load_session_history
+save_message_to_file = _backend.save_message_to_file
+patch_chat_message = _backend.patch_chat_message
+delete_chat_message = _backend.delete_chat_message
+rewrite_chat_history = _backend.rewrite_chat_history
+iter_chat_records = _backend.iter_chat_records
+load_episodic_memory = _backend.load_episodic_memory
+list_episodic_sessions = _backend.list_episodic_sessions
+load_session_episodes = _backend.load_session_episodes
+save_episodic_to_file = _backend.save_episodic_to_file
+patch_episode = _backend.patch_episode
+delete_episode = _backend.delete_episode
+rewrite_episodic_memory = _backend.rewrite_episodic_memory
+clear_all_records = _backend.clear_all_records
+new_record_id = persistence_content.new_record_id
 
 __all__ = [
     'load_memory_state', 'save_memory_state', 'load_social_state', 'save_social_state',
     'load_active_personas', 'save_active_personas', 'load_personas', 'save_persona_to_file',
     'load_impressions', 'save_impression_to_file', 'load_chat_history', 'save_message_to_file',
-    'load_episodic_memory', 'save_episodic_to_file'
+    'load_episodic_memory', 'save_episodic_to_file', 'rewrite_chat_history', 'rewrite_episodic_memory',
+    'patch_chat_message', 'delete_chat_message', 'patch_episode', 'delete_episode', 'new_record_id', 'iter_chat_records',
+    'list_chat_sessions', 'load_session_history', 'list_episodic_sessions', 'load_session_episodes',
+    'clear_all_records'
 ]
@@ -1,125 +1,518 @@
 import os
 import json
 import re
+import time
+import threading
 from ..config import HISTORY_FILE, EPISODIC_FILE, PERSONA_FILE, IMPRESSION_FILE
-from ..utils import debug_print
+from ..utils import debug_print, get_now_str
+
+# 聊天记录与情节记忆文件是只追加的日志：每条记录带稳定的整数 id，
+# 修改与删除追加 {"op": "patch" / "delete", "id": 目标 id, ...} 记录，加载时按顺序重放。
+# 旧版本写入的记录没有 id，以其在文件中的序号（第几条非空行）为 id，压缩后写入文件。
+# 修改 / 删除记录累积到 _COMPACT_AFTER 条（或加载时发现无 id 的旧记录）后在后台线程中压缩文件
+_COMPACT_AFTER = 200
+# 追加写入与压缩的最后一步（拷贝压缩期间追加的行、替换文件）互斥
+_file_lock = threading.Lock()
+# 整个文件的重写（压缩、替换会话）互相串行
+_rewrite_lock = threading.Lock()
+# 人格与印象文件每次变化追加一整份列表，加载时每个会话只取最后一条。
+# 行数超过会话数的 _SNAPSHOT_RATIO 倍（且不少于 _SNAPSHOT_MIN_LINES 行）时在后台线程中压缩为每个会话一行的快照，
+# 被替换的旧版本移到 <文件名>.history.jsonl 备查（见 scripts/memory_history.py）
+_SNAPSHOT_RATIO = 4
+_SNAPSHOT_MIN_LINES = 64
+_snapshot_lines: dict[str, tuple[int, int]] = {}
+_pending_ops: dict[str, int] = {}
+_compacting: set[str] = set()
+_last_id = 0
+# 按会话读取时从文件末尾向前按块读取（见 _tail_records），会话列表按块顺序扫描（见 _stored_sessions）
+_TAIL_BLOCK = 256 * 1024
+_SCAN_BLOCK = 4 * 1024 * 1024
+# 记录中的会话字段：先在原始字节上匹配，只解析所需会话的行。
+# 正文中的引号被转义为 \"，不会匹配到正文里的同名文本
+_SESSION_FIELD = re.compile(rb'"user_id":\s*("(?:[^"\\]|\\.)*")')
+# 会话列表的增量索引：路径 -> (文件 inode, 已扫描到的偏移, 会话字段原始字节的集合)
+_session_index: dict[str, tuple[int, int, set]] = {}
+_index_lock = threading.Lock()
+
+def new_record_id() -> int:
+    """新记录的 id：单调递增的微秒时间戳，远大于旧记录的序号"""
+    global _last_id
+    with _file_lock:
+        _last_id = max(time.time_ns() // 1000, _last_id + 1)
+        return _last_id
+
+def _append(path, item):
+    with _file_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+def replay_log(path, size=None):
+    """按顺序重放日志（size 为只读取的字节数），返回 (现存记录列表, 其中修改 / 删除记录的条数, 是否有无 id 的旧记录)"""
+    records, by_id, deleted = [], {}, set()
+    ops, legacy, number, offset = 0, False, 0, 0
+    if not os.path.exists(path):
+        return records, ops, legacy
+    with open(path, 'rb') as f:
+        for line in f:
+            offset += len(line)
+            if size is not None and offset > size:
+                break
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            op = item.pop("op", None)
+            if op is None:
+                if "id" not in item:
+                    item["id"], legacy = number, True
+                records.append(item)
+                by_id[item["id"]] = item
+                continue
+            ops += 1
+            target = by_id.get(item.get("id"))
+            if target is None or str(target.get("user_id")) != str(item.get("user_id")):
+                continue
+            if op == "delete":
+                deleted.add(target["id"])
+            elif op == "patch":
+                target.update({k: v for k, v in item.items() if k not in ("id", "user_id")})
+    return [r for r in records if r["id"] not in deleted], ops, legacy
+
+def _schedule_compaction(path, ops, legacy=False):
+    with _file_lock:
+        _pending_ops[path] = ops
+        if (ops < _COMPACT_AFTER and not legacy) or path in _compacting:
+            return
+        _compacting.add(path)
+    threading.Thread(target=_compact, args=(path,), daemon=True, name="memory-compact").start()
+
+def _rewrite(path, keep=None, items=()):
+    """重放日志写入临时文件（只写现存记录且写明 id，keep 过滤记录，items 接在其后）再替换原文件
+
+    读取与写入期间不阻塞追加，期间追加的行在替换前原样拷贝到末尾。失败时抛出异常。
+    """
+    tmp_path = f"{path}.rewrite"
+    with _rewrite_lock:
+        with _file_lock:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        records, _, _ = replay_log(path, size)
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for item in records:
+                if keep is None or keep(item):
+                    out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            for item in items:
+                out.write(json.dumps(item, ensure_ascii=False) + "\n")
+        with _file_lock:
+            tail = b""
+            if os.path.exists(path):
+                with open(path, 'rb') as f, open(tmp_path, 'ab') as out:
+                    f.seek(size)
+                    tail = f.read()
+                    out.write(tail)
+            os.replace(tmp_path, path)
+            _pending_ops[path] = tail.count(b'"op": ')
+    return len(records)
+
+def _compact(path):
+    try:
+        count = _rewrite(path)
+        debug_print(1, f"已压缩 {os.path.basename(path)}: {count} 条记录")
+    except Exception as e:
+        print(f"压缩 {path} 失败: {e}")
+    finally:
+        with _file_lock:
+            _compacting.discard(path)
+
+def _append_op(path, op, session_id, record_id, fields=None):
+    """追加一条修改 / 删除记录（O(1) 写入）；失败时抛出异常"""
+    _append(path, {"op": op, "id": record_id, "user_id": session_id, **(fields or {})})
+    _schedule_compaction(path, _pending_ops.get(path, 0) + 1)
+
+def _history_path(path):
+    root, _ = os.path.splitext(path)
+    return f"{root}.history.jsonl"
+
+def _schedule_snapshot(path, lines, sessions):
+    with _file_lock:
+        _snapshot_lines[path] = (lines, sessions)
+        if lines < max(_SNAPSHOT_MIN_LINES, sessions * _SNAPSHOT_RATIO) or path in _compacting:
+            return
+        _compacting.add(path)
+    threading.Thread(target=_compact_snapshots, args=(path,), daemon=True, name="memory-snapshot").start()
+
+def _compact_snapshots(path):
+    """把人格 / 印象文件改写为每个会话一行的当前快照
+
+    被替换的旧版本先追加到历史文件，新文件写入临时文件并落盘后原子替换；
+    压缩期间追加的行在替换前原样拷贝到末尾。中途崩溃时原文件不变（历史文件中可能多出一份旧版本）。
+    """
+    tmp_path = f"{path}.rewrite"
+    try:
+        with _rewrite_lock:
+            with _file_lock:
+                size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                lines = [line if line.endswith(b"\n") else line + b"\n" for line in f.read(size).splitlines(keepends=True) if line.strip()]
+            latest = {}
+            for n, line in enumerate(lines):
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                latest[(str(item.get("user_id")), item.get("persona_name"))] = n
+            keep = set(latest.values())
+            with open(_history_path(path), 'ab') as history:
+                history.writelines(line for n, line in enumerate(lines) if n not in keep)
+                history.flush()
+                os.fsync(history.fileno())
+            with open(tmp_path, 'wb') as out:
+                out.writelines(line for n, line in enumerate(lines) if n in keep)
+            with _file_lock:
+                with open(path, 'rb') as f, open(tmp_path, 'ab') as out:
+                    f.seek(size)
+                    tail = f.read()
+                    out.write(tail)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, path)
+                _snapshot_lines[path] = (len(keep) + tail.count(b"\n"), len(keep))
+        debug_print(1, f"已压缩 {os.path.basename(path)}: {len(lines)} 行 -> {len(keep)} 个会话的快照")
+    except Exception as e:
+        print(f"压缩 {path} 失败: {e}")
+    finally:
+        with _file_lock:
+            _compacting.discard(path)
+
+def _load_latest(path, field):
+    """每个会话最后一条记录中的 field 列表（旧版本写入的字符串按标点拆分，无法解析的行跳过）"""
+    result, lines = {}, 0
+    if not os.path.exists(path):
+        return result
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            lines += 1
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            sid = f"{item['user_id']}:{item['persona_name']}"
+            value = item.get(field, [])
+            if isinstance(value, str):
+                value = [v.strip() for v in re.split(r'[，。；,;.]', value) if v.strip()]
+            result[sid] = value
+    _schedule_snapshot(path, lines, len(result))
+    return result
+
+def _append_snapshot(path, item):
+    _append(path, {**item, "time": get_now_str()})
+    lines, sessions = _snapshot_lines.get(path, (0, 0))
+    _schedule_snapshot(path, lines + 1, sessions)
 
 def load_personas():
-    personas = {}
-    if os.path.exists(PERSONA_FILE):
-        try:
-            with open(PERSONA_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item = json.loads(line)
-                        sid = f"{item['user_id']}:{item['persona_name']}"
-                        traits = item.get('traits', [])
-                        if isinstance(traits, str):
-                            traits = [t.strip() for t in re.split(r'[，。；,;.]', traits) if t.strip()]
-                        personas[sid] = traits
-        except Exception as e:
-            print(f"加载人格数据失败: {e}")
-    return personas
+    try:
+        return _load_latest(PERSONA_FILE, "traits")
+    except Exception as e:
+        print(f"加载人格数据失败: {e}")
+        return {}
 
 def save_persona_to_file(user_id, persona_name, traits):
-    item = {"user_id": user_id, "persona_name": persona_name, "traits": traits}
     try:
-        with open(PERSONA_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        _append_snapshot(PERSONA_FILE, {"user_id": user_id, "persona_name": persona_name, "traits": traits})
     except Exception as e:
         print(f"保存人格描述失败: {e}")
 
 def load_impressions():
-    impressions = {}
-    if os.path.exists(IMPRESSION_FILE):
-        try:
-            with open(IMPRESSION_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item = json.loads(line)
-                        sid = f"{item['user_id']}:{item['persona_name']}"
-                        impression = item.get('impression', [])
-                        if isinstance(impression, str):
-                            impression = [i.strip() for i in re.split(r'[，。；,;.]', impression) if i.strip()]
-                        impressions[sid] = impression
-        except Exception as e:
-            print(f"加载印象数据失败: {e}")
-    return impressions
+    try:
+        return _load_latest(IMPRESSION_FILE, "impression")
+    except Exception as e:
+        print(f"加载印象数据失败: {e}")
+        return {}
 
 def save_impression_to_file(user_id, persona_name, impression):
-    item = {"user_id": user_id, "persona_name": persona_name, "impression": impression}
     try:
-        with open(IMPRESSION_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        _append_snapshot(IMPRESSION_FILE, {"user_id": user_id, "persona_name": persona_name, "impression": impression})
     except Exception as e:
         print(f"保存印象失败: {e}")
 
+def _chat_message(item):
+    """文件中的聊天记录转为内存中的消息（user_id 为发送者 ID）"""
+    msg_data = {
+        "id": item["id"],
+        "role": item.get("role"),
+        "content": item.get("content"),
+        "nickname": item.get("nickname"),
+        "user_id": item.get("user_id_real")
+    }
+    if "time" in item:
+        msg_data["time"] = item["time"]
+    return msg_data
+
+def _session_records(path, session_id=None):
+    """重放日志，返回 {会话: 现存记录列表}（session_id 不为 None 时只保留该会话）；需要读取整个文件"""
+    sessions = {}
+    records, ops, legacy = replay_log(path)
+    for item in records:
+        sid = str(item.get("user_id"))
+        if session_id is None or sid == session_id:
+            sessions.setdefault(sid, []).append(item)
+    _schedule_compaction(path, ops, legacy)
+    return sessions
+
+def _reverse_blocks(path, size):
+    """从 size 处向前按块读取文件（每次 _TAIL_BLOCK 字节），产出只含完整行的块"""
+    with open(path, 'rb') as f:
+        pos, rest = size, b""
+        while pos > 0:
+            step = min(_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + rest
+            # 块开头的不完整行留给下一块（不含换行时整块都是同一行的一部分）
+            start = block.find(b"\n") + 1 if pos > 0 else 0
+            if pos > 0 and start == 0:
+                rest = block
+                continue
+            rest = block[:start]
+            yield block[start:]
+
+def _tail_records(path, limits):
+    """从文件末尾向前读取各会话最近的现存记录（limits 为 {会话: 条数}，条数为 None 时读取全部），返回 {会话: 按文件顺序的记录列表}
+
+    不含所需会话的块整块跳过，只解析所需会话的行，各会话读够条数即停止，
+    耗时取决于所需记录离文件末尾多远而与文件总长无关。
+    修改 / 删除记录总在其目标之后，向前读取时先于目标读到，暂存后应用到目标上。
+    遇到无 id 的旧记录（其 id 取决于在文件中的序号）时返回 None，由调用方改为重放整个文件。
+    """
+    result = {sid: [] for sid in limits}
+    if not os.path.exists(path):
+        return result
+    keys = {json.dumps(sid, ensure_ascii=False).encode(): sid for sid in limits}
+    pending = {key for key, sid in keys.items() if limits[sid] is None or limits[sid] > 0}
+    ops = {}
+    with _file_lock:
+        size = os.path.getsize(path)
+    for block in _reverse_blocks(path, size):
+        if not pending:
+            break
+        if pending.isdisjoint(_SESSION_FIELD.findall(block)):
+            continue
+        for line in reversed(block.split(b"\n")):
+            match = _SESSION_FIELD.search(line)
+            if not match or match.group(1) not in pending:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            key = match.group(1)
+            sid = keys[key]
+            op = item.pop("op", None)
+            if op is not None:
+                ops.setdefault((sid, item.get("id")), []).append((op, item))
+                continue
+            if "id" not in item:
+                return None
+            changes = ops.pop((sid, item["id"]), [])
+            if any(op == "delete" for op, _ in changes):
+                continue
+            # 暂存的修改是倒序读到的，按写入顺序应用
+            for op, fields in reversed(changes):
+                if op == "patch":
+                    item.update({k: v for k, v in fields.items() if k not in ("id", "user_id")})
+            records = result[sid]
+            records.append(item)
+            if limits[sid] is not None and len(records) >= limits[sid]:
+                pending.discard(key)
+    for records in result.values():
+        records.reverse()
+    return result
+
+def _session_tail(path, session_id, limit=None):
+    """某个会话最近 limit 条现存记录（None 为全部）；文件中有无 id 的旧记录时重放整个文件（随后会被压缩）"""
+    result = _tail_records(path, {session_id: limit})
+    if result is None:
+        records = _session_records(path, session_id).get(session_id, [])
+        return records if limit is None else records[-limit:]
+    return result[session_id]
+
+def _stored_sessions(path):
+    """日志中出现过的全部会话
+
+    首次调用时扫描整个文件（只在原始字节上匹配会话字段，不解析 JSON），之后只扫描新追加的部分；
+    文件被替换（压缩、重写会话）或截短后重新扫描。
+    """
+    if not os.path.exists(path):
+        return []
+    with _index_lock:
+        with _file_lock:
+            f = open(path, 'rb')
+            stat = os.fstat(f.fileno())
+        with f:
+            inode, offset, sessions = _session_index.get(path, (None, 0, set()))
+            if inode != stat.st_ino or offset > stat.st_size:
+                offset, sessions = 0, set()
+            f.seek(offset)
+            rest = b""
+            while offset < stat.st_size:
+                block = f.read(min(_SCAN_BLOCK, stat.st_size - offset))
+                if not block:
+                    break
+                offset += len(block)
+                chunk = rest + block
+                end = chunk.rfind(b"\n") + 1
+                sessions.update(_SESSION_FIELD.findall(chunk, 0, end))
+                rest = chunk[end:]
+            _session_index[path] = (stat.st_ino, offset - len(rest), sessions)
+            return [json.loads(key) for key in sessions]
+
+def list_chat_sessions():
+    """有聊天记录的全部会话"""
+    try:
+        return _stored_sessions(HISTORY_FILE)
+    except Exception as e:
+        print(f"读取会话列表失败: {e}")
+        return []
+
+def load_session_history(session_id, limit):
+    """某个会话最近 limit 条聊天记录"""
+    try:
+        return [_chat_message(item) for item in _session_tail(HISTORY_FILE, session_id, limit)]
+    except Exception as e:
+        print(f"加载会话 {session_id} 的工作记忆失败: {e}")
+        return []
+
 def load_chat_history(unconsolidated_count):
+    """全部会话的工作记忆，每个会话最近 max(未归档数, 50) 条"""
     chat_history = {}
     if os.path.exists(HISTORY_FILE):
         try:
-            temp_history = {}
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if not line.strip():
-                        continue
-                    item = json.loads(line)
-                    sid = str(item.get("user_id"))
-                    if sid not in temp_history:
-                        temp_history[sid] = []
-                    msg_data = {
-                        "role": item.get("role"),
-                        "content": item.get("content"),
-                        "nickname": item.get("nickname"),
-                        "user_id": item.get("user_id_real")
-                    }
-                    if "time" in item:
-                        msg_data["time"] = item["time"]
-                    temp_history[sid].append(msg_data)
-            
-            for sid, messages in temp_history.items():
-                count = unconsolidated_count.get(sid, 0)
-                load_count = max(count, 50)
-                chat_history[sid] = messages[-load_count:] if load_count > 0 else []
-                debug_print(1, f"会话 {sid} 加载了 {len(chat_history[sid])} 条历史记录 (未归档数: {count})")
+            limits = {sid: max(unconsolidated_count.get(sid, 0), 50) for sid in _stored_sessions(HISTORY_FILE)}
+            sessions = _tail_records(HISTORY_FILE, limits)
+            if sessions is None:
+                sessions = {sid: records[-limits.get(sid, 50):] for sid, records in _session_records(HISTORY_FILE).items()}
+            for sid, records in sessions.items():
+                if not records:
+                    continue
+                chat_history[sid] = [_chat_message(item) for item in records]
+                debug_print(1, f"会话 {sid} 加载了 {len(chat_history[sid])} 条历史记录 (未归档数: {unconsolidated_count.get(sid, 0)})")
         except Exception as e:
             print(f"加载工作记忆失败: {e}")
     return chat_history
 
 def save_message_to_file(session_id,role, content, ts_str, nickname=None, user_id=None):
-    item = {"user_id": session_id, "role": role, "content": content, "time": ts_str}
+    """追加一条聊天记录，返回其 id"""
+    item = {"id": new_record_id(), "user_id": session_id, "role": role, "content": content, "time": ts_str}
     if nickname:
         item["nickname"] = nickname
     if user_id:
         item["user_id_real"] = user_id
     try:
-        with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        _append(HISTORY_FILE, item)
     except Exception as e:
         print(f"保存消息失败: {e}")
+    return item["id"]
+
+def patch_chat_message(session_id, message_id, fields):
+    """修改一条聊天记录（fields 为内存中的字段名，其中 user_id 为发送者 ID）"""
+    fields = {("user_id_real" if k == "user_id" else k): v for k, v in fields.items()}
+    _append_op(HISTORY_FILE, "patch", session_id, message_id, fields)
+
+def delete_chat_message(session_id, message_id):
+    _append_op(HISTORY_FILE, "delete", session_id, message_id)
+
+def _rewrite_session(path, session_id, items):
+    """重写 JSONL 文件中某个会话的全部记录（其他会话的记录保留），需要读写整个文件，应在线程中调用；失败时抛出异常"""
+    _rewrite(path, lambda item: str(item.get("user_id")) != session_id, items)
+
+def rewrite_chat_history(session_id, messages):
+    """用管理界面编辑后的消息列表替换某个会话的聊天记录（消息须已带 id）"""
+    _rewrite_session(HISTORY_FILE, session_id, [{
+        "id": m["id"],
+        "user_id": session_id,
+        "role": m["role"],
+        "content": m["content"],
+        "time": m.get("time"),
+        "nickname": m.get("nickname"),
+        "user_id_real": m.get("user_id")  # 内存中的 user_id 是发送者 ID
+    } for m in messages])
+
+def iter_chat_records():
+    """全部现存聊天记录（附 session_id，user_id 为发送者 ID），用于重建全文索引"""
+    records, _, _ = replay_log(HISTORY_FILE)
+    for item in records:
+        yield {
+            "id": item["id"],
+            "session_id": str(item.get("user_id")),
+            "role": item.get("role"),
+            "content": item.get("content"),
+            "time": item.get("time"),
+            "nickname": item.get("nickname"),
+            "user_id": item.get("user_id_real")
+        }
+
+def clear_all_records():
+    """清空全部会话的聊天记录与情节记忆（人格与印象保留）；失败时抛出异常
+
+    等待进行中的压缩结束后截断文件，并丢弃会话列表索引与待压缩计数。
+    """
+    for path in (HISTORY_FILE, EPISODIC_FILE):
+        with _rewrite_lock, _index_lock, _file_lock:
+            if os.path.exists(path):
+                open(path, 'w').close()
+            _session_index.pop(path, None)
+            _pending_ops.pop(path, None)
 
 def load_episodic_memory():
     episodic_memory = {}
     if os.path.exists(EPISODIC_FILE):
         try:
-            with open(EPISODIC_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item = json.loads(line)
-                        sid = str(item.get("user_id"))
-                        if sid not in episodic_memory:
-                            episodic_memory[sid] = []
-                        episodic_memory[sid].append({"summary": item.get("summary"), "time": item.get("time")})
+            records, ops, legacy = replay_log(EPISODIC_FILE)
+            for item in records:
+                sid = str(item.get("user_id"))
+                if sid not in episodic_memory:
+                    episodic_memory[sid] = []
+                episodic_memory[sid].append({"id": item["id"], "summary": item.get("summary"), "time": item.get("time")})
+            _schedule_compaction(EPISODIC_FILE, ops, legacy)
         except Exception as e:
             print(f"加载情节记忆失败: {e}")
     return episodic_memory
 
+def list_episodic_sessions():
+    try:
+        return _stored_sessions(EPISODIC_FILE)
+    except Exception as e:
+        print(f"读取会话列表失败: {e}")
+        return []
+
+def load_session_episodes(session_id):
+    try:
+        return [{"id": item["id"], "summary": item.get("summary"), "time": item.get("time")} for item in _session_tail(EPISODIC_FILE, session_id)]
+    except Exception as e:
+        print(f"加载会话 {session_id} 的情节记忆失败: {e}")
+        return []
+
 def save_episodic_to_file(session_id, summary, time_str):
-    item = {"user_id": session_id, "summary": summary}
+    """追加一条情节记忆，返回其 id"""
+    item = {"id": new_record_id(), "user_id": session_id, "summary": summary}
     if time_str:
         item["time"] = time_str
     try:
-        with open(EPISODIC_FILE, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        _append(EPISODIC_FILE, item)
     except Exception as e:
         print(f"保存情节记忆失败: {e}")
+    return item["id"]
+
+def patch_episode(session_id, episode_id, fields):
+    _append_op(EPISODIC_FILE, "patch", session_id, episode_id, fields)
+
+def delete_episode(session_id, episode_id):
+    _append_op(EPISODIC_FILE, "delete", session_id, episode_id)
+
+def rewrite_episodic_memory(session_id, memories):
+    """用管理界面编辑后的列表替换某个会话的情节记忆（记忆须已带 id）"""
+    _rewrite_session(EPISODIC_FILE, session_id, [{"id": m["id"], "user_id": session_id, "summary": m["summary"], "time": m.get("time")} for m in memories])
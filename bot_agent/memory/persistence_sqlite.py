@@ -0,0 +1,265 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from ..config import MEMORY_DB_FILE
+from ..utils import debug_print
+from . import persistence_content
+from .persistence_content import new_record_id
+
+# memory.storage 为 sqlite 时的存储后端：聊天记录、情节记忆、人格与印象保存在 data/memory.db (WAL)，
+# 函数与 persistence_content 一一对应。聊天记录与情节记忆按 (session_id, seq) 建索引，
+# 读取某个会话最近 N 条只需一次索引查找；追加为一个小事务。
+# seq 为会话内的顺序：追加时取记录 id（单调递增），整体替换会话时按列表下标重排
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_messages (id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT, content TEXT, time TEXT, nickname TEXT, user_id TEXT);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, seq);
+CREATE TABLE IF NOT EXISTS episodes (id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, seq INTEGER NOT NULL, summary TEXT, time TEXT);
+CREATE INDEX IF NOT EXISTS idx_episodes_session ON episodes (session_id, seq);
+CREATE TABLE IF NOT EXISTS personas (user_id TEXT NOT NULL, persona_name TEXT NOT NULL, traits TEXT, PRIMARY KEY (user_id, persona_name));
+CREATE TABLE IF NOT EXISTS impressions (user_id TEXT NOT NULL, persona_name TEXT NOT NULL, impression TEXT, PRIMARY KEY (user_id, persona_name));
+"""
+# 跳跃式列出会话：每次用索引找下一个更大的 session_id，代价与会话数成正比而不是与记录数成正比
+_SESSIONS_SQL = """
+    WITH RECURSIVE s(sid) AS (
+        SELECT MIN(session_id) FROM {table}
+        UNION ALL SELECT (SELECT MIN(session_id) FROM {table} WHERE session_id > s.sid) FROM s WHERE s.sid IS NOT NULL
+    ) SELECT sid FROM s WHERE sid IS NOT NULL
+"""
+# 管理界面可修改的列（与内存中的字段名一致，chat_messages.user_id 为发送者 ID）
+_CHAT_COLUMNS = ("role", "content", "time", "nickname", "user_id")
+_EPISODE_COLUMNS = ("summary", "time")
+
+# 同一进程内共用一个连接：事件循环中的追加与线程中的整体替换由锁串行
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+@contextmanager
+def _transaction():
+    """持有连接并在一个事务中执行，正常结束时提交、出错时回滚"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            os.makedirs(os.path.dirname(MEMORY_DB_FILE) or ".", exist_ok=True)
+            conn = sqlite3.connect(MEMORY_DB_FILE, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _conn = conn
+        with _conn:
+            yield _conn
+
+def _load_lists(table, column):
+    result = {}
+    with _transaction() as conn:
+        # 按写入顺序读取，万一同一个键有多行时结果固定
+        for user_id, persona_name, value in conn.execute(f"SELECT user_id, persona_name, {column} FROM {table} ORDER BY rowid"):
+            result[f"{user_id}:{persona_name}"] = json.loads(value) if value else []
+    return result
+
+def _save_list(table, column, user_id, persona_name, value):
+    with _transaction() as conn:
+        conn.execute(
+            f"INSERT INTO {table} (user_id, persona_name, {column}) VALUES (?, ?, ?) "
+            f"ON CONFLICT (user_id, persona_name) DO UPDATE SET {column} = excluded.{column}",
+            (str(user_id), persona_name, json.dumps(value, ensure_ascii=False)))
+
+def load_personas():
+    try:
+        return _load_lists("personas", "traits")
+    except Exception as e:
+        print(f"加载人格数据失败: {e}")
+        return {}
+
+def save_persona_to_file(user_id, persona_name, traits):
+    try:
+        _save_list("personas", "traits", user_id, persona_name, traits)
+    except Exception as e:
+        print(f"保存人格描述失败: {e}")
+
+def load_impressions():
+    try:
+        return _load_lists("impressions", "impression")
+    except Exception as e:
+        print(f"加载印象数据失败: {e}")
+        return {}
+
+def save_impression_to_file(user_id, persona_name, impression):
+    try:
+        _save_list("impressions", "impression", user_id, persona_name, impression)
+    except Exception as e:
+        print(f"保存印象失败: {e}")
+
+def _recent_messages(conn, session_id, limit):
+    """某个会话最近 limit 条聊天记录（按时间正序）"""
+    rows = conn.execute(
+        "SELECT id, role, content, nickname, user_id, time FROM chat_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+        (session_id, limit)).fetchall()
+    messages = []
+    for message_id, role, content, nickname, user_id, time_str in reversed(rows):
+        msg_data = {"id": message_id, "role": role, "content": content, "nickname": nickname, "user_id": user_id}
+        if time_str is not None:
+            msg_data["time"] = time_str
+        messages.append(msg_data)
+    return messages
+
+def _list_sessions(table):
+    with _transaction() as conn:
+        return [sid for (sid,) in conn.execute(_SESSIONS_SQL.format(table=table))]
+
+def list_chat_sessions():
+    """有聊天记录的全部会话"""
+    try:
+        return _list_sessions("chat_messages")
+    except Exception as e:
+        print(f"读取会话列表失败: {e}")
+        return []
+
+def load_session_history(session_id, limit):
+    """某个会话最近 limit 条聊天记录"""
+    try:
+        with _transaction() as conn:
+            return _recent_messages(conn, session_id, limit)
+    except Exception as e:
+        print(f"加载会话 {session_id} 的工作记忆失败: {e}")
+        return []
+
+def load_chat_history(unconsolidated_count):
+    chat_history = {}
+    try:
+        with _transaction() as conn:
+            for (sid,) in conn.execute(_SESSIONS_SQL.format(table="chat_messages")).fetchall():
+                count = unconsolidated_count.get(sid, 0)
+                chat_history[sid] = _recent_messages(conn, sid, max(count, 50))
+                debug_print(1, f"会话 {sid} 加载了 {len(chat_history[sid])} 条历史记录 (未归档数: {count})")
+    except Exception as e:
+        print(f"加载工作记忆失败: {e}")
+    return chat_history
+
+def save_message_to_file(session_id, role, content, ts_str, nickname=None, user_id=None):
+    """追加一条聊天记录，返回其 id"""
+    message_id = new_record_id()
+    try:
+        with _transaction() as conn:
+            conn.execute(
+                "INSERT INTO chat_messages (id, session_id, seq, role, content, time, nickname, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (message_id, str(session_id), message_id, role, content, ts_str, nickname or None, user_id or None))
+    except Exception as e:
+        print(f"保存消息失败: {e}")
+    return message_id
+
+def _patch(table, columns, session_id, record_id, fields):
+    """修改一条记录的若干列；失败时抛出异常"""
+    fields = {k: v for k, v in fields.items() if k in columns}
+    if not fields:
+        return
+    with _transaction() as conn:
+        conn.execute(
+            f"UPDATE {table} SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ? AND session_id = ?",
+            (*fields.values(), record_id, str(session_id)))
+
+def _delete(table, session_id, record_id):
+    with _transaction() as conn:
+        conn.execute(f"DELETE FROM {table} WHERE id = ? AND session_id = ?", (record_id, str(session_id)))
+
+def patch_chat_message(session_id, message_id, fields):
+    """修改一条聊天记录（fields 为内存中的字段名，其中 user_id 为发送者 ID）"""
+    _patch("chat_messages", _CHAT_COLUMNS, session_id, message_id, fields)
+
+def delete_chat_message(session_id, message_id):
+    _delete("chat_messages", session_id, message_id)
+
+def rewrite_chat_history(session_id, messages):
+    """用管理界面编辑后的消息列表替换某个会话的聊天记录（消息须已带 id）；在一个事务中完成，失败时抛出异常"""
+    with _transaction() as conn:
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        conn.executemany(
+            "INSERT INTO chat_messages (id, session_id, seq, role, content, time, nickname, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(m["id"], session_id, seq, m["role"], m["content"], m.get("time"), m.get("nickname"), m.get("user_id")) for seq, m in enumerate(messages)])
+
+def iter_chat_records():
+    """全部现存聊天记录（附 session_id，user_id 为发送者 ID），用于重建全文索引"""
+    with _transaction() as conn:
+        rows = conn.execute("SELECT id, session_id, role, content, time, nickname, user_id FROM chat_messages ORDER BY session_id, seq").fetchall()
+    for message_id, session_id, role, content, time_str, nickname, user_id in rows:
+        yield {"id": message_id, "session_id": session_id, "role": role, "content": content, "time": time_str, "nickname": nickname, "user_id": user_id}
+
+def load_episodic_memory():
+    episodic_memory = {}
+    try:
+        with _transaction() as conn:
+            for episode_id, session_id, summary, time_str in conn.execute("SELECT id, session_id, summary, time FROM episodes ORDER BY session_id, seq"):
+                episodic_memory.setdefault(session_id, []).append({"id": episode_id, "summary": summary, "time": time_str})
+    except Exception as e:
+        print(f"加载情节记忆失败: {e}")
+    return episodic_memory
+
+def list_episodic_sessions():
+    try:
+        return _list_sessions("episodes")
+    except Exception as e:
+        print(f"读取会话列表失败: {e}")
+        return []
+
+def load_session_episodes(session_id):
+    try:
+        with _transaction() as conn:
+            rows = conn.execute("SELECT id, summary, time FROM episodes WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        return [{"id": episode_id, "summary": summary, "time": time_str} for episode_id, summary, time_str in rows]
+    except Exception as e:
+        print(f"加载会话 {session_id} 的情节记忆失败: {e}")
+        return []
+
+def save_episodic_to_file(session_id, summary, time_str):
+    """追加一条情节记忆，返回其 id"""
+    episode_id = new_record_id()
+    try:
+        with _transaction() as conn:
+            conn.execute("INSERT INTO episodes (id, session_id, seq, summary, time) VALUES (?, ?, ?, ?, ?)",
+                         (episode_id, str(session_id), episode_id, summary, time_str or None))
+    except Exception as e:
+        print(f"保存情节记忆失败: {e}")
+    return episode_id
+
+def patch_episode(session_id, episode_id, fields):
+    _patch("episodes", _EPISODE_COLUMNS, session_id, episode_id, fields)
+
+def delete_episode(session_id, episode_id):
+    _delete("episodes", session_id, episode_id)
+
+def rewrite_episodic_memory(session_id, memories):
+    """用管理界面编辑后的列表替换某个会话的情节记忆（记忆须已带 id）"""
+    with _transaction() as conn:
+        conn.execute("DELETE FROM episodes WHERE session_id = ?", (session_id,))
+        conn.executemany("INSERT INTO episodes (id, session_id, seq, summary, time) VALUES (?, ?, ?, ?, ?)",
+                         [(m["id"], session_id, seq, m["summary"], m.get("time")) for seq, m in enumerate(memories)])
+
+def clear_all_records():
+    """清空全部会话的聊天记录与情节记忆（人格与印象保留）；失败时抛出异常"""
+    with _transaction() as conn:
+        conn.execute("DELETE FROM chat_messages")
+        conn.execute("DELETE FROM episodes")
+
+def import_from_jsonl():
+    """把 JSONL 文件中的现存记录（重放修改与删除后）导入数据库，同 id 的记录被覆盖，可重复执行；返回各类记录的条数"""
+    chat, _, _ = persistence_content.replay_log(persistence_content.HISTORY_FILE)
+    episodes, _, _ = persistence_content.replay_log(persistence_content.EPISODIC_FILE)
+    personas, impressions = persistence_content.load_personas(), persistence_content.load_impressions()
+    with _transaction() as conn:
+        # seq 取记录在文件中的顺序，之后追加的记录 (seq = 微秒时间戳) 排在其后
+        conn.executemany(
+            "INSERT OR REPLACE INTO chat_messages (id, session_id, seq, role, content, time, nickname, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((item["id"], str(item.get("user_id")), seq, item.get("role"), item.get("content"), item.get("time"), item.get("nickname"), item.get("user_id_real"))
+             for seq, item in enumerate(chat)))
+        conn.executemany(
+            "INSERT OR REPLACE INTO episodes (id, session_id, seq, summary, time) VALUES (?, ?, ?, ?, ?)",
+            ((item["id"], str(item.get("user_id")), seq, item.get("summary"), item.get("time")) for seq, item in enumerate(episodes)))
+        for table, column, store in (("personas", "traits", personas), ("impressions", "impression", impressions)):
+            # 键的最后一段是人格名（群成员印象的键为 "群号:QQ号:人格名"），与 save_impression_to_file 的拆分一致；
+            # 先删除同一个键按其他方式拆分的行（早期导入按第一个冒号拆分）
+            conn.executemany(f"DELETE FROM {table} WHERE user_id || ':' || persona_name = ?", ((sid,) for sid in store))
+            conn.executemany(
+                f"INSERT INTO {table} (user_id, persona_name, {column}) VALUES (?, ?, ?)",
+                (sid.rsplit(":", 1) + [json.dumps(value, ensure_ascii=False)] for sid, value in store.items()))
+    return {"chat_messages": len(chat), "episodes": len(episodes), "personas": len(personas), "impressions": len(impressions)}
@@ -2,6 +2,15 @@ import os
 import json
 from ..config import MEMORY_STATE_FILE, SOCIAL_STATE_FILE, ACTIVE_PERSONA_FILE
 
+def _write_json(path, data):
+    """写入临时文件并落盘后原子替换，中途崩溃时原文件保持完整"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 def load_memory_state():
     """加载持久化的计数器状态"""
     if os.path.exists(MEMORY_STATE_FILE):
@@ -13,17 +22,18 @@ def load_memory_state():
     return {}
 
 def save_memory_state(evolution_pity_counter, unconsolidated_count, current_topics=None):
-    """保存计数器状态"""
+    """保存计数器状态，返回是否成功"""
     try:
         state = {
             "evolution_pity_counter": evolution_pity_counter,
             "unconsolidated_count": unconsolidated_count,
             "current_topics": current_topics or {}
         }
-        with open(MEMORY_STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        _write_json(MEMORY_STATE_FILE, state)
+        return True
     except Exception as e:
         print(f"保存记忆状态失败: {e}")
+        return False
 
 def load_social_state():
     """加载社交能量与心情状态"""
@@ -36,12 +46,13 @@ def load_social_state():
     return {}
 
 def save_social_state(social_states):
-    """保存社交能量与心情状态"""
+    """保存社交能量与心情状态，返回是否成功"""
     try:
-        with open(SOCIAL_STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(social_states, f, ensure_ascii=False, indent=2)
+        _write_json(SOCIAL_STATE_FILE, social_states)
+        return True
     except Exception as e:
         print(f"保存社交状态失败: {e}")
+        return False
 
 def load_active_personas():
     if os.path.exists(ACTIVE_PERSONA_FILE):
@@ -54,7 +65,6 @@ def load_active_personas():
 
 def save_active_personas(active_personas):
     try:
-        with open(ACTIVE_PERSONA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(active_personas, f, ensure_ascii=False, indent=2)
+        _write_json(ACTIVE_PERSONA_FILE, active_personas)
     except Exception as e:
         print(f"保存活跃人格失败: {e}")
@@ -25,6 +25,15 @@ def clear_prompt_cache():
     _prompt_cache = None
 
 def build_prompt(session_id, current_message, chat_history, episodic_memory, personas, impressions, social_energy, mood, current_topics, current_time=None, is_group=False):
+    prefix, suffix = build_prompt_parts(session_id, current_message, chat_history, episodic_memory, personas, impressions, social_energy, mood, current_topics, current_time, is_group)
+    return f"{prefix}\n{suffix}"
+
+def build_prompt_parts(session_id, current_message, chat_history, episodic_memory, personas, impressions, social_energy, mood, current_topics, current_time=None, is_group=False):
+    """构建回复提示词，返回 (稳定前缀, 易变后缀)
+
+    前缀只包含人格、印象、情节记忆这类很少变化的内容，可以被服务端缓存（隐式前缀缓存或 cachedContents）；
+    时间、社交状态、对话历史和当前消息等每次都变的内容全部放在后缀。
+    """
     config = load_prompt_config().get("templates", {})
     history, summaries = chat_history.get(session_id, []), episodic_memory.get(session_id, [])
     persona_name = session_id.split(":")[-1] if ":" in session_id else DEFAULT_PERSONA_NAME
@@ -56,8 +65,7 @@ def build_prompt(session_id, current_message, chat_history, episodic_memory, per
     social_state_text = "\n".join(social_state_parts) if social_state_parts else "当前无额外社交状态。"
     now_str = format_timestamp(current_time or get_now_timestamp())
     
-    prompt_parts = [
-        config["system_info"].format(now_str=now_str, social_state_text=social_state_text),
+    prefix_parts = [
         config["personality"].format(persona_text=persona_text),
         config["user_impression"].format(user_impression=user_impression)
     ]
@@ -72,10 +80,11 @@ def build_prompt(session_id, current_message, chat_history, episodic_memory, per
             else:
                 formatted_episodes.append(f"[情节 #{i+1}]: {e}")
         episodic_content = "\n".join(formatted_episodes)
-        prompt_parts.append(config["episodic_memory"].format(episodic_content=episodic_content))
+        prefix_parts.append(config["episodic_memory"].format(episodic_content=episodic_content))
 
     from ..handlers.processor_utils import format_history_to_xml
     history_content = format_history_to_xml(history)
+    prompt_parts = [config["system_info"].format(now_str=now_str, social_state_text=social_state_text)]
     prompt_parts.append(config["conversation_history"].format(history_content=history_content))
     prompt_parts.append(config["current_message"].format(msg_time_str=format_timestamp(current_time) if current_time else now_str, current_message=current_message))
     topic_instr = ""
@@ -93,4 +102,4 @@ def build_prompt(session_id, current_message, chat_history, episodic_memory, per
     if not is_group and not summaries and not any(msg["role"] == "assistant" for msg in history):
         prompt_parts.append(config.get("first_meeting_private", ""))
     
-    return "\n".join(prompt_parts)
+    return "\n".join(prefix_parts), "\n".join(prompt_parts)
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from .. import config
+from ..metrics import MEMORY_CACHE_LOOKUPS, MEMORY_CACHE_EVICTIONS, MEMORY_CACHE_SESSIONS, MEMORY_CACHE_BYTES
+
+# 记录大小的估算：正文按每字 2 字节，另加每条记录（字典及其他字段）的固定开销
+_RECORD_OVERHEAD = 500
+
+class SessionCache(dict):
+    """按会话懒加载的记忆字典（会话 ID -> 记录列表）
+
+    首次访问某个会话时由 loader 从存储读取，驻留的会话按最近访问排序，
+    超出 memory.cache_max_sessions 个会话或估算大小超出 memory.cache_max_mb 时移出最久未访问的会话。
+    消息与情节在产生时已即时写入存储，移出只是释放内存，再次访问时重新加载（与重启后加载相同）；
+    pinned(sid) 为真的会话（正在归档）不会被移出。遍历、len() 与 keys() 只涉及驻留的会话，
+    存储中的全部会话见 stored_sessions()。
+    不在存储会话列表中的会话不调用 loader；加载结果为空的会话也记下来，直到该会话驻留或 mark_stored() 前不再加载。
+    驻留会话的记录被原地追加后，下次访问时重新估算大小并检查上限。
+    """
+    def __init__(self, name, loader, lister, text_key, pinned=lambda sid: False):
+        super().__init__()
+        self.name, self.loader, self.lister, self.text_key, self.pinned = name, loader, lister, text_key, pinned
+        # 驻留会话按访问顺序排列：sid -> (上次估算时的条数, 估算字节)
+        self._sizes: OrderedDict[str, tuple[int, int]] = OrderedDict()
+        self._bytes = 0
+        # 存储中有记录的会话（首次需要时由 lister 取得，之后随写入维护）与加载结果为空的会话
+        self._stored: set[str] | None = None
+        self._missing: set[str] = set()
+
+    def _estimate(self, items):
+        return sum(len(str(item.get(self.text_key) or "")) * 2 + _RECORD_OVERHEAD for item in items)
+
+    def _track(self, sid, items):
+        """记录会话的访问与大小；条数变化时重新估算，返回大小是否变化"""
+        count, size = self._sizes.get(sid, (-1, 0))
+        changed = count != len(items)
+        if changed:
+            # 只是在末尾追加时只估算新增的记录
+            new_size = size + self._estimate(items[count:]) if 0 <= count < len(items) else self._estimate(items)
+            self._bytes += new_size - size
+            self._sizes[sid] = (len(items), new_size)
+        self._sizes.move_to_end(sid)
+        return changed
+
+    def _load(self, sid):
+        """从存储加载会话；已知没有记录的会话不访问存储"""
+        if sid in self._missing:
+            return []
+        if self._stored is None:
+            self._stored = set(self.lister()) | set(self._sizes)
+        items = self.loader(sid) if sid in self._stored else []
+        if not items:
+            self._missing.add(sid)
+        return items
+
+    def _materialize(self, sid, keep_empty=False):
+        """取会话的记录列表，不在内存中时加载；没有记录的会话只在 keep_empty 时（调用方可能追加）驻留"""
+        if dict.__contains__(self, sid):
+            MEMORY_CACHE_LOOKUPS.inc(store=self.name, result="hit")
+            items = dict.__getitem__(self, sid)
+            # 调用方可能在上次访问后原地追加了记录
+            if self._track(sid, items):
+                self._evict()
+            return items
+        MEMORY_CACHE_LOOKUPS.inc(store=self.name, result="miss")
+        items = self._load(sid)
+        if items or keep_empty:
+            self[sid] = items
+        return items
+
+    def _over_limit(self):
+        max_sessions = config.MEMORY_CACHE_MAX_SESSIONS or 0
+        max_bytes = (config.MEMORY_CACHE_MAX_MB or 0) * 1024 * 1024
+        return (max_sessions and len(self) > max_sessions) or (max_bytes and self._bytes > max_bytes)
+
+    def _evict(self):
+        if self._over_limit():
+            # 最近访问的会话（刚加载或写入的会话）不移出
+            newest = next(reversed(self._sizes), None)
+            for sid in list(self._sizes):
+                if not self._over_limit():
+                    break
+                if sid == newest or self.pinned(sid):
+                    continue
+                self.pop(sid)
+                MEMORY_CACHE_EVICTIONS.inc(store=self.name)
+        MEMORY_CACHE_SESSIONS.set(len(self), store=self.name)
+        MEMORY_CACHE_BYTES.set(self._bytes, store=self.name)
+
+    def __getitem__(self, sid):
+        return self._materialize(sid, keep_empty=True)
+
+    def get(self, sid, default=None):
+        if dict.__contains__(self, sid):
+            return self._materialize(sid)
+        return self._materialize(sid) or default
+
+    def __contains__(self, sid):
+        """会话有记录时为真（按需加载）"""
+        return bool(self._materialize(sid))
+
+    def setdefault(self, sid, default=None):
+        items = self._materialize(sid, keep_empty=True)
+        if not items and default:
+            self[sid] = items = default
+        return items
+
+    def __setitem__(self, sid, items):
+        dict.__setitem__(self, sid, items)
+        # 驻留的会话随时可能被追加并写入存储
+        self.mark_stored(sid)
+        if sid in self._sizes:
+            self._bytes -= self._sizes.pop(sid)[1]
+        self._track(sid, items)
+        self._evict()
+
+    def pop(self, sid, *default):
+        if sid in self._sizes:
+            self._bytes -= self._sizes.pop(sid)[1]
+        return dict.pop(self, sid, *default)
+
+    def __delitem__(self, sid):
+        self.pop(sid)
+
+    def clear(self):
+        dict.clear(self)
+        self._sizes.clear()
+        self._bytes = 0
+        self._evict()
+
+    def mark_stored(self, sid):
+        """会话的记录已写入存储（不经由本字典写入时调用），之后访问时会从存储加载"""
+        self._missing.discard(sid)
+        if self._stored is not None:
+            self._stored.add(sid)
+
+    def stored_sessions(self) -> list[str]:
+        """存储中有记录的全部会话（含未驻留的）；可在线程中调用"""
+        return self.lister()
@@ -0,0 +1,247 @@
+import json
+import math
+import threading
+import time
+from . import config
+from .monitor import monitor_writer
+
+# 指标名前缀（Prometheus 格式）
+PREFIX = "moebot_"
+# 直方图的滑动窗口按分钟分槽
+_SLOT_SECONDS = 60
+# 小于该值的观测值计入最小桶（秒）
+_MIN_VALUE = 1e-4
+# Prometheus 导出时使用的累计桶上界（秒），均为两位有效数字，与直方图的桶边界对齐
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_SERIES_SQL = "INSERT OR REPLACE INTO metrics (name, labels, kind, help, data, updated_at) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"
+
+def bucket_key(value: float) -> int:
+    """HDR 式对数-线性分桶：保留两位有效数字，相对误差不超过 10%，桶数与量程的对数成正比
+
+    桶 key = 指数 * 100 + 两位尾数 (10..99)，key 的大小顺序与数值顺序一致。
+    """
+    value = max(value, _MIN_VALUE)
+    exponent = math.floor(math.log10(value))
+    mantissa = int(value / 10 ** (exponent - 1) + 1e-9)
+    if mantissa >= 100:
+        exponent, mantissa = exponent + 1, 10
+    return exponent * 100 + mantissa
+
+def bucket_upper(key: int) -> float:
+    exponent, mantissa = divmod(key, 100)
+    return (mantissa + 1) * 10 ** (exponent - 1)
+
+def _merge(target: dict[int, int], source: dict) -> dict[int, int]:
+    for key, count in source.items():
+        target[int(key)] = target.get(int(key), 0) + count
+    return target
+
+def percentile(buckets: dict[int, int], q: float, maximum: float | None = None) -> float | None:
+    """按桶计数求分位数，返回所在桶的上界（不超过观测到的最大值）"""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank, seen = max(1, math.ceil(total * q)), 0
+    for key in sorted(buckets):
+        seen += buckets[key]
+        if seen >= rank:
+            upper = bucket_upper(key)
+            return round(min(upper, maximum) if maximum is not None else upper, 6)
+    return None
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def to_dict(self) -> dict:
+        return {"value": self.value}
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def to_dict(self) -> dict:
+        return {"value": self.value}
+
+class Histogram:
+    """稀疏的对数-线性桶计数，额外按分钟分槽保留最近 monitor.metrics_window 秒的观测，用于看当前的 p95/p99"""
+    kind = "histogram"
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max: float | None = None
+        self.slots: list[list] = []
+
+    def observe(self, value: float):
+        key = bucket_key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+        slot_start = int(time.time() // _SLOT_SECONDS * _SLOT_SECONDS)
+        if not self.slots or self.slots[-1][0] != slot_start:
+            self.slots.append([slot_start, {}])
+            keep = math.ceil(config.MONITOR_METRICS_WINDOW / _SLOT_SECONDS) + 1
+            del self.slots[:-keep]
+        slot = self.slots[-1][1]
+        slot[key] = slot.get(key, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {"buckets": dict(self.buckets), "count": self.count, "sum": self.sum, "max": self.max, "slots": [[start, dict(b)] for start, b in self.slots]}
+
+class Metric:
+    """一个指标族：名称、说明与标签名固定，按标签值区分序列"""
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, factory, label_names: tuple[str, ...]):
+        self.registry, self.name, self.help, self.factory, self.label_names = registry, name, help_text, factory, label_names
+        self.series: dict[tuple, Counter | Gauge | Histogram] = {}
+
+    def _update(self, labels: dict, action):
+        key = tuple(str(labels.get(name) or "") for name in self.label_names)
+        with self.registry.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = self.factory()
+            action(series)
+        self.registry.persist(self, key, series)
+
+    def inc(self, amount: float = 1, **labels):
+        self._update(labels, lambda s: s.inc(amount))
+
+    def set(self, value: float, **labels):
+        self._update(labels, lambda s: s.set(value))
+
+    def observe(self, value: float, **labels):
+        self._update(labels, lambda s: s.observe(value))
+
+class MetricsRegistry:
+    """机器人进程内的指标注册表
+
+    观测只在内存中累加；每个变化的序列以 upsert 交给监控库的后台写入线程，
+    同一序列在一次写入周期 (约 0.5 秒) 内只序列化、写入一次。监控网页从 metrics 表读取并计算分位数，
+    以 JSON (/api/metrics) 与 Prometheus 文本格式 (/metrics) 导出。进程重启时清空上一个进程的序列。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: dict[str, Metric] = {}
+        self._started = False
+
+    def _register(self, name: str, help_text: str, factory, label_names: tuple[str, ...]) -> Metric:
+        metric = self.metrics[name] = Metric(self, name, help_text, factory, label_names)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Metric:
+        return self._register(name, help_text, Counter, label_names)
+
+    def gauge(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Metric:
+        return self._register(name, help_text, Gauge, label_names)
+
+    def histogram(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Metric:
+        return self._register(name, help_text, Histogram, label_names)
+
+    def _start(self):
+        self._started = True
+        start_time = time.time()
+        # 写入队列中排在本进程所有序列之前
+        monitor_writer.append(None, lambda: [
+            ("DELETE FROM metrics", ()),
+            (_SERIES_SQL, ("process_start_time_seconds", "{}", "gauge", "机器人进程启动时间 (Unix 时间戳)", json.dumps({"value": start_time})))
+        ])
+
+    def persist(self, metric: Metric, key: tuple, series):
+        if not self._started:
+            self._start()
+        labels = json.dumps(dict(zip(metric.label_names, key)), ensure_ascii=False, sort_keys=True)
+
+        def prepare():
+            # 在写入线程中序列化，取锁避免与事件循环中的更新并发
+            with self.lock:
+                data = json.dumps(series.to_dict())
+            return [(_SERIES_SQL, (metric.name, labels, series.kind, metric.help, data))]
+
+        monitor_writer.upsert(("metrics", metric.name, labels), None, prepare)
+
+registry = MetricsRegistry()
+
+LLM_LATENCY = registry.histogram("llm_latency_seconds", "LLM 调用耗时（发出请求到收到完整响应，不含排队）", ("call_type", "model"))
+LLM_QUEUE_WAIT = registry.histogram("llm_queue_wait_seconds", "LLM 请求在调度器中的排队时间", ("call_type",))
+LLM_REQUESTS = registry.counter("llm_requests_total", "LLM 调用次数，status 为 HTTP 状态码或 error（网络错误、超时）", ("call_type", "model", "status"))
+LLM_STREAM_FIRST_ITEM = registry.histogram("llm_stream_first_item_seconds", "流式回复中第一条回复解析完成的耗时", ("model",))
+MESSAGES_RECEIVED = registry.counter("messages_received_total", "进入决策流程的消息数", ("chat",))
+DEBOUNCE_WAIT = registry.histogram("debounce_wait_seconds", "一批消息中最早一条从收到到开始处理的等待时间（防抖）", ("chat",))
+SESSION_QUEUE_DEPTH = registry.gauge("session_queue_depth", "会话中等待处理的消息数", ("session_id",))
+REPLY_LATENCY = registry.histogram("reply_latency_seconds", "端到端耗时：一批消息中最早一条从收到到发出第一条回复", ("chat",))
+MEMORY_CACHE_LOOKUPS = registry.counter("memory_cache_lookups_total", "按会话读取记忆的次数，result 为 hit（已在内存中）或 miss（从存储加载）", ("store", "result"))
+MEMORY_CACHE_EVICTIONS = registry.counter("memory_cache_evictions_total", "超出 memory.cache_max_sessions / cache_max_mb 后移出内存的会话数", ("store",))
+MEMORY_CACHE_SESSIONS = registry.gauge("memory_cache_sessions", "驻留内存的会话数", ("store",))
+MEMORY_CACHE_BYTES = registry.gauge("memory_cache_bytes", "驻留内存的记录估算大小（字节）", ("store",))
+MEMORY_STATE_WRITES = registry.counter("memory_state_writes_total", "状态文件的写入次数（多次变化合并为一次写入，见 memory.checkpoint_interval）", ("file",))
+
+def summarize(kind: str, data: dict, window: float, now: float | None = None) -> dict:
+    """把 metrics 表中的一条序列整理为展示用的摘要；直方图给出全部与最近 window 秒的 p50/p95/p99"""
+    if kind != "histogram":
+        return {"value": data.get("value")}
+    now = time.time() if now is None else now
+    recent: dict[int, int] = {}
+    for start, buckets in data.get("slots", []):
+        if start + _SLOT_SECONDS > now - window:
+            _merge(recent, buckets)
+    total = _merge({}, data.get("buckets", {}))
+    count = data.get("count", 0)
+    result = {"count": count, "mean": round(data["sum"] / count, 6) if count else None, "max": data.get("max"), "recent_count": sum(recent.values())}
+    for q in QUANTILES:
+        label = f"p{int(q * 100)}"
+        result[label] = percentile(total, q, data.get("max"))
+        result[f"recent_{label}"] = percentile(recent, q, data.get("max"))
+    return result
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(labels: dict, extra: dict | None = None) -> str:
+    items = {**labels, **(extra or {})}
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items.items()) + "}" if items else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() and abs(value) < 1e15 else repr(float(value))
+
+def render_prometheus(rows: list[dict]) -> str:
+    """按 Prometheus 文本格式 (0.0.4) 输出；rows 为 metrics 表的行 (name, labels, kind, help, data)"""
+    families: dict[str, list[dict]] = {}
+    for row in rows:
+        families.setdefault(row["name"], []).append(row)
+    lines = []
+    for name in sorted(families):
+        series = families[name]
+        full_name = PREFIX + name
+        lines.append(f"# HELP {full_name} {series[0]['help'] or name}")
+        lines.append(f"# TYPE {full_name} {series[0]['kind']}")
+        for row in series:
+            labels, data = json.loads(row["labels"] or "{}"), json.loads(row["data"] or "{}")
+            if row["kind"] != "histogram":
+                lines.append(f"{full_name}{_label_text(labels)} {_format_value(data.get('value') or 0)}")
+                continue
+            buckets = sorted((bucket_upper(int(k)), c) for k, c in data.get("buckets", {}).items())
+            cumulative, index = 0, 0
+            for le in PROMETHEUS_BUCKETS:
+                while index < len(buckets) and buckets[index][0] <= le * (1 + 1e-9):
+                    cumulative += buckets[index][1]
+                    index += 1
+                lines.append(f"{full_name}_bucket{_label_text(labels, {'le': _format_value(le)})} {cumulative}")
+            lines.append(f"{full_name}_bucket{_label_text(labels, {'le': '+Inf'})} {data.get('count', 0)}")
+            lines.append(f"{full_name}_sum{_label_text(labels)} {_format_value(data.get('sum', 0))}")
+            lines.append(f"{full_name}_count{_label_text(labels)} {data.get('count', 0)}")
+    return "\n".join(lines) + "\n"
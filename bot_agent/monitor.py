@@ -1,58 +1,464 @@
 import sqlite3
 import json
 import os
+import io
+import time
+import uuid
+import zlib
+import base64
+import hashlib
+import atexit
+import threading
+from contextvars import ContextVar
+from .ipc import live_hub
+from . import monitor_search
 
 DB_PATH = "data/ai_monitor.db"
 
+# 后台写入：待写记录上限（超出后丢弃新的追加类记录）、积压到多少条时立即唤醒写入线程、无唤醒时的刷写间隔（秒）
+_MAX_PENDING = 10000
+_WAKEUP_BATCH = 200
+_FLUSH_INTERVAL = 0.5
+# 序列化后超过该长度的请求体 / 响应体存入 blobs（zlib 压缩、按 sha256 去重），否则直接内联
+_INLINE_LIMIT = 2048
+# 写入线程记住最近写过的 blob，重复内容（重试、同一张图片）不再压缩
+_SEEN_BLOBS_MAX = 4096
+# append(..., ordered=True) 的记录在积压中的标记：写入时不与其他记录按 SQL 合并，之前的记录先写、之后的记录后写
+_ORDERED = "__ordered__"
+
+# 当前任务中最近一次 LLM 调用的 (request_id, 是否记录了请求体)：决策记录据此关联 ai_logs，不再重复保存提示词
+_last_request: ContextVar[tuple[str, bool] | None] = ContextVar("last_request", default=None)
+
+_USER_ACTIVITY_SQL = """
+    INSERT INTO user_activity (session_id, user_id, nickname, message_count, last_message_time)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(session_id, user_id) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        nickname = excluded.nickname,
+        last_message_time = CURRENT_TIMESTAMP
+"""
+
+def _serialize(value):
+    """dict 参数留到写入线程里再转成 JSON，不占用事件循环"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _thumbnail(raw: bytes) -> str | None:
+    """生成 base64 WebP 缩略图，供监控网页预览；失败时返回 None"""
+    try:
+        from PIL import Image
+        from .config import MONITOR_THUMBNAIL_SIZE
+        with Image.open(io.BytesIO(raw)) as img:
+            img.thumbnail((MONITOR_THUMBNAIL_SIZE, MONITOR_THUMBNAIL_SIZE))
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, format="WEBP", quality=60)
+        return base64.b64encode(buf.getvalue()).decode("ascii")
+    except Exception:
+        return None
+
+class MonitorWriter:
+    """监控库的后台写入线程 (write-behind)
+
+    调用方只把 (SQL, 参数) 放进内存即返回，不在事件循环里打开连接或提交事务。
+    写入线程持有一个 WAL 模式的长连接，每次取出全部积压记录，按 SQL 分组 executemany，在一个事务中提交。
+    - 追加类记录 (ai_logs / ai_decisions / llm_json_stats) 积压超过 _MAX_PENDING 时丢弃新记录并计数
+    - 状态类记录 (llm_endpoints / metrics) 按主键合并，只写最新值；user_activity 按 (会话, 用户) 累加消息数
+    - 全文索引 (fts_*) 与来源记录在同一事务中写入
+    - ordered=True 的记录是顺序屏障：不与前后的记录合并分组（如先删除再重建某个会话的索引）
+    - 进程退出时 (atexit) 或调用 flush() 时同步写完积压记录
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._pending: list[tuple[str, tuple]] = []
+        self._latest: dict[tuple, tuple[str, tuple]] = {}
+        self._activity: dict[tuple[str, str], list] = {}
+        self._flush_waiters: list[threading.Event] = []
+        self._atexit_registered = False
+        # 仅由写入线程访问
+        self._seen_blobs: dict[str, str | None] = {}
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="monitor-writer", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def append(self, sql: str | None, params, ordered: bool = False):
+        """sql 为 None 时 params 是一个在写入线程中调用、返回 [(sql, params), ...] 的函数
+
+        ordered 为真时这些语句按给出的顺序执行，且排在之前追加的全部记录之后、之后追加的记录之前。
+        """
+        with self._lock:
+            if len(self._pending) >= _MAX_PENDING and not ordered:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    print(f"Monitor writer backlog full, dropped {self.dropped} records")
+                return
+            if ordered:
+                statements = params if sql is None else (lambda s=sql, p=params: [(s, p)])
+                sql, params = _ORDERED, statements
+            self._pending.append((sql, params))
+            backlog = len(self._pending)
+        self._ensure_started()
+        if backlog >= _WAKEUP_BATCH:
+            self._wakeup.set()
+
+    def upsert(self, key: tuple, sql: str, params: tuple):
+        """同一 key 只保留最后一次写入（包括删除语句）"""
+        with self._lock:
+            self._latest.pop(key, None)
+            self._latest[key] = (sql, params)
+        self._ensure_started()
+
+    def add_activity(self, session_id: str, user_id: str, nickname: str):
+        with self._lock:
+            entry = self._activity.setdefault((session_id, user_id), [nickname, 0])
+            entry[0] = nickname
+            entry[1] += 1
+        self._ensure_started()
+
+    def flush(self, timeout: float = 5.0):
+        """等待写入线程写完调用前积压的记录"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        with self._lock:
+            self._flush_waiters.append(done)
+        self._wakeup.set()
+        done.wait(timeout)
+
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    def close(self, timeout: float = 5.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        monitor_search.register_functions(conn)
+        # 启动后稍等再做第一次清理，避开启动时的写入高峰
+        next_prune = time.time() + 60
+        try:
+            while True:
+                self._wakeup.wait(_FLUSH_INTERVAL)
+                self._wakeup.clear()
+                self._drain(conn)
+                if not self._stopping and time.time() >= next_prune:
+                    from .config import MONITOR_PRUNE_INTERVAL
+                    next_prune = time.time() + max(60, MONITOR_PRUNE_INTERVAL)
+                    self._prune(conn)
+                if self._stopping:
+                    # 退出前再取一次，写完等待期间新到的记录
+                    self._drain(conn)
+                    break
+        finally:
+            conn.close()
+
+    def _drain(self, conn: sqlite3.Connection):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            latest, self._latest = self._latest, {}
+            activity, self._activity = self._activity, {}
+            waiters, self._flush_waiters = self._flush_waiters, []
+        if pending or latest or activity:
+            # 按 SQL 分组；dict 保持首次出现的顺序，同一 SQL 内保持调用顺序。
+            # 顺序屏障把积压切成几段，各段分别分组、按先后执行
+            segments: list[dict[str, list[tuple]]] = [{}]
+            for sql, params in pending + list(latest.values()):
+                ordered = sql == _ORDERED
+                if sql is None or ordered:
+                    try:
+                        statements = params()
+                    except Exception as e:
+                        print(f"Failed to prepare monitor record: {e}")
+                        continue
+                else:
+                    statements = [(sql, params)]
+                if ordered:
+                    segments.append({})
+                groups = segments[-1]
+                for stmt_sql, stmt_params in statements:
+                    groups.setdefault(stmt_sql, []).append(tuple(_serialize(v) for v in stmt_params))
+                if ordered:
+                    segments.append({})
+            if activity:
+                segments[-1][_USER_ACTIVITY_SQL] = [(sid, uid, nick, count) for (sid, uid), (nick, count) in activity.items()]
+            count = sum(len(rows) for groups in segments for rows in groups.values())
+            try:
+                with conn:
+                    for groups in segments:
+                        for sql, rows in groups.items():
+                            conn.executemany(sql, rows)
+                self.written += count
+            except Exception as e:
+                # 本批中的 blob 未写入，不能再被当作已存在而跳过
+                self._seen_blobs.clear()
+                print(f"Failed to write monitor batch ({count} records): {e}")
+        for waiter in waiters:
+            waiter.set()
+
+    def _prune(self, conn: sqlite3.Connection):
+        """在写入线程中按保留策略清理；每批删除之间照常写入积压的新记录"""
+        from .monitor_retention import prune
+        try:
+            # 被回收的 blob 不能再当作已存在而跳过写入（清理期间批次之间仍会写入新记录）
+            result = prune(conn, between_batches=lambda: self._drain(conn), forget_blobs=self._forget_blobs)
+        except Exception as e:
+            print(f"Failed to prune monitor database: {e}")
+            return
+        if any(k != "vacuum_time" for k in result):
+            print(f"[Monitor] 已清理过期记录: {result}")
+
+    def _forget_blobs(self, digests: list[str]):
+        for digest in digests:
+            self._seen_blobs.pop(digest, None)
+
+    def store_blob(self, data: bytes, codec: str, statements: list) -> str:
+        """在写入线程中调用：按内容哈希去重，新内容追加一条 INSERT OR IGNORE 到 statements，返回哈希"""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._seen_blobs:
+            return digest
+        if len(self._seen_blobs) >= _SEEN_BLOBS_MAX:
+            self._seen_blobs.clear()
+        self._seen_blobs[digest] = None
+        stored = zlib.compress(data, 6) if codec == "zlib" else data
+        statements.append(("INSERT OR IGNORE INTO blobs (hash, codec, raw_size, data) VALUES (?, ?, ?, ?)", (digest, codec, len(data), stored)))
+        return digest
+
+    def store_text(self, text: str | None, statements: list) -> tuple[str | None, str | None]:
+        """短文本内联，长文本存为 blob；返回 (内联文本, blob 哈希)，二者至多一个非空"""
+        if text is None or len(text) <= _INLINE_LIMIT:
+            return text, None
+        return None, self.store_blob(text.encode("utf-8"), "zlib", statements)
+
+    def extract_images(self, payload: dict, statements: list, refs: list[str]) -> dict:
+        """把 parts 中的 base64 图片换成 blob 引用 + 缩略图（原图不重新压缩，按哈希去重），不修改传入的字典"""
+        contents = payload.get("contents") if isinstance(payload, dict) else None
+        if not contents:
+            return payload
+        new_contents = []
+        for content in contents:
+            parts = []
+            for part in content.get("parts", []):
+                key = next((k for k in ("inline_data", "inlineData") if k in part), None)
+                inline = part.get(key) if key else None
+                if isinstance(inline, dict) and inline.get("data"):
+                    raw = base64.b64decode(inline["data"])
+                    digest = self.store_blob(raw, "raw", statements)
+                    if self._seen_blobs.get(digest) is None:
+                        self._seen_blobs[digest] = _thumbnail(raw)
+                    ref = {k: v for k, v in inline.items() if k != "data"}
+                    ref["blob_ref"] = digest
+                    if self._seen_blobs[digest]:
+                        ref["thumbnail"] = self._seen_blobs[digest]
+                    refs.append(digest)
+                    parts.append({**part, key: ref})
+                else:
+                    parts.append(part)
+            new_contents.append({**content, "parts": parts})
+        return {**payload, "contents": new_contents}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            backlog = len(self._pending) + len(self._latest) + len(self._activity)
+        return {"backlog": backlog, "written": self.written, "dropped": self.dropped}
+
+monitor_writer = MonitorWriter(DB_PATH)
+
+def flush_monitor(timeout: float = 5.0):
+    """写完监控记录的积压（机器人关闭时调用；进程退出时 atexit 也会兜底）"""
+    monitor_writer.flush(timeout)
+
+def _ensure_columns(cursor, table: str, columns: dict[str, str]):
+    """为旧数据库补齐新增列（CREATE TABLE IF NOT EXISTS 不会修改已存在的表）"""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, col_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
 def init_db():
     os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # 首次建立全文索引时另一进程可能持有写锁，等待时间放宽
+    conn = sqlite3.connect(DB_PATH, timeout=60)
+    # 增量 VACUUM：清理过期记录后按页回收空间，不需要锁住整库的完整 VACUUM
+    from .monitor_retention import ensure_incremental_vacuum
+    ensure_incremental_vacuum(conn)
+    # WAL 模式持久保存在库文件中：后台写入与监控网页的读取互不阻塞
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
     cursor.execute('CREATE TABLE IF NOT EXISTS ai_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, request_payload TEXT, response_body TEXT, model TEXT, duration REAL)')
     cursor.execute('CREATE TABLE IF NOT EXISTS ai_decisions (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, decision_type TEXT, session_id TEXT, decision_result TEXT, reason TEXT, prompt TEXT, duration REAL)')
     cursor.execute('CREATE TABLE IF NOT EXISTS config_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, config_section TEXT, config_key TEXT, old_value TEXT, new_value TEXT, change_source TEXT)')
+    # 活跃任务已改为内存状态 + 本地事件通道推送，该表不再写入，仅为兼容旧库保留
     cursor.execute('CREATE TABLE IF NOT EXISTS active_tasks (session_id TEXT PRIMARY KEY, status TEXT, message_count INTEGER, last_update DATETIME DEFAULT CURRENT_TIMESTAMP)')
     cursor.execute('CREATE TABLE IF NOT EXISTS user_activity (session_id TEXT, user_id TEXT, nickname TEXT, message_count INTEGER DEFAULT 1, last_message_time DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (session_id, user_id))')
+    # connect_time: 本次请求花在 TCP + TLS 握手上的时间，连接复用时为 0
+    # call_type / session_id: 调用类型与来源会话；queue_wait: 在调度器中排队的时间
+    cursor.execute('CREATE TABLE IF NOT EXISTS llm_json_stats (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, call_type TEXT, session_id TEXT, structured INTEGER, attempts INTEGER, parse_failures INTEGER, success INTEGER)')
+    _ensure_columns(cursor, "ai_logs", {"connect_time": "REAL", "call_type": "TEXT", "session_id": "TEXT", "queue_wait": "REAL"})
+    _ensure_columns(cursor, "llm_json_stats", {"repaired": "INTEGER DEFAULT 0"})
+    # 来自 usageMetadata 的 token 计数；cached_tokens 为其中命中上下文缓存的部分（已包含在 prompt_tokens 内）
+    _ensure_columns(cursor, "ai_logs", {"prompt_tokens": "INTEGER", "candidate_tokens": "INTEGER", "thought_tokens": "INTEGER", "cached_tokens": "INTEGER", "total_tokens": "INTEGER"})
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_session_time ON ai_logs (session_id, timestamp)')
+    # endpoint: 实际处理该请求的 LLM 端点
+    _ensure_columns(cursor, "ai_logs", {"endpoint": "TEXT"})
+    # 大请求体 / 响应体与图片按内容哈希去重存放；ai_logs 中对应列为空时由 request_hash / response_hash 还原，
+    # image_refs 为请求中图片的哈希列表；request_id 供 ai_decisions 关联
+    cursor.execute('CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, codec TEXT, raw_size INTEGER, data BLOB, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)')
+    _ensure_columns(cursor, "ai_logs", {"request_id": "TEXT", "request_hash": "TEXT", "response_hash": "TEXT", "image_refs": "TEXT", "payload_skipped": "INTEGER DEFAULT 0"})
+    _ensure_columns(cursor, "ai_decisions", {"request_id": "TEXT"})
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_request_id ON ai_logs (request_id)')
+    # 回收 blob 时按哈希检查引用；按时间范围汇总的查询走时间索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_request_hash ON ai_logs (request_hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_response_hash ON ai_logs (response_hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_time ON ai_logs (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_json_stats_time ON llm_json_stats (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_blobs_created ON blobs (created_at)')
+    # 监控网页的过滤与游标分页：单列索引中相同键按 rowid 有序，等值过滤 + id < cursor 直接走索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_session ON ai_logs (session_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_call_type ON ai_logs (call_type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_logs_model ON ai_logs (model)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_decisions_session ON ai_decisions (session_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_decisions_type ON ai_decisions (decision_type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_decisions_time ON ai_decisions (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_decisions_request_id ON ai_decisions (request_id)')
+    # 机器人进程的指标注册表快照（见 metrics.py），每个序列一行
+    cursor.execute('CREATE TABLE IF NOT EXISTS metrics (name TEXT, labels TEXT, kind TEXT, help TEXT, data TEXT, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (name, labels))')
+    cursor.execute('CREATE TABLE IF NOT EXISTS llm_endpoints (url TEXT PRIMARY KEY, state TEXT, consecutive_failures INTEGER, total_requests INTEGER, total_failures INTEGER, ewma_latency REAL, p95_latency REAL, in_flight INTEGER, opened_at REAL, last_update DATETIME DEFAULT CURRENT_TIMESTAMP)')
     conn.commit()
+    # ai_logs.image_refs 按行展开的图片引用表（见 monitor_retention.py）
+    from .monitor_retention import ensure_image_refs
+    ensure_image_refs(conn)
+    # 决策理由、提示词、响应与聊天记录的 FTS5 全文索引（见 monitor_search.py）
+    monitor_search.ensure_search_index(conn)
     conn.close()
 
+def update_endpoint_state(state: dict):
+    """写入 LLM 端点的断路器与延迟状态，供监控后台展示"""
+    monitor_writer.upsert(
+        ("llm_endpoints", state["url"]),
+        "INSERT OR REPLACE INTO llm_endpoints (url, state, consecutive_failures, total_requests, total_failures, ewma_latency, p95_latency, in_flight, opened_at, last_update) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (state["url"], state["state"], state["consecutive_failures"], state["total_requests"], state["total_failures"], state["ewma_latency"], state["p95_latency"], state["in_flight"], state["opened_at"])
+    )
+
 def update_active_task(session_id: str, status: str, message_count: int = 0):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.cursor().execute("INSERT OR REPLACE INTO active_tasks (session_id, status, message_count, last_update) VALUES (?, ?, ?, CURRENT_TIMESTAMP)", (session_id, status, message_count))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Failed to update active task: {e}")
+    """活跃任务只保存在内存中，通过本地事件通道推送给监控网页（见 ipc.py）"""
+    live_hub.set_task(session_id, status, message_count)
 
 def remove_active_task(session_id: str):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.cursor().execute("DELETE FROM active_tasks WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Failed to remove active task: {e}")
+    live_hub.remove_task(session_id)
 
-def log_ai_interaction(payload: dict, response: str | dict, model: str, duration: float):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.cursor().execute("INSERT INTO ai_logs (request_payload, response_body, model, duration) VALUES (?, ?, ?, ?)", (json.dumps(payload, ensure_ascii=False), json.dumps(response, ensure_ascii=False) if isinstance(response, dict) else response, model, duration))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Failed to log AI interaction: {e}")
+def _utc_now() -> str:
+    """与监控库 CURRENT_TIMESTAMP 相同格式的 UTC 时间，实时事件与库中记录可以统一展示"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+def extract_usage(response: str | dict) -> dict:
+    """从响应的 usageMetadata 中提取 token 计数，没有时返回空字典"""
+    usage = response.get("usageMetadata") if isinstance(response, dict) else None
+    if not isinstance(usage, dict):
+        return {}
+    prompt_tokens = usage.get("promptTokenCount", 0)
+    candidate_tokens = usage.get("candidatesTokenCount", 0)
+    thought_tokens = usage.get("thoughtsTokenCount", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "candidate_tokens": candidate_tokens,
+        "thought_tokens": thought_tokens,
+        "cached_tokens": usage.get("cachedContentTokenCount", 0),
+        "total_tokens": usage.get("totalTokenCount") or prompt_tokens + candidate_tokens + thought_tokens
+    }
+
+class _PayloadSampler:
+    """负载下的请求体采样：每分钟最多完整记录 monitor.payload_capture_per_minute 个请求体（0 为不限），
+    写入积压超过上限一半时一律不记录；未采样的调用仍记录耗时、token 与响应"""
+    def __init__(self):
+        self._minute = 0
+        self._count = 0
+
+    def allow(self) -> bool:
+        from .config import MONITOR_PAYLOAD_PER_MINUTE
+        if monitor_writer.backlog() > _MAX_PENDING // 2:
+            return False
+        if not MONITOR_PAYLOAD_PER_MINUTE:
+            return True
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._minute, self._count = minute, 0
+        self._count += 1
+        return self._count <= MONITOR_PAYLOAD_PER_MINUTE
+
+_payload_sampler = _PayloadSampler()
+
+def log_ai_interaction(payload: dict, response: str | dict, model: str, duration: float, connect_time: float | None = None, call_type: str | None = None, session_id: str | None = None, queue_wait: float | None = None, endpoint: str | None = None) -> str:
+    """记录一次 LLM 调用，返回其 request_id（同一任务中随后的 log_ai_decision 会关联到它）"""
+    usage = extract_usage(response)
+    request_id = uuid.uuid4().hex
+    captured = payload if _payload_sampler.allow() else None
+    _last_request.set((request_id, captured is not None))
+    meta = (model, duration, connect_time, call_type, session_id, queue_wait,
+            usage.get("prompt_tokens"), usage.get("candidate_tokens"), usage.get("thought_tokens"), usage.get("cached_tokens"), usage.get("total_tokens"), endpoint, request_id)
+
+    def prepare():
+        # 在写入线程中执行：抽出图片、序列化、压缩与去重
+        statements, refs = [], []
+        request_text = request_hash = None
+        if captured is not None:
+            request_text, request_hash = monitor_writer.store_text(json.dumps(monitor_writer.extract_images(captured, statements, refs), ensure_ascii=False), statements)
+        response_text, response_hash = monitor_writer.store_text(response if isinstance(response, str) else json.dumps(response, ensure_ascii=False), statements)
+        statements.append((
+            "INSERT INTO ai_logs (request_payload, response_body, request_hash, response_hash, image_refs, payload_skipped, model, duration, connect_time, call_type, session_id, queue_wait, prompt_tokens, candidate_tokens, thought_tokens, cached_tokens, total_tokens, endpoint, request_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (request_text, response_text, request_hash, response_hash, json.dumps(refs) if refs else None, int(captured is None), *meta)
+        ))
+        # 图片引用按行展开，回收 blob 时按哈希查引用
+        statements.extend(("INSERT INTO ai_log_images (request_id, hash) VALUES (?, ?)", (request_id, digest)) for digest in refs)
+        statements.append(monitor_search.ai_log_statement(request_id, captured, response))
+        return statements
+
+    monitor_writer.append(None, prepare)
+    live_hub.publish({"type": "ai_log", "timestamp": _utc_now(), "request_id": request_id, "model": model, "duration": duration, "call_type": call_type,
+                      "session_id": session_id, "queue_wait": queue_wait, "total_tokens": usage.get("total_tokens"), "endpoint": endpoint})
+    return request_id
+
+def reset_request_trace():
+    """在一次 JSON 调用开始前清除上一次调用的关联，避免调用失败时决策关联到无关的 ai_logs"""
+    _last_request.set(None)
 
 def log_ai_decision(decision_type: str, session_id: str, decision_result, reason: str, prompt: str, duration: float):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.cursor().execute("INSERT INTO ai_decisions (decision_type, session_id, decision_result, reason, prompt, duration) VALUES (?, ?, ?, ?, ?, ?)", (decision_type, session_id, json.dumps(decision_result, ensure_ascii=False), reason, prompt, duration))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Failed to log AI decision: {e}")
+    """本次决策的 LLM 调用已连同请求体写入 ai_logs 时只保存 request_id，提示词从对应请求体还原"""
+    request_id, captured = _last_request.get() or (None, False)
+    _last_request.set(None)
+    monitor_writer.append("INSERT INTO ai_decisions (decision_type, session_id, decision_result, reason, prompt, duration, request_id) VALUES (?, ?, ?, ?, ?, ?, ?)", (decision_type, session_id, json.dumps(decision_result, ensure_ascii=False), reason, None if captured else prompt, duration, request_id))
+    # 每个写入周期在全部决策写入之后补齐一次全文索引
+    monitor_writer.upsert(("search", "ai_decisions"), monitor_search.DECISIONS_CATCH_UP_SQL, ())
+    live_hub.publish({"type": "ai_decision", "timestamp": _utc_now(), "decision_type": decision_type, "session_id": session_id,
+                      "decision_result": decision_result, "reason": reason, "duration": duration, "request_id": request_id})
+
+def log_json_outcome(call_type: str | None, session_id: str | None, structured: bool, attempts: int, parse_failures: int, success: bool, repaired: bool = False):
+    """记录一次 JSON 调用的结果：尝试次数、解析失败次数、最终是否成功、是否经本地修复后成功"""
+    monitor_writer.append("INSERT INTO llm_json_stats (call_type, session_id, structured, attempts, parse_failures, success, repaired) VALUES (?, ?, ?, ?, ?, ?, ?)", (call_type, session_id, int(structured), attempts, parse_failures, int(success), int(repaired)))
 
 def log_config_change(section: str, key: str, old, new, source: str = "unknown"):
+    # 配置变更很少且不在消息处理路径上，同步写入，保证监控网页修改配置后能立即查到变更记录
     try:
         conn = sqlite3.connect(DB_PATH)
         conn.cursor().execute("INSERT INTO config_changes (config_section, config_key, old_value, new_value, change_source) VALUES (?, ?, ?, ?, ?)", (section, key, str(old) if old is not None else None, str(new) if new is not None else None, source))
@@ -62,17 +468,21 @@ def log_config_change(section: str, key: str, old, new, source: str = "unknown")
         print(f"Failed to log config change: {e}")
 
 def record_user_activity(session_id: str, user_id: str, nickname: str):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.cursor().execute("""
-            INSERT INTO user_activity (session_id, user_id, nickname, message_count, last_message_time) 
-            VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
-            ON CONFLICT(session_id, user_id) DO UPDATE SET 
-                message_count = message_count + 1,
-                nickname = excluded.nickname,
-                last_message_time = CURRENT_TIMESTAMP
-        """, (session_id, user_id, nickname))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Failed to record user activity: {e}")
+    monitor_writer.add_activity(session_id, user_id, nickname)
+
+def index_chat_message(message_id: int, session_id: str, role: str, content: str, time_str: str | None, nickname: str | None = None, user_id: str | None = None):
+    """把写入聊天记录文件的消息加入全文索引（分词在写入线程中完成）"""
+    monitor_writer.append(None, lambda: [monitor_search.chat_statement(message_id, session_id, role, content, time_str, nickname, user_id)])
+
+def reindex_chat_message(session_id: str, message: dict):
+    """管理界面修改单条消息后覆盖其索引"""
+    monitor_writer.append(None, lambda: [monitor_search.chat_statement(
+        message["id"], session_id, message.get("role"), message.get("content"), message.get("time"), message.get("nickname"), message.get("user_id"), replace=True)])
+
+def unindex_chat_message(message_id: int):
+    monitor_writer.append(*monitor_search.chat_delete_statement(message_id))
+
+def reindex_chat_session(session_id: str, messages: list[dict]):
+    """管理界面改写某个会话的聊天记录后重建其全文索引"""
+    # 顺序屏障：DELETE 在之前积压的索引记录之后执行，也不会删掉之后写入的新消息（不必等待写入线程）
+    monitor_writer.append(None, lambda: monitor_search.chat_session_statements(session_id, messages), ordered=True)
@@ -1,77 +1,401 @@
 import sqlite3
+import json
+import zlib
+import base64
+import queue
+import threading
+from pathlib import Path
+from contextlib import contextmanager
 from .monitor import DB_PATH
+from .monitor_search import build_match, format_snippet
+from .config import TIMEZONE_OFFSET
 
-def get_active_tasks():
+# ai_logs.timestamp 为 UTC，按天汇总时换算到本地时区
+_LOCAL_DAY = f"date(timestamp, '{TIMEZONE_OFFSET:+d} hours')"
+# 本地时区某天 0 点对应的 UTC 时间（参数为 '-N days'）；直接与 timestamp 比较，可以走时间索引
+_LOCAL_DAY_START = f"datetime(date('now', '{TIMEZONE_OFFSET:+d} hours', ?), '{-TIMEZONE_OFFSET:+d} hours')"
+_TOKEN_SUMS = """
+    COUNT(*) AS calls,
+    SUM(COALESCE(prompt_tokens, 0)) AS prompt_tokens,
+    SUM(COALESCE(candidate_tokens, 0)) AS candidate_tokens,
+    SUM(COALESCE(thought_tokens, 0)) AS thought_tokens,
+    SUM(COALESCE(cached_tokens, 0)) AS cached_tokens,
+    SUM(COALESCE(total_tokens, 0)) AS total_tokens
+"""
+
+# 监控网页的查询在线程池中并发执行：使用只读连接 (mode=ro，不占写锁，也不会误写)，用完放回小连接池复用。
+# 同时执行的查询不超过连接池大小，其余请求排队等待，避免大量线程争抢 CPU 与磁盘
+_READ_POOL_SIZE = 4
+_read_pool: queue.SimpleQueue = queue.SimpleQueue()
+_read_slots = threading.BoundedSemaphore(_READ_POOL_SIZE)
+
+@contextmanager
+def _read_connection():
+    """从只读连接池取一个连接；查询出错时关闭该连接，不放回池中"""
+    with _read_slots:
+        try:
+            conn = _read_pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(Path(DB_PATH).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        _read_pool.put(conn)
+
+def get_endpoint_states():
+    """LLM 端点的断路器状态与延迟（由机器人进程写入）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM active_tasks WHERE last_update < datetime('now', '-5 minutes')")
-        conn.commit()
-        cursor.execute("SELECT * FROM active_tasks ORDER BY last_update DESC")
-        tasks = cursor.fetchall()
-        conn.close()
-        return [dict(t) for t in tasks]
-    except Exception as e:
-        print(f"Failed to get active tasks: {e}")
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM llm_endpoints ORDER BY url")
+            rows = cursor.fetchall()
+        return [dict(r) for r in rows]
+    except Exception:
         return []
 
-def get_ai_logs(limit: int = 50):
+# 列表查询只取轻量列，请求体 / 响应体通过 get_ai_log_detail 按需读取
+_AI_LOG_LIST_COLUMNS = (
+    "id, timestamp, model, duration, connect_time, call_type, session_id, queue_wait, prompt_tokens, candidate_tokens, "
+    "thought_tokens, cached_tokens, total_tokens, endpoint, request_id, image_refs, payload_skipped"
+)
+_MAX_PAGE_SIZE = 500
+
+def _keyset_page(table: str, columns: str, conditions: list[tuple[str, object]], cursor: int | None, limit: int) -> dict:
+    """按 id 倒序的游标分页：cursor 为上一页最后一条的 id，返回 {"items", "next_cursor"}（没有更多时为 None）
+
+    追加写入的表中 id 与 timestamp 同向递增，按 id 排序与按时间排序一致；
+    过滤列上的单列索引按 rowid 有序，等值过滤 + id < cursor 可以直接在索引上范围扫描。
+    """
+    limit = max(1, min(int(limit), _MAX_PAGE_SIZE))
+    clauses, params = [], []
+    for clause, value in conditions:
+        if value is not None and value != "":
+            clauses.append(clause)
+            params.append(value)
+    if cursor is not None:
+        clauses.append("id < ?")
+        params.append(int(cursor))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _read_connection() as conn:
+        rows = conn.execute(f"SELECT {columns} FROM {table} {where} ORDER BY id DESC LIMIT ?", (*params, limit + 1)).fetchall()
+    items = [dict(r) for r in rows[:limit]]
+    return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+def get_ai_logs(limit: int = 50, cursor: int | None = None, session_id: str | None = None, call_type: str | None = None, model: str | None = None,
+                min_duration: float | None = None, since: str | None = None, until: str | None = None) -> dict:
+    """分页查询 AI 交互记录；since / until 为 UTC 时间 (YYYY-MM-DD HH:MM:SS)，与 timestamp 列一致"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM ai_logs ORDER BY timestamp DESC LIMIT ?", (limit,))
-        logs = cursor.fetchall()
-        conn.close()
-        return [dict(log) for log in logs]
+        return _keyset_page("ai_logs", _AI_LOG_LIST_COLUMNS, [
+            ("session_id = ?", session_id), ("call_type = ?", call_type), ("model = ?", model),
+            ("duration >= ?", min_duration), ("timestamp >= ?", since), ("timestamp < ?", until)
+        ], cursor, limit)
+    except Exception:
+        return {"items": [], "next_cursor": None}
+
+def load_blob(cursor, digest: str | None) -> bytes | None:
+    """按哈希读取 blobs 中的内容（已解压），不存在时返回 None"""
+    if not digest:
+        return None
+    row = cursor.execute("SELECT codec, data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+    if row is None:
+        return None
+    codec, data = row[0], row[1]
+    return zlib.decompress(data) if codec == "zlib" else data
+
+def _restore_images(payload, cursor):
+    """把请求体中的图片引用换回 base64 原图（缩略图随之移除）"""
+    for content in payload.get("contents", []) if isinstance(payload, dict) else []:
+        for part in content.get("parts", []):
+            for key in ("inline_data", "inlineData"):
+                ref = part.get(key)
+                if isinstance(ref, dict) and ref.get("blob_ref"):
+                    raw = load_blob(cursor, ref["blob_ref"])
+                    if raw is not None:
+                        part[key] = {k: v for k, v in ref.items() if k not in ("blob_ref", "thumbnail")}
+                        part[key]["data"] = base64.b64encode(raw).decode("ascii")
+    return payload
+
+def restore_ai_log(row: dict, cursor, images: bool = False) -> dict:
+    """还原 ai_logs 行的 request_payload / response_body（从 blobs 解压；images 为 True 时换回原图）"""
+    for column, hash_column in (("request_payload", "request_hash"), ("response_body", "response_hash")):
+        if row.get(column) is None and row.get(hash_column):
+            data = load_blob(cursor, row[hash_column])
+            row[column] = data.decode("utf-8") if data is not None else None
+    if images and row.get("image_refs") and row.get("request_payload"):
+        row["request_payload"] = json.dumps(_restore_images(json.loads(row["request_payload"]), cursor), ensure_ascii=False)
+    return row
+
+def get_ai_log_detail(log_id: int, images: bool = False):
+    """单条 ai_logs 的完整内容，请求体与响应体已还原"""
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            row = cursor.execute("SELECT * FROM ai_logs WHERE id = ?", (log_id,)).fetchone()
+            result = restore_ai_log(dict(row), cursor, images) if row else None
+        return result
+    except Exception:
+        return None
+
+def get_decision_prompt(decision_id: int) -> str | None:
+    """决策的提示词：未单独保存时从关联 ai_logs 请求体中的文本部分还原"""
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            decision = cursor.execute("SELECT prompt, request_id FROM ai_decisions WHERE id = ?", (decision_id,)).fetchone()
+            if decision is None:
+                return None
+            if decision["prompt"] is not None or not decision["request_id"]:
+                return decision["prompt"]
+            row = cursor.execute("SELECT * FROM ai_logs WHERE request_id = ?", (decision["request_id"],)).fetchone()
+            payload = restore_ai_log(dict(row), cursor).get("request_payload") if row else None
+    except Exception:
+        return None
+    if not payload:
+        return None
+    parts = json.loads(payload).get("contents", [{}])[0].get("parts", [])
+    return "\n".join(p["text"] for p in parts if "text" in p)
+
+def get_ai_decisions(limit: int = 50, cursor: int | None = None, session_id: str | None = None, decision_type: str | None = None, model: str | None = None,
+                     min_duration: float | None = None, since: str | None = None, until: str | None = None) -> dict:
+    """分页查询 AI 决策记录；model 按关联的 ai_logs 过滤"""
+    try:
+        return _keyset_page("ai_decisions", "*", [
+            ("session_id = ?", session_id), ("decision_type = ?", decision_type),
+            ("request_id IN (SELECT request_id FROM ai_logs WHERE model = ?)", model),
+            ("duration >= ?", min_duration), ("timestamp >= ?", since), ("timestamp < ?", until)
+        ], cursor, limit)
+    except Exception:
+        return {"items": [], "next_cursor": None}
+
+# 搜索来源 -> (全文索引表, 来源表, 返回的来源列)；聊天记录的字段直接存在索引表中
+_SEARCH_SOURCES = {
+    "ai_log": ("fts_ai_logs", "ai_logs", "src.timestamp, src.session_id, src.call_type, src.model, src.request_id"),
+    "decision": ("fts_decisions", "ai_decisions", "src.timestamp, src.session_id, src.decision_type, src.request_id"),
+    "chat": ("fts_chat_messages", None, "f.timestamp, f.session_id, f.persona, f.role, f.user_id"),
+}
+
+def search(q: str, kinds: list[str] | None = None, session_id: str | None = None, since: str | None = None, until: str | None = None, limit: int = 20) -> dict:
+    """在决策理由、LLM 请求 / 响应与聊天记录中全文搜索，按 bm25 相关度排序
+
+    kinds 为 ai_log / decision / chat 的子集（默认全部）；since / until 为 UTC 时间。
+    每条结果的 snippet 为 HTML（已转义，命中部分包在 <mark> 中）。
+    """
+    match = build_match(q)
+    if match is None:
+        return {"items": []}
+    limit = max(1, min(int(limit), _MAX_PAGE_SIZE))
+    items = []
+    try:
+        with _read_connection() as conn:
+            for kind in kinds or list(_SEARCH_SOURCES):
+                if kind not in _SEARCH_SOURCES:
+                    continue
+                fts, source, columns = _SEARCH_SOURCES[kind]
+                scope = "src" if source else "f"
+                clauses, params = [f"{fts} MATCH ?"], [match]
+                for clause, value in ((f"{scope}.session_id = ?", session_id), (f"{scope}.timestamp >= ?", since), (f"{scope}.timestamp < ?", until)):
+                    if value:
+                        clauses.append(clause)
+                        params.append(value)
+                join = f"JOIN {source} AS src ON src.id = f.rowid" if source else ""
+                rows = conn.execute(f"""
+                    SELECT f.rowid AS id, f.rank AS score, snippet({fts}, -1, char(2), char(3), '…', 32) AS snippet, {columns}
+                    FROM {fts} AS f {join}
+                    WHERE {' AND '.join(clauses)}
+                    ORDER BY f.rank LIMIT ?
+                """, (*params, limit)).fetchall()
+                for row in rows:
+                    item = dict(row)
+                    item["kind"], item["snippet"] = kind, format_snippet(item["snippet"])
+                    items.append(item)
+    except sqlite3.Error as e:
+        return {"items": [], "error": str(e)}
+    # bm25 越小越相关；各来源分别取前 limit 条后合并
+    items.sort(key=lambda item: item["score"])
+    return {"items": items[:limit]}
+
+def get_json_stats(hours: int = 24):
+    """按调用类型汇总 JSON 调用的重试与解析失败情况"""
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT call_type, structured,
+                       COUNT(*) AS calls,
+                       SUM(attempts) AS attempts,
+                       SUM(attempts - 1) AS retries,
+                       SUM(parse_failures) AS parse_failures,
+                       SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) AS failed_calls,
+                       SUM(COALESCE(repaired, 0)) AS repaired
+                FROM llm_json_stats
+                WHERE timestamp >= datetime('now', ?)
+                GROUP BY call_type, structured
+                ORDER BY calls DESC
+            """, (f"-{int(hours)} hours",))
+            stats = cursor.fetchall()
+        return [dict(s) for s in stats]
     except Exception:
         return []
 
-def get_ai_decisions(limit: int = 50):
+def get_token_usage_by_session(days: int = 1):
+    """最近 days 个自然日（本地时区，含今天）内按会话汇总 token 消耗，并附带各调用类型的明细"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM ai_decisions ORDER BY timestamp DESC LIMIT ?", (limit,))
-        decisions = cursor.fetchall()
-        conn.close()
-        return [dict(d) for d in decisions]
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            since = (f"-{max(1, int(days)) - 1} days",)
+            cursor.execute(f"""
+                SELECT session_id, call_type, {_TOKEN_SUMS}
+                FROM ai_logs
+                WHERE timestamp >= {_LOCAL_DAY_START} AND session_id IS NOT NULL
+                GROUP BY session_id, call_type
+            """, since)
+            rows = cursor.fetchall()
+    except Exception:
+        return []
+    sessions: dict[str, dict] = {}
+    for row in rows:
+        row = dict(row)
+        entry = sessions.setdefault(row["session_id"], {"session_id": row["session_id"], "calls": 0, "prompt_tokens": 0, "candidate_tokens": 0, "thought_tokens": 0, "cached_tokens": 0, "total_tokens": 0, "by_call_type": {}})
+        for key in ("calls", "prompt_tokens", "candidate_tokens", "thought_tokens", "cached_tokens", "total_tokens"):
+            entry[key] += row[key] or 0
+        entry["by_call_type"][row["call_type"] or "unknown"] = {k: row[k] for k in ("calls", "prompt_tokens", "candidate_tokens", "thought_tokens", "total_tokens")}
+    return sorted(sessions.values(), key=lambda e: e["total_tokens"], reverse=True)
+
+def get_token_usage_by_day(days: int = 7, session_id: str | None = None):
+    """按本地自然日与调用类型汇总 token 消耗，可按会话过滤"""
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            params: list = [f"-{max(1, int(days)) - 1} days"]
+            session_filter = ""
+            if session_id:
+                session_filter = "AND session_id = ?"
+                params.append(session_id)
+            cursor.execute(f"""
+                SELECT {_LOCAL_DAY} AS day, call_type, {_TOKEN_SUMS}
+                FROM ai_logs
+                WHERE timestamp >= {_LOCAL_DAY_START} {session_filter}
+                GROUP BY day, call_type
+                ORDER BY day DESC, total_tokens DESC
+            """, params)
+            rows = cursor.fetchall()
+        return [dict(r) for r in rows]
+    except Exception:
+        return []
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def get_route_stats(hours: int = 24):
+    """按路由 (调用类型 + 模型) 汇总最近 hours 小时的延迟与 token 消耗"""
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            since = (f"-{int(hours)} hours",)
+            cursor.execute(f"""
+                SELECT call_type, model, {_TOKEN_SUMS},
+                       AVG(duration) AS avg_duration,
+                       AVG(COALESCE(queue_wait, 0)) AS avg_queue_wait
+                FROM ai_logs
+                WHERE timestamp >= datetime('now', ?)
+                GROUP BY call_type, model
+                ORDER BY calls DESC
+            """, since)
+            rows = [dict(r) for r in cursor.fetchall()]
+            cursor.execute("SELECT call_type, model, duration FROM ai_logs WHERE timestamp >= datetime('now', ?) AND duration IS NOT NULL", since)
+            durations: dict[tuple, list[float]] = {}
+            for call_type, model, duration in cursor.fetchall():
+                durations.setdefault((call_type, model), []).append(duration)
     except Exception:
         return []
+    for row in rows:
+        samples = durations.get((row["call_type"], row["model"]), [])
+        row["p50_duration"] = _percentile(samples, 0.5)
+        row["p95_duration"] = _percentile(samples, 0.95)
+    return rows
 
 def get_config_changes(limit: int = 50):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM config_changes ORDER BY timestamp DESC LIMIT ?", (limit,))
-        changes = cursor.fetchall()
-        conn.close()
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM config_changes ORDER BY timestamp DESC LIMIT ?", (limit,))
+            changes = cursor.fetchall()
         return [dict(c) for c in changes]
     except Exception:
         return []
 
 def get_user_activity(session_id: str | None = None, limit: int = 20):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        if session_id:
-            cursor.execute("SELECT * FROM user_activity WHERE session_id = ? ORDER BY message_count DESC LIMIT ?", (session_id, limit))
-        else:
-            cursor.execute("SELECT * FROM user_activity ORDER BY message_count DESC LIMIT ?", (limit,))
-        activity = cursor.fetchall()
-        conn.close()
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            if session_id:
+                cursor.execute("SELECT * FROM user_activity WHERE session_id = ? ORDER BY message_count DESC LIMIT ?", (session_id, limit))
+            else:
+                cursor.execute("SELECT * FROM user_activity ORDER BY message_count DESC LIMIT ?", (limit,))
+            activity = cursor.fetchall()
         return [dict(a) for a in activity]
     except Exception:
         return []
 
+def get_storage_stats():
+    """监控库各表行数与文件页使用情况（freelist 为待增量 VACUUM 回收的空闲页）"""
+    from .monitor_retention import RETENTION_TABLES
+    try:
+        with _read_connection() as conn:
+            cursor = conn.cursor()
+            tables = {}
+            for table in list(RETENTION_TABLES) + ["blobs"]:
+                # 带自增 id 的表用 id 范围估算行数，避免在百万行的表上 COUNT(*)
+                if table in RETENTION_TABLES and RETENTION_TABLES[table][1]:
+                    low, high = cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+                    tables[table] = (high - low + 1) if low is not None else 0
+                else:
+                    tables[table] = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+            page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+            freelist = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        return {"tables": tables, "size_bytes": page_size * page_count, "free_bytes": page_size * freelist}
+    except Exception:
+        return {}
+
+def get_metric_rows() -> list[dict]:
+    """metrics 表中的全部序列（由机器人进程的指标注册表写入）"""
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute("SELECT name, labels, kind, help, data, updated_at FROM metrics ORDER BY name, labels").fetchall()
+        return [dict(r) for r in rows]
+    except Exception:
+        return []
+
+def get_metrics():
+    """指标摘要：计数器 / 仪表的当前值，直方图的次数、均值、最大值以及全部与最近窗口内的 p50/p95/p99"""
+    from .config import MONITOR_METRICS_WINDOW
+    from .metrics import summarize
+    metrics, start_time = [], None
+    for row in get_metric_rows():
+        data = json.loads(row["data"] or "{}")
+        if row["name"] == "process_start_time_seconds":
+            start_time = data.get("value")
+            continue
+        metrics.append({"name": row["name"], "help": row["help"], "kind": row["kind"], "labels": json.loads(row["labels"] or "{}"),
+                        "updated_at": row["updated_at"], **summarize(row["kind"], data, MONITOR_METRICS_WINDOW)})
+    return {"process_start_time": start_time, "window": MONITOR_METRICS_WINDOW, "metrics": metrics}
+
 def clear_ai_logs():
     try:
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         cursor.execute("DELETE FROM ai_logs")
+        cursor.execute("DELETE FROM fts_ai_logs")
+        cursor.execute("DELETE FROM ai_log_images")
+        # blob 只被 ai_logs 引用
+        cursor.execute("DELETE FROM blobs")
         conn.commit()
         conn.close()
         return True
@@ -83,6 +407,7 @@ def clear_ai_decisions():
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         cursor.execute("DELETE FROM ai_decisions")
+        cursor.execute("DELETE FROM fts_decisions")
         conn.commit()
         conn.close()
         return True
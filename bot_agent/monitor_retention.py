@@ -0,0 +1,168 @@
+import sqlite3
+import time
+from .monitor_search import SEARCH_TABLES
+
+# 单个删除事务最多覆盖的 id 区间，避免长时间持有写锁
+_DELETE_BATCH = 5000
+# 单个事务最多检查的候选 blob 数
+_GC_BATCH = 1000
+
+# 表 -> (时间列, 是否有自增 id)；追加写入的表中 id 与时间同向递增
+RETENTION_TABLES = {
+    "ai_logs": ("timestamp", True),
+    "ai_decisions": ("timestamp", True),
+    "llm_json_stats": ("timestamp", True),
+    "config_changes": ("timestamp", True),
+    "user_activity": ("last_message_time", False),
+}
+
+def ensure_incremental_vacuum(conn: sqlite3.Connection):
+    """把库切换为 auto_vacuum=INCREMENTAL（需要一次完整 VACUUM，只在旧库上执行一次）"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        # 新库：建表前设置即可生效
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        return
+    print("[Monitor] 正在将监控库切换为增量 VACUUM 模式（仅首次，库较大时需要一些时间）...")
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+def ensure_image_refs(conn: sqlite3.Connection):
+    """建立图片引用表 ai_log_images（ai_logs.image_refs 按行展开并按哈希建索引，回收 blob 时直接查引用）；
+    新建时用已有记录补齐（仅首次）"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ai_log_images'").fetchone():
+        return
+    conn.commit()
+    # 监控网页与机器人进程都会调用 init_db，写锁保证只有一方建表并补齐
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ai_log_images'").fetchone():
+            conn.execute("CREATE TABLE ai_log_images (request_id TEXT, hash TEXT)")
+            conn.execute("INSERT INTO ai_log_images (request_id, hash) SELECT ai_logs.request_id, j.value FROM ai_logs, json_each(ai_logs.image_refs) AS j WHERE ai_logs.image_refs IS NOT NULL")
+            conn.execute("CREATE INDEX idx_ai_log_images_hash ON ai_log_images (hash)")
+            conn.execute("CREATE INDEX idx_ai_log_images_request ON ai_log_images (request_id)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _cutoff_id(conn: sqlite3.Connection, table: str, time_column: str, cutoff: str) -> int | None:
+    """二分查找最后一条早于 cutoff 的行 id（只走 rowid，不需要时间索引）"""
+    bounds = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+    if bounds[0] is None:
+        return None
+    lo, hi, found = bounds[0], bounds[1], None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        row = conn.execute(f"SELECT id, {time_column} < ? FROM {table} WHERE id >= ? ORDER BY id LIMIT 1", (cutoff, mid)).fetchone()
+        if row is None:
+            hi = mid - 1
+        elif row[1]:
+            found, lo = row[0], row[0] + 1
+        else:
+            hi = mid - 1
+    return found
+
+def _release_blob_refs(conn: sqlite3.Connection, first: int, upper: int) -> set[str]:
+    """即将删除的 ai_logs 区间引用的 blob 哈希（回收候选），同时删除这些行的图片引用"""
+    candidates = set()
+    for request_hash, response_hash in conn.execute("SELECT request_hash, response_hash FROM ai_logs WHERE id >= ? AND id <= ?", (first, upper)):
+        candidates.update(h for h in (request_hash, response_hash) if h)
+    in_range = "SELECT request_id FROM ai_logs WHERE id >= ? AND id <= ? AND image_refs IS NOT NULL"
+    candidates.update(row[0] for row in conn.execute(f"SELECT hash FROM ai_log_images WHERE request_id IN ({in_range})", (first, upper)))
+    conn.execute(f"DELETE FROM ai_log_images WHERE request_id IN ({in_range})", (first, upper))
+    return candidates
+
+def _delete_upto(conn: sqlite3.Connection, table: str, last_id: int, between_batches=None, forget_blobs=None) -> tuple[int, int]:
+    """按 id 区间分批删除 id <= last_id 的行（连同全文索引中同一区间的行），每批单独提交
+
+    删除 ai_logs 时，每批之后回收这一批引用过、且已不再被引用的 blob。返回 (删除的行数, 回收的 blob 数)。
+    """
+    first = conn.execute(f"SELECT MIN(id) FROM {table}").fetchone()[0]
+    deleted = blobs = 0
+    while first is not None and first <= last_id:
+        upper = min(first + _DELETE_BATCH - 1, last_id)
+        candidates = set()
+        with conn:
+            if table == "ai_logs":
+                candidates = _release_blob_refs(conn, first, upper)
+            deleted += conn.execute(f"DELETE FROM {table} WHERE id >= ? AND id <= ?", (first, upper)).rowcount
+            if table in SEARCH_TABLES:
+                conn.execute(f"DELETE FROM {SEARCH_TABLES[table]} WHERE rowid >= ? AND rowid <= ?", (first, upper))
+        first = upper + 1
+        if between_batches:
+            between_batches()
+        if candidates:
+            blobs += _gc_blobs(conn, candidates, between_batches, forget_blobs)
+    return deleted, blobs
+
+def _blob_referenced(conn: sqlite3.Connection, digest: str) -> bool:
+    return bool(conn.execute("SELECT 1 FROM ai_logs WHERE request_hash = ? OR response_hash = ? LIMIT 1", (digest, digest)).fetchone()
+                or conn.execute("SELECT 1 FROM ai_log_images WHERE hash = ? LIMIT 1", (digest,)).fetchone())
+
+def _gc_blobs(conn: sqlite3.Connection, candidates: set[str], between_batches=None, forget_blobs=None) -> int:
+    """删除候选中不再被任何 ai_logs 引用的 blob（每个候选按索引查引用），分批提交
+
+    清理在写入线程中执行，blob 与引用它的 ai_logs 行总在同一个事务中写入，不存在已写入 blob、尚未写入引用行的中间状态。
+    forget_blobs 在删除后以被删的哈希调用（写入线程借此不再把它们当作已存在而跳过写入）。
+    """
+    candidates, removed = sorted(candidates), 0
+    for i in range(0, len(candidates), _GC_BATCH):
+        orphans = [digest for digest in candidates[i:i + _GC_BATCH] if not _blob_referenced(conn, digest)]
+        if orphans:
+            with conn:
+                conn.executemany("DELETE FROM blobs WHERE hash = ?", ((digest,) for digest in orphans))
+            removed += len(orphans)
+            if forget_blobs:
+                forget_blobs(orphans)
+        if between_batches:
+            between_batches()
+    return removed
+
+def prune(conn: sqlite3.Connection, between_batches=None, forget_blobs=None) -> dict:
+    """按 monitor.retention 清理过期记录与无主 blob，然后增量回收空闲页，返回各表删除的行数
+
+    between_batches 在每批删除之后调用（写入线程借此写入积压的新记录，清理期间不阻塞日志写入）。
+    无主 blob 只在被删除的 ai_logs 行引用过的 blob 中查找，见 _gc_blobs。
+    """
+    from .config import MONITOR_RETENTION, MONITOR_VACUUM_PAGES
+    result = {}
+    for table, (time_column, has_id) in RETENTION_TABLES.items():
+        policy = (MONITOR_RETENTION or {}).get(table) or {}
+        max_age_days, max_rows = policy.get("max_age_days") or 0, policy.get("max_rows") or 0
+        deleted = blobs = 0
+        if max_age_days:
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{float(max_age_days)} days",)).fetchone()[0]
+            if has_id:
+                last_id = _cutoff_id(conn, table, time_column, cutoff)
+                if last_id is not None:
+                    rows, removed = _delete_upto(conn, table, last_id, between_batches, forget_blobs)
+                    deleted, blobs = deleted + rows, blobs + removed
+            else:
+                with conn:
+                    deleted += conn.execute(f"DELETE FROM {table} WHERE {time_column} < ?", (cutoff,)).rowcount
+        if max_rows and has_id:
+            max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+            if max_id is not None and max_id - max_rows > 0:
+                rows, removed = _delete_upto(conn, table, max_id - max_rows, between_batches, forget_blobs)
+                deleted, blobs = deleted + rows, blobs + removed
+        if deleted:
+            result[table] = deleted
+        if blobs:
+            result["blobs"] = result.get("blobs", 0) + blobs
+    if MONITOR_VACUUM_PAGES:
+        # 每次最多回收 vacuum_pages 页，分多次直到空闲页回收完，中间照常写入新记录
+        start = time.perf_counter()
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free > 0:
+            conn.execute(f"PRAGMA incremental_vacuum({int(MONITOR_VACUUM_PAGES)})").fetchall()
+            if between_batches:
+                between_batches()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                # 库未处于增量模式时 incremental_vacuum 不起作用
+                break
+            free = remaining
+        result["vacuum_time"] = round(time.perf_counter() - start, 3)
+    return result
@@ -0,0 +1,174 @@
+import re
+import json
+import html
+import sqlite3
+import datetime
+from . import config
+
+# 中日韩文字之间没有空格，unicode61 分词器会把整句当成一个词。
+# 索引与查询前在每个字两侧插入零宽空格 (U+200B，分词器视为分隔符)：按单字索引、按短语匹配任意长度的词，
+# 取出的片段去掉零宽空格即为原文
+_CJK = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])")
+_ZWSP = "\u200b"
+_TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+# snippet() 的高亮标记，格式化时换成 <mark>
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+# 全文索引与来源表的 rowid 一致，按保留策略清理来源表时按同一 id 区间删除
+SEARCH_TABLES = {"ai_logs": "fts_ai_logs", "ai_decisions": "fts_decisions"}
+
+_SCHEMA = {
+    "fts_ai_logs": f"CREATE VIRTUAL TABLE fts_ai_logs USING fts5(response, prompt, {_TOKENIZE})",
+    "fts_decisions": f"CREATE VIRTUAL TABLE fts_decisions USING fts5(reason, result, prompt, {_TOKENIZE})",
+    # 聊天记录来自记忆存储，监控库中没有来源表；rowid 为消息 id，session_id 为原始会话号，persona 为人格名，timestamp 为 UTC
+    "fts_chat_messages": f"CREATE VIRTUAL TABLE fts_chat_messages USING fts5(content, nickname, session_id UNINDEXED, persona UNINDEXED, role UNINDEXED, user_id UNINDEXED, timestamp UNINDEXED, {_TOKENIZE})",
+}
+
+# 决策在写入线程中按 id 补齐索引（写入周期末执行一次，也用于首次建索引）；依赖 register_functions 注册的函数
+DECISIONS_CATCH_UP_SQL = """
+    INSERT INTO fts_decisions (rowid, reason, result, prompt)
+    SELECT id, fts_segment(reason), fts_segment(decision_result), fts_prompt(prompt) FROM ai_decisions
+    WHERE id > COALESCE((SELECT rowid FROM fts_decisions ORDER BY rowid DESC LIMIT 1), 0)
+"""
+_AI_LOG_SQL = "INSERT INTO fts_ai_logs (rowid, response, prompt) SELECT id, ?, ? FROM ai_logs WHERE request_id = ?"
+_CHAT_SQL = "INSERT INTO fts_chat_messages (rowid, content, nickname, session_id, persona, role, user_id, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+# 修改后的消息整条覆盖（与 _CHAT_SQL 不同的语句，在同一写入周期中排在新消息的插入之后）
+_CHAT_REPLACE_SQL = _CHAT_SQL.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+_BACKFILL_BATCH = 1000
+
+def segment(text: str | None) -> str | None:
+    if not text:
+        return text
+    return _CJK.sub(f"{_ZWSP}\\1{_ZWSP}", str(text))
+
+def prompt_tail(text: str | None) -> str | None:
+    """提示词只索引最后 monitor.search_prompt_chars 个字符（最新的上下文与本轮消息）"""
+    limit = config.MONITOR_SEARCH_PROMPT_CHARS
+    if not text or not limit:
+        return None
+    return segment(text[-int(limit):])
+
+def payload_text(payload) -> str:
+    """请求体中 contents 的文本部分（不含 system_instruction）"""
+    contents = payload.get("contents") if isinstance(payload, dict) else None
+    return "\n".join(part["text"] for content in contents or [] for part in content.get("parts", []) if isinstance(part.get("text"), str))
+
+def response_text(response) -> str:
+    """响应中候选回复的文本（不含思考部分）；非 JSON 响应按原文索引"""
+    if isinstance(response, str):
+        try:
+            response = json.loads(response)
+        except ValueError:
+            return response
+    if not isinstance(response, dict):
+        return ""
+    return "\n".join(
+        part["text"] for candidate in response.get("candidates") or []
+        for part in (candidate.get("content") or {}).get("parts", [])
+        if isinstance(part.get("text"), str) and not part.get("thought")
+    )
+
+def register_functions(conn: sqlite3.Connection):
+    conn.create_function("fts_segment", 1, segment, deterministic=True)
+    conn.create_function("fts_prompt", 1, prompt_tail)
+
+def ai_log_statement(request_id: str, payload, response) -> tuple[str, tuple]:
+    """在写入线程中调用，须排在对应 ai_logs 的 INSERT 之后；payload 为 None（未采样）时不索引提示词"""
+    prompt = prompt_tail(payload_text(payload)) if payload is not None else None
+    return _AI_LOG_SQL, (segment(response_text(response)), prompt, request_id)
+
+def _utc_from_local(time_str: str | None) -> str | None:
+    """聊天记录中的时间为配置时区的本地时间，换算为与监控库一致的 UTC"""
+    try:
+        local = datetime.datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return time_str
+    return (local - datetime.timedelta(hours=config.TIMEZONE_OFFSET)).strftime("%Y-%m-%d %H:%M:%S")
+
+def chat_statement(message_id: int, full_session_id: str, role: str, content: str, time_str: str | None, nickname: str | None = None, user_id: str | None = None, replace: bool = False) -> tuple[str, tuple]:
+    session_id, _, persona = str(full_session_id).partition(":")
+    return _CHAT_REPLACE_SQL if replace else _CHAT_SQL, (message_id, segment(content), segment(nickname), session_id, persona, role, user_id, _utc_from_local(time_str))
+
+def chat_delete_statement(message_id: int) -> tuple[str, tuple]:
+    return "DELETE FROM fts_chat_messages WHERE rowid = ?", (message_id,)
+
+def chat_session_statements(full_session_id: str, messages: list[dict]) -> list[tuple[str, tuple]]:
+    """会话的聊天记录被整体改写后重建其索引：先删除该会话的全部行，再按新的消息列表写入"""
+    session_id, _, persona = str(full_session_id).partition(":")
+    statements = [("DELETE FROM fts_chat_messages WHERE session_id = ? AND persona = ?", (session_id, persona))]
+    for m in messages:
+        statements.append(chat_statement(m["id"], full_session_id, m.get("role"), m.get("content"), m.get("time"), m.get("nickname"), m.get("user_id")))
+    return statements
+
+def _backfill_ai_logs(conn: sqlite3.Connection):
+    from .monitor_query import load_blob
+    cursor, reader, rows = conn.cursor(), conn.cursor(), []
+    for log_id, request_payload, request_hash, response_body, response_hash, skipped in reader.execute(
+            "SELECT id, request_payload, request_hash, response_body, response_hash, payload_skipped FROM ai_logs"):
+        if request_payload is None and request_hash:
+            request_payload = (load_blob(cursor, request_hash) or b"").decode("utf-8")
+        if response_body is None and response_hash:
+            response_body = (load_blob(cursor, response_hash) or b"").decode("utf-8")
+        try:
+            payload = json.loads(request_payload) if request_payload and not skipped else None
+        except ValueError:
+            payload = None
+        prompt = prompt_tail(payload_text(payload)) if payload is not None else None
+        rows.append((log_id, segment(response_text(response_body or "")), prompt))
+        if len(rows) >= _BACKFILL_BATCH:
+            cursor.executemany("INSERT INTO fts_ai_logs (rowid, response, prompt) VALUES (?, ?, ?)", rows)
+            rows = []
+    cursor.executemany("INSERT INTO fts_ai_logs (rowid, response, prompt) VALUES (?, ?, ?)", rows)
+
+def _backfill_chat(conn: sqlite3.Connection):
+    from .memory.persistence import iter_chat_records
+    # 只索引现存的消息（JSONL 存储会先重放修改与删除记录）
+    rows = []
+    for item in iter_chat_records():
+        rows.append(chat_statement(item["id"], item["session_id"], item["role"], item["content"], item["time"], item["nickname"], item["user_id"])[1])
+        if len(rows) >= _BACKFILL_BATCH:
+            conn.executemany(_CHAT_SQL, rows)
+            rows = []
+    conn.executemany(_CHAT_SQL, rows)
+
+_BACKFILL = {
+    "fts_ai_logs": _backfill_ai_logs,
+    "fts_decisions": lambda conn: conn.execute(DECISIONS_CATCH_UP_SQL),
+    "fts_chat_messages": _backfill_chat,
+}
+
+def ensure_search_index(conn: sqlite3.Connection):
+    """创建全文索引表；新建的表在同一事务中用已有记录补齐（仅首次，记录较多时需要一些时间）"""
+    def missing():
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'fts\\_%' ESCAPE '\\'")}
+        return [name for name in _SCHEMA if name not in existing]
+
+    if not missing():
+        return
+    register_functions(conn)
+    conn.commit()
+    # 监控网页与机器人进程都会调用 init_db，写锁保证只有一方建表并补齐
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in missing():
+            print(f"[Monitor] 正在建立全文索引 {name}（仅首次）...")
+            conn.execute(_SCHEMA[name])
+            _BACKFILL[name](conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def build_match(query: str) -> str | None:
+    """把搜索框输入转为 FTS5 查询：空格分隔的各词都须出现，每个词按短语匹配（中文词即连续的单字）"""
+    phrases = []
+    for term in (query or "").split():
+        if re.search(r"\w", term):
+            phrases.append('"' + segment(term).replace('"', '""') + '"')
+    return " AND ".join(phrases) or None
+
+def format_snippet(text: str | None) -> str:
+    """snippet() 的结果转为 HTML：去掉分词用的零宽空格、转义，命中部分包在 <mark> 中"""
+    text = html.escape((text or "").replace(_ZWSP, ""))
+    text = text.replace(_MARK_END + _MARK_START, "")
+    return text.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
@@ -3,8 +3,14 @@ import os
 import sys
 import signal
 import atexit
+import asyncio
 from ncatbot.core import BotClient
 from bot_agent.handlers import register_handlers
+from bot_agent.llm import warmup_http_client, close_http_client
+from bot_agent.monitor import init_db, flush_monitor
+from bot_agent.ipc import live_hub
+from bot_agent.memory import memory_manager
+from bot_agent.memory.ipc_api import register_ipc_methods
 
 # 全局变量存储监控进程
 monitor_process = None
@@ -47,6 +53,26 @@ def start_monitor():
     except Exception as e:
         print(f"[System] 启动监控后台失败: {e}")
 
+async def on_bot_startup(event):
+    """机器人连接成功后预热 LLM 连接池，并启动供监控网页订阅、读写记忆状态的本地事件通道"""
+    await warmup_http_client()
+    register_ipc_methods()
+    await live_hub.start()
+
+async def on_bot_shutdown(event):
+    """机器人关闭时释放 LLM 连接池，写入尚未写入的记忆状态，并写完监控记录的积压"""
+    await live_hub.stop()
+    await close_http_client()
+    memory_manager.flush_state()
+    await asyncio.to_thread(flush_monitor)
+
+def shutdown_llm_client():
+    """事件循环已退出时的兜底清理"""
+    try:
+        asyncio.run(close_http_client())
+    except Exception:
+        pass
+
 def signal_handler(sig, frame):
     """处理终止信号"""
     print(f"\n[System] 收到信号 {sig}，准备退出...")
@@ -58,14 +84,17 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    # 0. 自动启动监控后台
+    # 0. 初始化监控数据库并自动启动监控后台
+    init_db()
     start_monitor()
 
     # 1. 初始化机器人
     bot = BotClient()
 
-    # 2. 注册处理器
+    # 2. 注册处理器与生命周期钩子
     register_handlers(bot)
+    bot.add_startup_handler(on_bot_startup)
+    bot.add_shutdown_handler(on_bot_shutdown)
 
     # 3. 运行机器人
     print("[System] 机器人正在启动...")
@@ -76,6 +105,7 @@ def main():
     except Exception as e:
         print(f"[System] 机器人运行崩溃: {e}")
     finally:
+        shutdown_llm_client()
         stop_monitor()
 
 if __name__ == "__main__":
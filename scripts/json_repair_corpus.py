@@ -0,0 +1,140 @@
+"""
+===============================================================================
+TOOL SCRIPT: JSON Repair Corpus
+DESCRIPTION: 用格式不规范的模型输出语料检验本地 JSON 修复 (repair_json) 的效果
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/json_repair_corpus.py
+    ./.venv/bin/python scripts/json_repair_corpus.py --from-db --limit 2000 -v
+
+DEPENDENCIES:
+    - sqlite3
+
+NOTES:
+    1. 默认使用内置语料：整理自 ai_logs 中实际出现过的解析失败形态
+       (尾随说明、只有结尾围栏、字符串内裸换行、max tokens 截断、单引号键等)。
+    2. --from-db 时从 data/ai_monitor.db 的 ai_logs 中取出全部响应文本，
+       只统计标准解析 (去围栏 + json.loads) 失败的那部分。
+    3. 输出：标准解析失败数、本地修复挽回数，即可节省的重试请求数。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import sqlite3
+
+from bot_agent.llm import strip_json_fences
+from bot_agent.llm_json import repair_json
+from bot_agent.monitor_query import load_blob
+
+BUILTIN_CORPUS = [
+    # 尾随说明
+    ('{"reply": true, "enter_focus": false, "reason": "有人@我"}\n\n以上是我的判断。', "trailing_prose"),
+    # 前置说明 + 围栏
+    ('好的，这是结果：\n```json\n{"action": "ignore", "reason": "话题无关"}\n```', "leading_prose"),
+    # 只有结尾围栏
+    ('{"stay_focus": false, "reason": "群里没人说话了"}\n```', "fence_at_end"),
+    # 围栏语言标记大写
+    ('```JSON\n{"summary": "聊了游戏", "trigger_evolution": false}\n```', "fence_upper"),
+    # 字符串内裸换行
+    ('{"thought": "先接话\n再吐槽", "replies": ["哈哈哈", "你认真的吗\n不会吧"]}', "raw_newline"),
+    # 字符串内裸制表符
+    ('{"summary": "A:\t你好\tB:\t再见", "trigger_evolution": true}', "raw_tab"),
+    # max tokens 截断：数组未闭合
+    ('{"thought": "想多回几句", "replies": ["第一句", "第二句", "第三', "truncated_array"),
+    # 截断在键值之间
+    ('{"reply": true, "reason": "有人问我问题", "emoji_id":', "truncated_colon"),
+    # 截断在逗号之后
+    ('{"traits": ["喜欢猫", "熬夜党"],', "truncated_comma"),
+    # 单引号键与值
+    ("{'reply': True, 'enter_focus': False, 'reason': '被点名了'}", "single_quotes"),
+    # 单引号字符串内的撇号与双引号
+    ("{'replies': ['it\\'s fine', '他说\"好\"']}", "single_quote_escape"),
+    # 尾随逗号
+    ('{"action": "emoji", "emoji_id": 76, "withdraw_emoji": true,}', "trailing_comma"),
+    # 数组尾随逗号
+    ('{"replies": ["嗯嗯", "好的",], "thought": "敷衍一下"}', "array_trailing_comma"),
+    # Python None
+    ('{"reply": false, "emoji_id": None, "reason": "不相关"}', "python_none"),
+    # 模型重复输出两份 JSON
+    ('{"stay_focus": true, "reason": "还在聊"}\n{"stay_focus": true, "reason": "还在聊"}', "duplicated_object"),
+    # 嵌套对象中的截断
+    ('{"123456": ["爱玩原神"], "234567": ["夜猫子", "喜欢', "truncated_nested"),
+    # 前面带方括号的标记（显示思考、图片占位）
+    ('> [Thinking]\n> 先看看是谁在说话\n\n{"reply": true, "reason": "被点名了"}', "leading_thinking"),
+    ('[图片] 这张图是猫 {"action": "emoji", "emoji_id": 76}', "leading_bracket_tag"),
+    # 顶层是数组：调用方都按对象取字段，不应算作修复
+    ('["哈哈哈", "好的"]\n以上', "top_level_array"),
+    # 完全不是 JSON：不应误修
+    ("抱歉，我无法完成这个请求。", "not_json"),
+    ("", "empty"),
+]
+
+def _extract_text(response_body: str) -> str | None:
+    try:
+        body = json.loads(response_body)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(body, dict):
+        return None
+    candidates = body.get("candidates") or []
+    if not candidates:
+        return None
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(p.get("text", "") for p in parts if not p.get("thought"))
+
+def _load_db_corpus(db_path: str, limit: int) -> list[tuple[str, str]]:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT id, response_body, response_hash FROM ai_logs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    corpus = []
+    for log_id, body, response_hash in rows:
+        if body is None:
+            # 较长的响应体压缩存放在 blobs 中
+            data = load_blob(conn.cursor(), response_hash)
+            body = data.decode("utf-8") if data is not None else None
+        text = _extract_text(body)
+        if text is not None:
+            corpus.append((text, f"ai_logs#{log_id}"))
+    conn.close()
+    return corpus
+
+def _strict_parse(text: str) -> bool:
+    try:
+        json.loads(strip_json_fences(text))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 JSON 修复效果统计")
+    parser.add_argument("--from-db", action="store_true", help="使用 ai_logs 中的真实响应作为语料")
+    parser.add_argument("--db", default="data/ai_monitor.db")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("-v", "--verbose", action="store_true", help="逐条打印失败样本的处理结果")
+    args = parser.parse_args()
+
+    corpus = _load_db_corpus(args.db, args.limit) if args.from_db else BUILTIN_CORPUS
+    failed, salvaged = 0, 0
+    for text, label in corpus:
+        if _strict_parse(text):
+            continue
+        failed += 1
+        result = repair_json(text)
+        if result is not None:
+            salvaged += 1
+        if args.verbose:
+            status = "修复" if result is not None else "放弃"
+            print(f"[{status}] {label}: {json.dumps(result, ensure_ascii=False)[:80] if result is not None else text[:60]!r}")
+
+    print(f"样本总数: {len(corpus)}")
+    print(f"标准解析失败: {failed}")
+    print(f"本地修复挽回: {salvaged} ({salvaged / failed:.0%})" if failed else "本地修复挽回: 0")
+    print(f"仍需重新请求: {failed - salvaged}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+===============================================================================
+TOOL SCRIPT: Persona / Impression History
+DESCRIPTION: 列出某个会话的人格特质或印象的历次版本（含已压缩进历史文件的旧版本）
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/memory_history.py personas 123456:default
+    ./.venv/bin/python scripts/memory_history.py impressions group_789:default --limit 10
+
+DEPENDENCIES:
+    - 无
+
+NOTES:
+    1. 在项目根目录运行，按时间顺序依次读取 data/<文件名>.history.jsonl 与当前文件。
+    2. 旧版本写入的记录没有时间，显示为 "-"。
+    3. 仅适用于 JSONL 存储；memory.storage 为 sqlite 时库中只保存最新一份。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+
+def iter_versions(path: str, session_id: str, field: str):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if f"{item.get('user_id')}:{item.get('persona_name')}" == session_id:
+                yield item.get("time") or "-", item.get(field)
+
+def main():
+    parser = argparse.ArgumentParser(description="人格 / 印象的历史版本")
+    parser.add_argument("kind", choices=["personas", "impressions"])
+    parser.add_argument("session_id", help="user_id:persona_name")
+    parser.add_argument("--limit", type=int, default=0, help="只显示最近 N 个版本，0 为全部")
+    args = parser.parse_args()
+
+    from bot_agent import config
+    from bot_agent.memory.persistence_content import _history_path
+    path, field = (config.PERSONA_FILE, "traits") if args.kind == "personas" else (config.IMPRESSION_FILE, "impression")
+    versions = [*iter_versions(_history_path(path), args.session_id, field), *iter_versions(path, args.session_id, field)]
+    if args.limit:
+        versions = versions[-args.limit:]
+    if not versions:
+        print(f"{args.session_id} 没有{'人格' if args.kind == 'personas' else '印象'}记录")
+        return
+    for n, (time_str, value) in enumerate(versions, 1):
+        text = "、".join(value) if isinstance(value, list) else str(value)
+        print(f"[{n}] {time_str}  {text}")
+
+if __name__ == "__main__":
+    main()
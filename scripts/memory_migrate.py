@@ -0,0 +1,41 @@
+"""
+===============================================================================
+TOOL SCRIPT: Memory Storage Migration
+DESCRIPTION: 把 data/ 下的 JSONL 记忆文件导入 SQLite 存储 (data/memory.db)
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/memory_migrate.py
+    # 然后在 agent_config.yaml 中设置 memory.storage: sqlite 并重启机器人
+
+DEPENDENCIES:
+    - sqlite3
+
+NOTES:
+    1. 在项目根目录运行，迁移前先停止机器人，避免迁移期间写入的 JSONL 记录丢失。
+    2. 导入 chat_history.jsonl、episodic_memory.jsonl（重放修改与删除记录后的现存记录）、
+       personas.jsonl、user_impressions.jsonl（每个会话取最后一条）。
+    3. 记录 id 保持不变，同 id 的记录被覆盖，可重复执行；JSONL 文件不会被修改或删除，
+       改回 memory.storage: jsonl 即可回退（回退后 SQLite 中新增的记录不会写回 JSONL）。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+def main():
+    from bot_agent import config
+    from bot_agent.memory import persistence_sqlite
+    start = time.perf_counter()
+    counts = persistence_sqlite.import_from_jsonl()
+    print(f"已导入 {config.MEMORY_DB_FILE}（耗时 {time.perf_counter() - start:.2f}s）:")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+    if config.MEMORY_STORAGE != "sqlite":
+        print("在 agent_config.yaml 中设置 memory.storage: sqlite 并重启机器人后生效")
+
+if __name__ == "__main__":
+    main()
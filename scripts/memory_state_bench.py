@@ -0,0 +1,79 @@
+"""
+===============================================================================
+TOOL SCRIPT: Memory State Checkpoint Benchmark
+DESCRIPTION: 对比每次变化都写入与合并写入 (memory.checkpoint_interval) 时，每条消息写 memory_state.json / social_state.json 的次数
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/memory_state_bench.py --messages 300 --rate 20 --interval 5
+
+DEPENDENCIES:
+    - 无
+
+NOTES:
+    1. 在临时目录中运行，不影响 data/。
+    2. 每条"消息"按机器人处理一条消息的顺序调用 MemoryManager：更新社交能量、消耗社交能量、
+       写入聊天记录、更新话题；消息分布在 --sessions 个会话中，以每秒 --rate 条的速度在事件循环中到达。
+    3. 社交能量距上次更新不足 10 秒时不会写入；为模拟平常的聊天节奏，每条消息前把会话的上次更新时间往前拨 15 秒。
+    4. 写入次数取自指标 memory_state_writes_total，最后的 flush_state() 计入（即关闭时写完）。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+def writes() -> dict[str, float]:
+    from bot_agent.metrics import MEMORY_STATE_WRITES
+    return {key[0]: series.value for key, series in MEMORY_STATE_WRITES.series.items()}
+
+async def run(manager, messages: int, sessions: int, rate: float):
+    for i in range(messages):
+        sid = f"group_{i % sessions}:default"
+        manager.get_social_manager(sid).last_update_ts -= 15
+        manager.update_social_energy(sid)
+        manager.consume_social_energy(sid, 1.0)
+        manager.save_message_to_file(sid, "user", f"第{i}条消息", nickname="群友", user_id="10001")
+        manager.update_topic(sid, f"话题{i % 7}")
+        await asyncio.sleep(1 / rate)
+    manager.flush_state()
+
+def main():
+    parser = argparse.ArgumentParser(description="状态文件合并写入对比")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=20, help="每秒到达的消息数")
+    parser.add_argument("--interval", type=float, default=5, help="合并写入的间隔（秒）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="memory_state_bench_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    from bot_agent import config, monitor, utils
+    from bot_agent.memory.manager import MemoryManager
+    monitor.init_db()
+    utils.LOG_LEVEL = 2  # 不打印逐条的社交能量与加载日志
+    config.ENABLE_SOCIAL_ENERGY = True
+
+    print(f"{args.messages} 条消息 / {args.sessions} 个会话，每秒 {args.rate:g} 条")
+    for label, interval in (("每次变化都写", 0), (f"合并写入 ({args.interval:g}s)", args.interval)):
+        config.MEMORY_CHECKPOINT_INTERVAL = interval
+        manager = MemoryManager()
+        before = writes()
+        start = time.perf_counter()
+        asyncio.run(run(manager, args.messages, args.sessions, args.rate))
+        elapsed = time.perf_counter() - start
+        after = writes()
+        counts = {name: after.get(name, 0) - before.get(name, 0) for name in ("memory_state", "social_state")}
+        per_message = sum(counts.values()) / args.messages
+        print(f"  {label:<16} memory_state {counts['memory_state']:5.0f} 次  social_state {counts['social_state']:5.0f} 次"
+              f"  每条消息 {per_message:.3f} 次  ({elapsed:.1f}s)")
+    monitor.flush_monitor()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+===============================================================================
+TOOL SCRIPT: Memory Storage Benchmark
+DESCRIPTION: 对比 JSONL 与 SQLite 记忆存储的启动加载耗时与逐条追加耗时
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/memory_store_bench.py --lines 1000000 --sessions 200
+
+DEPENDENCIES:
+    - sqlite3
+
+NOTES:
+    1. 在临时目录中生成数据，不影响 data/。
+    2. 生成 --lines 行聊天记录，均匀分布在 --sessions 个会话中，再用 memory_migrate 的导入函数写入 SQLite。
+    3. "启动" 为 load_chat_history（每个会话加载最近 50 条）；"追加" 为 save_message_to_file，
+       即每条新消息阻塞事件循环的时间；"单会话" 为读取一个会话最近 50 条（load_session_history）。
+    4. JSONL 按会话加载的更多对比（与重放整个文件、随文件大小的变化）见 scripts/memory_tail_bench.py。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+
+def generate(path: str, lines: int, sessions: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            sid = f"group_{i % sessions}"
+            f.write(json.dumps({
+                "id": i + 1, "user_id": sid, "role": "user" if i % 3 else "model",
+                "content": f"第{i}条消息，今天天气不错，一起去吃饭吗？" * 2, "time": "2026-01-01 12:00:00",
+                "nickname": "群友", "user_id_real": str(10000 + i % 50)
+            }, ensure_ascii=False) + "\n")
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def bench_append(backend, appends: int) -> float:
+    start = time.perf_counter()
+    for i in range(appends):
+        backend.save_message_to_file(f"group_{i % 20}", "user", f"新消息 {i}", "2026-01-02 12:00:00", nickname="群友", user_id="10001")
+    return (time.perf_counter() - start) / appends
+
+def main():
+    parser = argparse.ArgumentParser(description="记忆存储后端对比")
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--appends", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="memory_bench_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    from bot_agent import config
+    from bot_agent.memory import persistence_content, persistence_sqlite
+
+    _, gen_time = timed(generate, config.HISTORY_FILE, args.lines, args.sessions)
+    print(f"生成 {args.lines} 行 / {args.sessions} 个会话: {gen_time:.1f}s，JSONL {os.path.getsize(config.HISTORY_FILE) / 1e6:.1f}MB")
+    counts, import_time = timed(persistence_sqlite.import_from_jsonl)
+    print(f"导入 SQLite: {counts['chat_messages']} 条，{import_time:.1f}s，{os.path.getsize(config.MEMORY_DB_FILE) / 1e6:.1f}MB")
+
+    history, jsonl_load = timed(persistence_content.load_chat_history, {})
+    jsonl_count = sum(len(v) for v in history.values())
+    history, sqlite_load = timed(persistence_sqlite.load_chat_history, {})
+    sqlite_count = sum(len(v) for v in history.values())
+    print("\n启动加载 (load_chat_history):")
+    print(f"  JSONL  {jsonl_load * 1000:10.1f}ms  {jsonl_count} 条")
+    print(f"  SQLite {sqlite_load * 1000:10.1f}ms  {sqlite_count} 条")
+
+    _, jsonl_session = timed(persistence_content.load_session_history, "group_0", 50)
+    _, sqlite_session = timed(persistence_sqlite.load_session_history, "group_0", 50)
+    print(f"\n单会话最近 50 条: JSONL {jsonl_session * 1000:.2f}ms（从文件末尾向前读取），SQLite {sqlite_session * 1000:.2f}ms")
+
+    print(f"\n逐条追加 ({args.appends} 条，每条的平均耗时):")
+    print(f"  JSONL  {bench_append(persistence_content, args.appends) * 1e6:8.1f}µs")
+    print(f"  SQLite {bench_append(persistence_sqlite, args.appends) * 1e6:8.1f}µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+===============================================================================
+TOOL SCRIPT: History Tail-Read Benchmark
+DESCRIPTION: 对比 JSONL 聊天记录按会话加载时重放整个文件与从文件末尾向前读取的耗时，及其随文件大小的变化
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/memory_tail_bench.py --lines 200000 1000000 5000000
+
+DEPENDENCIES:
+    - 无
+
+NOTES:
+    1. 在临时目录中生成数据，不影响 data/。
+    2. 每个规模生成 --lines 行聊天记录，均匀分布在 --sessions 个活跃会话中；
+       另有一个只在文件开头 1% 处说过话的沉寂会话。
+    3. "重放" 为改动前的做法（解析整个文件再取最后 N 条）；"尾部" 为 load_session_history / load_chat_history。
+       尾部读取活跃会话的耗时应基本不随文件变大而增长，沉寂会话则与其记录离文件末尾的距离成正比。
+    4. "会话列表" 首次需扫描整个文件（不解析 JSON），之后只扫描新追加的部分。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+
+DORMANT = "group_dormant"
+
+def generate(path: str, lines: int, sessions: int):
+    dormant_until = lines // 100
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            sid = DORMANT if i < dormant_until and i % 10 == 0 else f"group_{i % sessions}"
+            f.write(json.dumps({
+                "id": i + 1, "user_id": sid, "role": "user" if i % 3 else "model",
+                "content": f"第{i}条消息，今天天气不错，一起去吃饭吗？" * 2, "time": "2026-01-01 12:00:00",
+                "nickname": "群友", "user_id_real": str(10000 + i % 50)
+            }, ensure_ascii=False) + "\n")
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记录尾部读取对比")
+    parser.add_argument("--lines", type=int, nargs="+", default=[200000, 1000000])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="memory_tail_bench_")
+    os.chdir(workdir)
+    os.makedirs("data")
+    from bot_agent import config, utils
+    from bot_agent.memory import persistence_content as pc
+    utils.LOG_LEVEL = 2  # 不逐个会话打印加载日志
+    path, limit = config.HISTORY_FILE, args.limit
+
+    for lines in args.lines:
+        generate(path, lines, args.sessions)
+        pc._session_index.clear()
+        print(f"\n{lines} 行 / {args.sessions + 1} 个会话，{os.path.getsize(path) / 1e6:.1f}MB")
+
+        sessions, replay = timed(pc._session_records, path)
+        _, active_tail = timed(pc.load_session_history, "group_0", limit)
+        dormant, dormant_tail = timed(pc.load_session_history, DORMANT, limit)
+        assert [m["id"] for m in dormant] == [item["id"] for item in sessions[DORMANT][-limit:]]
+        print(f"  单会话最近 {limit} 条: 重放 {replay * 1000:9.1f}ms | 尾部 活跃 {active_tail * 1000:7.2f}ms  沉寂 {dormant_tail * 1000:8.1f}ms")
+
+        listed, first_scan = timed(pc.list_chat_sessions)
+        for i in range(100):
+            pc.save_message_to_file(f"group_{i}", "user", f"新消息 {i}", "2026-01-02 12:00:00")
+        _, incremental = timed(pc.list_chat_sessions)
+        print(f"  会话列表 ({len(listed)} 个): 首次 {first_scan * 1000:9.1f}ms | 追加 100 条后 {incremental * 1000:.2f}ms")
+
+        history, tail_all = timed(pc.load_chat_history, {})
+        print(f"  全部会话各 50 条 (load_chat_history): 重放 {replay * 1000:9.1f}ms | 尾部 {tail_all * 1000:.1f}ms（含沉寂会话，{sum(len(v) for v in history.values())} 条）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+===============================================================================
+TOOL SCRIPT: Mock Gemini Server
+DESCRIPTION: 本地 Gemini 替身服务，用于在不消耗真实额度的情况下调试 LLM 层
+             (generateContent / streamGenerateContent)
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/mock_gemini_server.py --port 18080 --latency 1.5 --chunk-delay 0.3
+    GEMINI_URL=http://127.0.0.1:18080/v1beta/models/gemini-3-flash:generateContent ./.venv/bin/python main.py
+
+DEPENDENCIES:
+    - fastapi
+    - uvicorn
+
+NOTES:
+    1. 按 prompt 中的 JSON 格式说明返回对应结构的假数据（回复 / 准入 / 微观 / 宏观 / 总结）。
+    2. 流式接口把完整 JSON 文本切成小块，以 SSE (alt=sse) 逐块推送，模拟真实的生成速度。
+    3. usageMetadata 中的 token 数按 4 字符 ≈ 1 token 粗略估算。
+    4. 支持 cachedContents 的创建/删除；请求引用缓存时 promptTokenCount 计入缓存部分，
+       并在 cachedContentTokenCount 中单独列出。GET /stats 返回累计的输入 token 统计。
+===============================================================================
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Mock Gemini")
+SETTINGS = {"latency": 1.0, "chunk_delay": 0.3, "chunk_size": 12}
+CACHES: dict[str, str] = {}
+STATS = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "caches_created": 0}
+
+def _prompt_text(body: dict) -> str:
+    texts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+    return "\n".join(texts)
+
+def _fake_answer(prompt: str) -> dict:
+    if '"replies"' in prompt:
+        return {"thought": "随便回两句", "replies": ["收到", "这个我知道", "等我想想再说"]}
+    if '"action"' in prompt:
+        return {"action": "reply", "emoji_id": 76, "withdraw_emoji": True, "reason": "mock"}
+    if '"stay_focus"' in prompt:
+        return {"stay_focus": True, "reason": "mock"}
+    if '"reply"' in prompt:
+        return {"reply": True, "enter_focus": False, "emoji_id": 76, "withdraw_emoji": True, "reason": "mock"}
+    if '"summary"' in prompt:
+        return {"summary": "大家随便聊了聊", "trigger_evolution": False}
+    return {}
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+def _usage(prompt: str, answer_text: str, cached_text: str = "") -> dict:
+    cached_tokens = _tokens(cached_text)
+    prompt_tokens, candidate_tokens = _tokens(prompt) + cached_tokens, _tokens(answer_text)
+    STATS["requests"] += 1
+    STATS["prompt_tokens"] += prompt_tokens
+    STATS["cached_tokens"] += cached_tokens
+    usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": candidate_tokens, "totalTokenCount": prompt_tokens + candidate_tokens}
+    if cached_tokens:
+        usage["cachedContentTokenCount"] = cached_tokens
+    return usage
+
+@app.post("/v1beta/cachedContents")
+async def create_cache(request: Request):
+    body = await request.json()
+    name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+    CACHES[name] = _prompt_text(body)
+    STATS["caches_created"] += 1
+    return JSONResponse(content={"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": _tokens(CACHES[name])}})
+
+@app.delete("/v1beta/cachedContents/{cache_id}")
+async def delete_cache(cache_id: str):
+    CACHES.pop(f"cachedContents/{cache_id}", None)
+    return JSONResponse(content={})
+
+@app.get("/stats")
+async def stats():
+    billed = STATS["prompt_tokens"] - STATS["cached_tokens"]
+    return JSONResponse(content={**STATS, "uncached_prompt_tokens": billed, "live_caches": len(CACHES)})
+
+@app.post("/stats/reset")
+async def reset_stats():
+    STATS.update(requests=0, prompt_tokens=0, cached_tokens=0, caches_created=0)
+    return JSONResponse(content=STATS)
+
+@app.post("/v1beta/models/{model_action}")
+async def generate(model_action: str, request: Request):
+    body = await request.json()
+    prompt = _prompt_text(body)
+    cached_text = CACHES.get(body.get("cachedContent", ""), "")
+    if body.get("cachedContent") and not cached_text:
+        return JSONResponse(status_code=404, content={"error": {"code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+    answer_text = json.dumps(_fake_answer(cached_text + prompt), ensure_ascii=False)
+
+    if model_action.endswith(":streamGenerateContent"):
+        async def event_stream():
+            size = SETTINGS["chunk_size"]
+            chunks = [answer_text[i:i + size] for i in range(0, len(answer_text), size)]
+            for i, piece in enumerate(chunks):
+                await asyncio.sleep(SETTINGS["chunk_delay"])
+                chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+                if i == len(chunks) - 1:
+                    chunk["usageMetadata"] = _usage(prompt, answer_text, cached_text)
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(SETTINGS["latency"])
+    return JSONResponse(content={
+        "candidates": [{"content": {"role": "model", "parts": [{"text": answer_text}]}, "finishReason": "STOP"}],
+        "usageMetadata": _usage(prompt, answer_text, cached_text)
+    })
+
+@app.head("/")
+async def root():
+    return JSONResponse(content={})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 Gemini 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=1.0, help="非流式接口的响应延迟 (秒)")
+    parser.add_argument("--chunk-delay", type=float, default=0.3, help="流式接口每块之间的延迟 (秒)")
+    parser.add_argument("--chunk-size", type=int, default=12, help="流式接口每块的字符数")
+    args = parser.parse_args()
+    SETTINGS.update(latency=args.latency, chunk_delay=args.chunk_delay, chunk_size=args.chunk_size)
+
+    print(f"Mock Gemini server at http://{args.host}:{args.port}/v1beta/models/<model>:generateContent")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,109 @@
+"""
+===============================================================================
+TOOL SCRIPT: Monitor Web Load Test
+DESCRIPTION: 并发请求监控网页的仪表盘接口，检查慢查询是否还会阻塞其他请求
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/monitor_web.py
+    ./.venv/bin/python scripts/monitor_load_test.py --url http://127.0.0.1:8000 --concurrency 8
+
+DEPENDENCIES:
+    - httpx
+    - 已启动的监控网页 (scripts/monitor_web.py)，监控库中最好有一定量的记录
+
+NOTES:
+    1. 先逐个请求每个接口一次，记录单独请求的耗时（基线）。
+    2. 再把每个接口各复制 --concurrency 份同时发出。查询在事件循环上串行执行时，
+       轻量接口（基线 < 50ms）也要排在所有慢查询之后，耗时接近整批请求的总耗时；
+       在线程池中执行时轻量接口不受慢查询影响。
+    3. 并发请求进行期间每 50ms 请求一次静态文件，其耗时应接近空闲时。
+    4. 单核机器上总耗时不会因并发而缩短，关注的是轻量接口与静态文件不再被阻塞。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import time
+
+# 打开仪表盘时浏览器发出的请求（含较重的路由统计与全文搜索）
+DASHBOARD_PATHS = [
+    "/api/ai-logs?limit=50",
+    "/api/ai-decisions?limit=50",
+    "/api/token-usage/sessions?days=1",
+    "/api/token-usage/daily?days=30",
+    "/api/llm-json-stats?hours=720",
+    "/api/llm-routes?hours=720",
+    "/api/metrics",
+    "/api/monitor/storage",
+    "/api/user-activity?limit=20",
+    "/api/config-changes?limit=50",
+    "/api/search?q=the",
+]
+STATIC_PATH = "/static/js/main.js"
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+async def _timed_get(client, path: str) -> tuple[str, float, int]:
+    start = time.perf_counter()
+    response = await client.get(path)
+    await response.aread()
+    return path, time.perf_counter() - start, response.status_code
+
+async def _probe_static(client, stop: asyncio.Event, samples: list[float]):
+    while not stop.is_set():
+        _, elapsed, _ = await _timed_get(client, STATIC_PATH)
+        samples.append(elapsed)
+        await asyncio.sleep(0.05)
+
+async def run(url: str, concurrency: int, timeout: float):
+    import httpx
+    limits = httpx.Limits(max_connections=concurrency * len(DASHBOARD_PATHS) + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        idle_static = [(await _timed_get(client, STATIC_PATH))[1] for _ in range(5)]
+
+        print("单独请求（基线）:")
+        baseline = {}
+        for path in DASHBOARD_PATHS:
+            _, elapsed, status = await _timed_get(client, path)
+            baseline[path] = elapsed
+            print(f"  {elapsed * 1000:8.1f}ms  {status}  {path}")
+
+        stop, static_samples = asyncio.Event(), []
+        probe = asyncio.create_task(_probe_static(client, stop, static_samples))
+        start = time.perf_counter()
+        results = await asyncio.gather(*[_timed_get(client, path) for path in DASHBOARD_PATHS for _ in range(concurrency)])
+        wall = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    failed = [r for r in results if r[2] >= 500]
+    print(f"\n并发请求: {len(results)} 个 (每个接口 {concurrency} 份)，失败 {len(failed)}")
+    print(f"  总耗时 {wall * 1000:.1f}ms，基线之和 × {concurrency} = {sum(baseline.values()) * concurrency * 1000:.1f}ms")
+    for path in DASHBOARD_PATHS:
+        samples = [r[1] for r in results if r[0] == path]
+        print(f"  p50 {_percentile(samples, 0.5) * 1000:8.1f}ms  p95 {_percentile(samples, 0.95) * 1000:8.1f}ms  {path}")
+    light = [r[1] for r in results if baseline[r[0]] < 0.05]
+    if light:
+        print(f"  轻量接口 p95 {_percentile(light, 0.95) * 1000:.1f}ms（占整批总耗时的 {_percentile(light, 0.95) / wall:.0%}）")
+    print(f"\n静态文件 {STATIC_PATH}:")
+    print(f"  空闲时 p50 {_percentile(idle_static, 0.5) * 1000:.1f}ms")
+    if static_samples:
+        print(f"  并发期间 {len(static_samples)} 次，p50 {_percentile(static_samples, 0.5) * 1000:.1f}ms，最大 {max(static_samples) * 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="监控网页并发负载测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8, help="每个接口同时发出的请求数")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.timeout))
+
+if __name__ == "__main__":
+    main()
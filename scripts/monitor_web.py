@@ -18,26 +18,72 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-import sqlite3
 import json
+import gzip
+import hashlib
 import uvicorn
+from bot_agent.ipc_client import live_subscriber, call as bot_call, BotUnavailable
 
-app = FastAPI(title="AI Interaction Monitor")
+# SSE 心跳间隔（秒），避免代理断开空闲连接
+SSE_HEARTBEAT = 15
+# 超过该字节数的记忆数据响应按 gzip 压缩（浏览器声明支持时）
+GZIP_MIN_BYTES = 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 订阅机器人进程的本地事件通道（活跃任务、调用与决策的实时推送）
+    task = asyncio.create_task(live_subscriber.run())
+    yield
+    task.cancel()
+
+app = FastAPI(title="AI Interaction Monitor", lifespan=lifespan)
 
 # 配置静态文件和模板
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-DB_PATH = "data/ai_monitor.db"
+async def live_response(method: str, **params) -> JSONResponse:
+    """返回机器人进程中 method 的结果（实时内存状态）；机器人未运行时返回 503"""
+    try:
+        return JSONResponse(content=await bot_call(method, **params))
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
+    except RuntimeError as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+async def live_cached_response(request: Request, method: str, **params) -> Response:
+    """同 live_response，附带 ETag（内容哈希）：与 If-None-Match 一致时返回 304，较大的响应按 gzip 压缩"""
+    try:
+        result = await bot_call(method, **params)
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
+    except RuntimeError as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
+    body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    # no-cache：浏览器每次都带 If-None-Match 重新验证，内容未变时只收到 304
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 查询类端点定义为普通函数，由 FastAPI 放到线程池中执行（监控库使用只读连接池，见 monitor_query），
+# 慢查询不会阻塞事件循环上的静态文件、SSE 与其他请求。
+# 修改配置 / 提示词文件、清空日志等写操作在单独的线程中依次执行，彼此之间不会并发
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="monitor-web-write")
+
+async def run_write(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_write_executor, func, *args)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -46,46 +92,136 @@ async def index(request: Request):
 # API 端点
 
 @app.get("/api/ai-logs")
-async def get_ai_logs(limit: int = 50):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM ai_logs ORDER BY timestamp DESC LIMIT ?", (limit,))
-    logs = cursor.fetchall()
-    conn.close()
-    return JSONResponse(content=[dict(log) for log in logs])
+def get_ai_logs(limit: int = 50, cursor: int | None = None, session_id: str | None = None, call_type: str | None = None, model: str | None = None,
+                      min_duration: float | None = None, since: str | None = None, until: str | None = None):
+    """游标分页：返回 {"items", "next_cursor"}，把 next_cursor 作为下一次请求的 cursor；请求体 / 响应体见 /api/ai-logs/{id}"""
+    from bot_agent.monitor_query import get_ai_logs
+    return JSONResponse(content=get_ai_logs(limit, cursor, session_id, call_type, model, min_duration, since, until))
+
+@app.get("/api/ai-logs/{log_id}")
+def get_ai_log_detail(log_id: int, images: bool = False):
+    """单条交互的完整请求 / 响应：从 blobs 还原，images=true 时把图片引用换回原图"""
+    from bot_agent.monitor_query import get_ai_log_detail
+    log = get_ai_log_detail(log_id, images)
+    if log is None:
+        return JSONResponse(status_code=404, content={"error": "Not found"})
+    return JSONResponse(content=log)
+
+@app.get("/api/ai-decisions/{decision_id}/prompt")
+def get_ai_decision_prompt(decision_id: int):
+    from bot_agent.monitor_query import get_decision_prompt
+    return JSONResponse(content={"prompt": get_decision_prompt(decision_id)})
 
 @app.get("/api/ai-decisions")
-async def get_ai_decisions(limit: int = 50):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM ai_decisions ORDER BY timestamp DESC LIMIT ?", (limit,))
-    decisions = cursor.fetchall()
-    conn.close()
-    return JSONResponse(content=[dict(decision) for decision in decisions])
+def get_ai_decisions(limit: int = 50, cursor: int | None = None, session_id: str | None = None, decision_type: str | None = None, model: str | None = None,
+                           min_duration: float | None = None, since: str | None = None, until: str | None = None):
+    """游标分页：返回 {"items", "next_cursor"}"""
+    from bot_agent.monitor_query import get_ai_decisions
+    return JSONResponse(content=get_ai_decisions(limit, cursor, session_id, decision_type, model, min_duration, since, until))
+
+@app.get("/api/search")
+def search(q: str, kinds: str | None = None, session_id: str | None = None, since: str | None = None, until: str | None = None, limit: int = 20):
+    """全文搜索：kinds 为逗号分隔的 ai_log / decision / chat（默认全部），结果按相关度排序"""
+    from bot_agent.monitor_query import search
+    return JSONResponse(content=search(q, kinds.split(",") if kinds else None, session_id, since, until, limit))
+
+@app.get("/api/llm-json-stats")
+def get_llm_json_stats(hours: int = 24):
+    from bot_agent.monitor_query import get_json_stats
+    return JSONResponse(content=get_json_stats(hours))
+
+@app.get("/api/token-usage/sessions")
+def get_token_usage_sessions(days: int = 1):
+    """按会话汇总 token 消耗，附带预算与状态（预算按今日用量判断）"""
+    from bot_agent.monitor_query import get_token_usage_by_session
+    from bot_agent.llm_budget import get_session_limits, get_budget_status
+    rows = get_token_usage_by_session(days)
+    today = {r["session_id"]: r["total_tokens"] for r in (rows if days == 1 else get_token_usage_by_session(1))}
+    for row in rows:
+        row["soft_limit"], row["hard_limit"] = get_session_limits(row["session_id"])
+        row["budget_status"] = get_budget_status(row["session_id"], today.get(row["session_id"], 0))
+    return JSONResponse(content=rows)
+
+@app.get("/api/token-usage/daily")
+def get_token_usage_daily(days: int = 7, session_id: str | None = None):
+    from bot_agent.monitor_query import get_token_usage_by_day
+    return JSONResponse(content=get_token_usage_by_day(days, session_id))
+
+@app.get("/api/llm-endpoints")
+def get_llm_endpoints():
+    from bot_agent.monitor_query import get_endpoint_states
+    return JSONResponse(content=get_endpoint_states())
+
+@app.get("/api/llm-routes")
+def get_llm_routes(hours: int = 24):
+    """按调用类型与模型汇总延迟 / token，并附带当前的路由配置"""
+    from bot_agent.monitor_query import get_route_stats
+    from bot_agent.llm_routes import resolve_route, ROUTE_CALL_TYPES
+    return JSONResponse(content={
+        "routes": {call_type: resolve_route(call_type) for call_type in ROUTE_CALL_TYPES},
+        "stats": get_route_stats(hours)
+    })
+
+@app.get("/api/metrics")
+def get_metrics():
+    """延迟与队列指标摘要（p50 / p95 / p99 及最近窗口内的分位数）"""
+    from bot_agent.monitor_query import get_metrics
+    return JSONResponse(content=get_metrics())
+
+@app.get("/metrics")
+def get_prometheus_metrics():
+    """Prometheus 文本格式的指标，供 Prometheus 抓取"""
+    from bot_agent.monitor_query import get_metric_rows
+    from bot_agent.metrics import render_prometheus
+    return PlainTextResponse(render_prometheus(get_metric_rows()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/monitor/storage")
+def get_monitor_storage():
+    from bot_agent.monitor_query import get_storage_stats
+    return JSONResponse(content=get_storage_stats())
 
 @app.get("/api/active-tasks")
 async def get_active_tasks():
-    from bot_agent.monitor_query import get_active_tasks
-    tasks = get_active_tasks()
-    return JSONResponse(content=tasks)
+    """活跃任务（机器人进程推送的内存状态，不再查询监控库）"""
+    return JSONResponse(content=live_subscriber.tasks())
+
+@app.get("/api/events")
+async def live_events(request: Request):
+    """Server-Sent Events：先发送 snapshot（连接状态与活跃任务），之后实时推送 task / ai_log / ai_decision 事件"""
+    queue = live_subscriber.listen()
+
+    async def stream():
+        try:
+            event = live_subscriber.snapshot()
+            while True:
+                if event is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    event = None
+        finally:
+            live_subscriber.unlisten(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/api/user-activity")
-async def get_user_activity(session_id: str | None = None, limit: int = 20):
+def get_user_activity(session_id: str | None = None, limit: int = 20):
     from bot_agent.monitor_query import get_user_activity
     activity = get_user_activity(session_id, limit)
     return JSONResponse(content=activity)
 
 @app.get("/api/config-changes")
-async def get_config_changes(limit: int = 50):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM config_changes ORDER BY timestamp DESC LIMIT ?", (limit,))
-    changes = cursor.fetchall()
-    conn.close()
-    return JSONResponse(content=[dict(change) for change in changes])
+def get_config_changes(limit: int = 50):
+    from bot_agent.monitor_query import get_config_changes
+    return JSONResponse(content=get_config_changes(limit))
 
 @app.get("/api/config")
-async def get_config():
+def get_config():
     from bot_agent.config import config_manager
     return JSONResponse(content=config_manager.get_config())
 
@@ -94,9 +230,12 @@ async def update_config(request: Request):
     data = await request.json()
     from bot_agent.config import config_manager
     
-    try:
+    def update():
         for section, section_config in data.items():
             config_manager.update_section(section, section_config, "web")
+
+    try:
+        await run_write(update)
         return JSONResponse(content={"success": True, "message": "配置更新成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -107,7 +246,7 @@ async def update_section(section: str = Form(...), config: str = Form(...)):
     
     try:
         config_data = json.loads(config)
-        config_manager.update_section(section, config_data, "web")
+        await run_write(config_manager.update_section, section, config_data, "web")
         return JSONResponse(content={"success": True, "message": f"配置节 {section} 更新成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -117,38 +256,28 @@ async def reset_config():
     from bot_agent.config import config_manager
     
     try:
-        config_manager.reset_config()
+        await run_write(config_manager.reset_config)
         return JSONResponse(content={"success": True, "message": "配置已重置为默认值"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
-# Persona 管理 API
+# Persona 管理 API（记忆状态均通过本地事件通道读写机器人进程中的实时数据）
 @app.get("/api/personas")
 async def get_personas():
-    from bot_agent.memory import memory_manager
-    return JSONResponse(content=memory_manager.personas)
+    return await live_response("memory.personas")
 
 @app.get("/api/active-personas")
 async def get_active_personas():
-    from bot_agent.memory import memory_manager
-    return JSONResponse(content=memory_manager.active_personas)
+    return await live_response("memory.active_personas")
 
 # 社交状态 API
 @app.get("/api/social-states")
 async def get_social_states():
-    from bot_agent.memory import memory_manager
-    states = {
-        sid: {
-            "social_energy": sm.social_energy,
-            "mood": sm.mood,
-            "last_update_ts": sm.last_update_ts
-        } for sid, sm in memory_manager.social_managers.items()
-    }
-    return JSONResponse(content=states)
+    return await live_response("memory.social_states")
 
 # 基础人格管理 API
 @app.get("/api/base-personas")
-async def get_base_personas():
+def get_base_personas():
     from bot_agent.config import config_manager
     return JSONResponse(content=config_manager.get_base_persona_config())
 
@@ -160,7 +289,7 @@ async def add_base_persona(request: Request):
     try:
         name = data["name"]
         description = data["description"]
-        config_manager.add_base_persona(name, description)
+        await run_write(config_manager.add_base_persona, name, description)
         return JSONResponse(content={"success": True, "message": f"人格 '{name}' 添加成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -173,7 +302,7 @@ async def update_base_persona(request: Request):
     try:
         name = data["name"]
         description = data["description"]
-        config_manager.update_base_persona(name, description)
+        await run_write(config_manager.update_base_persona, name, description)
         return JSONResponse(content={"success": True, "message": f"人格 '{name}' 更新成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -185,14 +314,14 @@ async def delete_base_persona(request: Request):
     
     try:
         name = data["name"]
-        config_manager.delete_base_persona(name)
+        await run_write(config_manager.delete_base_persona, name)
         return JSONResponse(content={"success": True, "message": f"人格 '{name}' 删除成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 # 初始人格特质管理 API
 @app.get("/api/initial-traits")
-async def get_initial_traits():
+def get_initial_traits():
     from bot_agent.config import config_manager
     return JSONResponse(content=config_manager.get_initial_traits())
 
@@ -204,7 +333,7 @@ async def add_initial_trait(request: Request):
     try:
         persona_name = data["persona_name"]
         trait = data["trait"]
-        config_manager.add_initial_trait(persona_name, trait)
+        await run_write(config_manager.add_initial_trait, persona_name, trait)
         return JSONResponse(content={"success": True, "message": f"特质 '{trait}' 添加成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -217,7 +346,7 @@ async def remove_initial_trait(request: Request):
     try:
         persona_name = data["persona_name"]
         trait = data["trait"]
-        config_manager.remove_initial_trait(persona_name, trait)
+        await run_write(config_manager.remove_initial_trait, persona_name, trait)
         return JSONResponse(content={"success": True, "message": f"特质 '{trait}' 删除成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -225,126 +354,110 @@ async def remove_initial_trait(request: Request):
 # 记忆管理 API
 @app.get("/api/impressions")
 async def get_impressions():
-    from bot_agent.memory import memory_manager
-    return JSONResponse(content=memory_manager.impressions)
+    return await live_response("memory.impressions")
 
 @app.put("/api/impressions")
 async def update_impressions(request: Request):
     data = await request.json()
     try:
-        session_id = data["session_id"]
         impressions = data["impressions"]
         if isinstance(impressions, str):
             import re
             impressions = [i.strip() for i in re.split(r'[，。；,;.]', impressions) if i.strip()]
-        
-        # 解析 session_id
-        from bot_agent.config import DEFAULT_PERSONA_NAME
-        if ":" in session_id:
-            user_id, persona_name = session_id.split(":", 1)
-        else:
-            user_id, persona_name = session_id, DEFAULT_PERSONA_NAME
-            
-        from bot_agent.memory.persistence import save_impression_to_file
-        save_impression_to_file(user_id, persona_name, impressions)
+        await bot_call("memory.set_impressions", session_id=data["session_id"], impressions=impressions)
         return JSONResponse(content={"success": True, "message": "印象更新成功"})
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 @app.get("/api/chat-history")
-async def get_chat_history():
-    from bot_agent.memory import memory_manager
-    return JSONResponse(content=memory_manager.chat_history)
+async def get_chat_history(request: Request):
+    # 全部会话的完整记录，数据量大；记忆页面改用下面的会话列表与分段读取
+    return await live_cached_response(request, "memory.chat_history")
+
+@app.get("/api/chat-history/sessions")
+async def get_chat_sessions(request: Request):
+    return await live_cached_response(request, "memory.chat_sessions")
+
+@app.get("/api/chat-history/{session_id}")
+async def get_chat_window(request: Request, session_id: str, before: int = None, after: int = None, limit: int = 50):
+    return await live_cached_response(request, "memory.chat_window", session_id=session_id, before=before, after=after, limit=limit)
+
+async def live_action(done: str, method: str, **params) -> JSONResponse:
+    """调用机器人进程中修改记忆的方法，成功时返回 {"success": True, "message": done, "data": 结果}"""
+    try:
+        data = await bot_call(method, **params)
+        return JSONResponse(content={"success": True, "message": done, "data": data})
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
+    except Exception as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
+
+# 单条消息的增改删：按消息 id 追加一条日志记录，不重写文件
+@app.post("/api/chat-history/{session_id}")
+async def add_chat_message(session_id: str, request: Request):
+    return await live_action("消息已添加", "memory.add_chat_message", session_id=session_id, message=await request.json())
+
+@app.patch("/api/chat-history/{session_id}/{message_id}")
+async def patch_chat_message(session_id: str, message_id: int, request: Request):
+    return await live_action("消息已修改", "memory.patch_chat_message", session_id=session_id, message_id=message_id, fields=await request.json())
+
+@app.delete("/api/chat-history/{session_id}/{message_id}")
+async def delete_chat_message(session_id: str, message_id: int):
+    return await live_action("消息已删除", "memory.delete_chat_message", session_id=session_id, message_id=message_id)
 
 @app.put("/api/chat-history")
 async def update_chat_history(request: Request):
     data = await request.json()
     try:
-        session_id = data["session_id"]
-        messages = data["messages"] # 预期是对象列表 [{"role": "...", "content": "...", "time": "..."}]
-        
-        from bot_agent.memory import memory_manager
-        memory_manager.chat_history[session_id] = messages
-        
-        # 保存到文件
-        from bot_agent.config import DATA_DIR
-        history_file = os.path.join(DATA_DIR, "chat_history.jsonl")
-        
-        # 这是一个大动作，我们需要重写整个历史文件，或者至少过滤掉该 session 的再重新追加。
-        # 对于开发工具，我们先采用简单重写方案（如果文件不是特别大）。
-        all_history = []
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item = json.loads(line)
-                        if item.get("user_id") != session_id:
-                            all_history.append(item)
-        
-        for m in messages:
-            all_history.append({
-                "user_id": session_id,
-                "role": m["role"],
-                "content": m["content"],
-                "time": m.get("time"),
-                "nickname": m.get("nickname"),
-                "user_id_real": m.get("user_id") # 注意：内存中的 user_id 是发送者 ID
-            })
-            
-        with open(history_file, 'w', encoding='utf-8') as f:
-            for item in all_history:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-                
+        # messages 为对象列表 [{"role": "...", "content": "...", "time": "..."}]，替换该会话的全部聊天记录
+        await bot_call("memory.set_chat_history", session_id=data["session_id"], messages=data["messages"])
         return JSONResponse(content={"success": True, "message": "聊天历史更新成功"})
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 @app.get("/api/episodic-memory")
-async def get_episodic_memory():
-    from bot_agent.memory import memory_manager
-    return JSONResponse(content=memory_manager.episodic_memory)
+async def get_episodic_memory(request: Request):
+    return await live_cached_response(request, "memory.episodic")
+
+@app.get("/api/episodic-memory/sessions")
+async def get_episodic_sessions(request: Request):
+    return await live_cached_response(request, "memory.episodic_sessions")
+
+@app.get("/api/episodic-memory/{session_id}")
+async def get_episodic_window(request: Request, session_id: str, before: int = None, after: int = None, limit: int = 50):
+    return await live_cached_response(request, "memory.episodic_window", session_id=session_id, before=before, after=after, limit=limit)
+
+@app.post("/api/episodic-memory/{session_id}")
+async def add_episode(session_id: str, request: Request):
+    return await live_action("情节记忆已添加", "memory.add_episode", session_id=session_id, episode=await request.json())
+
+@app.patch("/api/episodic-memory/{session_id}/{episode_id}")
+async def patch_episode(session_id: str, episode_id: int, request: Request):
+    return await live_action("情节记忆已修改", "memory.patch_episode", session_id=session_id, episode_id=episode_id, fields=await request.json())
+
+@app.delete("/api/episodic-memory/{session_id}/{episode_id}")
+async def delete_episode(session_id: str, episode_id: int):
+    return await live_action("情节记忆已删除", "memory.delete_episode", session_id=session_id, episode_id=episode_id)
 
 @app.put("/api/episodic-memory")
 async def update_episodic_memory(request: Request):
     data = await request.json()
     try:
-        session_id = data["session_id"]
-        memories = data["memories"] # 预期是对象列表 [{"summary": "...", "time": "..."}]
-        
-        # 情节记忆是追加型的，但在管理界面我们可能想替换。
-        # 这里为了简单，我们先实现追加，或者如果以后需要替换，可以重写整个文件。
-        # 考虑到需求是“编辑”，我们可能需要重写文件。
-        from bot_agent.config import EPISODIC_FILE
-        import json
-        
-        # 读取现有，替换特定 session 的，写回
-        all_memories = []
-        if os.path.exists(EPISODIC_FILE):
-            with open(EPISODIC_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item = json.loads(line)
-                        if item.get("user_id") != session_id:
-                            all_memories.append(item)
-        
-        for m in memories:
-            all_memories.append({
-                "user_id": session_id,
-                "summary": m["summary"],
-                "time": m.get("time")
-            })
-            
-        with open(EPISODIC_FILE, 'w', encoding='utf-8') as f:
-            for item in all_memories:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-                
+        # memories 为对象列表 [{"summary": "...", "time": "..."}]，替换该会话的全部情节记忆
+        await bot_call("memory.set_episodic", session_id=data["session_id"], memories=data["memories"])
         return JSONResponse(content={"success": True, "message": "情节记忆更新成功"})
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 # Prompt 管理 API
 @app.get("/api/prompts")
-async def get_prompts():
+def get_prompts():
     from bot_agent.memory.prompt import load_prompt_config
     return JSONResponse(content=load_prompt_config())
 
@@ -354,11 +467,20 @@ async def update_prompts(request: Request):
     from bot_agent.config import DATA_DIR
     import os
     PROMPT_FILE = os.path.join(DATA_DIR, "prompts.json")
-    try:
+
+    def save():
         with open(PROMPT_FILE, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         from bot_agent.memory.prompt import clear_prompt_cache
         clear_prompt_cache()
+
+    try:
+        await run_write(save)
+        try:
+            await bot_call("prompts.reload")
+        except BotUnavailable:
+            # 机器人未运行时，下次启动会读取新的提示词文件
+            pass
         return JSONResponse(content={"success": True, "message": "提示词配置更新成功"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
@@ -368,42 +490,32 @@ async def update_prompts(request: Request):
 async def update_active_persona_traits(request: Request):
     data = await request.json()
     try:
-        session_id = data["session_id"]
         traits = data["traits"]
         if isinstance(traits, str):
             import re
             traits = [t.strip() for t in re.split(r'[，。；,;.]', traits) if t.strip()]
-            
-        if ":" in session_id:
-            user_id, persona_name = session_id.split(":", 1)
-        else:
-            from bot_agent.config import DEFAULT_PERSONA_NAME
-            user_id, persona_name = session_id, DEFAULT_PERSONA_NAME
-            
-        from bot_agent.memory.persistence import save_persona_to_file
-        save_persona_to_file(user_id, persona_name, traits)
+        await bot_call("memory.set_traits", session_id=data["session_id"], traits=traits)
         return JSONResponse(content={"success": True, "message": "运行时特质更新成功"})
+    except BotUnavailable as e:
+        return JSONResponse(content={"success": False, "message": str(e)}, status_code=503)
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
 
 @app.post("/api/logs/clear")
 async def clear_logs(log_type: str = Form(...)):
     from bot_agent.monitor_query import clear_ai_logs, clear_ai_decisions, clear_config_changes
-    
+    clears = {
+        "ai_logs": [clear_ai_logs],
+        "ai_decisions": [clear_ai_decisions],
+        "config_changes": [clear_config_changes],
+        "all": [clear_ai_logs, clear_ai_decisions, clear_config_changes],
+    }
+    if log_type not in clears:
+        return JSONResponse(content={"success": False, "message": "无效的日志类型"}, status_code=400)
+
     try:
-        if log_type == "ai_logs":
-            clear_ai_logs()
-        elif log_type == "ai_decisions":
-            clear_ai_decisions()
-        elif log_type == "config_changes":
-            clear_config_changes()
-        elif log_type == "all":
-            clear_ai_logs()
-            clear_ai_decisions()
-            clear_config_changes()
-        else:
-            return JSONResponse(content={"success": False, "message": "无效的日志类型"}, status_code=400)
-        
+        for clear in clears[log_type]:
+            await run_write(clear)
         return JSONResponse(content={"success": True, "message": "日志已清除"})
     except Exception as e:
         return JSONResponse(content={"success": False, "message": str(e)}, status_code=500)
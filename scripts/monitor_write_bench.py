@@ -0,0 +1,100 @@
+"""
+===============================================================================
+TOOL SCRIPT: Monitor Write Benchmark
+DESCRIPTION: 对比监控日志逐条同步写入与后台批量写入 (MonitorWriter) 对调用方的阻塞时间
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/monitor_write_bench.py --messages 500
+
+DEPENDENCIES:
+    - sqlite3
+
+NOTES:
+    1. 在临时目录中建库，不影响 data/ai_monitor.db。
+    2. 每条"消息"模拟一次批处理中的监控写入：user_activity、两次 active_tasks 状态更新、
+       一条 ai_decisions、一条 ai_logs（约 8KB 请求体）、一条 llm_json_stats、最后移除 active_tasks。
+    3. "同步" 为旧实现：每次写入都打开连接、执行、提交、关闭；"后台" 为调用 monitor.py 中的函数，
+       计时只包含调用本身（即事件循环被阻塞的时间），最后单独统计 flush 耗时。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+
+def _payload(i: int) -> dict:
+    return {"contents": [{"role": "user", "parts": [{"text": f"第{i}条消息的提示词。" * 400}]}]}
+
+def _response(i: int) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": '{"action": "ignore", "reason": "bench"}'}]}}], "usageMetadata": {"promptTokenCount": 2000, "candidatesTokenCount": 20, "totalTokenCount": 2020}}
+
+def _sync_write(db_path: str, sql: str, params: tuple):
+    conn = sqlite3.connect(db_path)
+    conn.cursor().execute(sql, params)
+    conn.commit()
+    conn.close()
+
+def run_sync(db_path: str, messages: int) -> float:
+    from bot_agent.monitor import _USER_ACTIVITY_SQL
+    start = time.perf_counter()
+    for i in range(messages):
+        sid = f"group_{i % 20}"
+        _sync_write(db_path, _USER_ACTIVITY_SQL, (sid, str(10000 + i % 50), "群友", 1))
+        _sync_write(db_path, "INSERT OR REPLACE INTO active_tasks (session_id, status, message_count, last_update) VALUES (?, ?, ?, CURRENT_TIMESTAMP)", (sid, "正在进行准入决策...", 3))
+        _sync_write(db_path, "INSERT INTO ai_decisions (decision_type, session_id, decision_result, reason, prompt, duration) VALUES (?, ?, ?, ?, ?, ?)", ("entry", sid, json.dumps({"reply": False}), "bench", "prompt" * 200, 0.5))
+        _sync_write(db_path, "INSERT INTO ai_logs (request_payload, response_body, model, duration, call_type, session_id) VALUES (?, ?, ?, ?, ?, ?)", (json.dumps(_payload(i), ensure_ascii=False), json.dumps(_response(i), ensure_ascii=False), "bench", 0.5, "entry", sid))
+        _sync_write(db_path, "INSERT INTO llm_json_stats (call_type, session_id, structured, attempts, parse_failures, success, repaired) VALUES (?, ?, ?, ?, ?, ?, ?)", ("entry", sid, 0, 1, 0, 1, 0))
+        _sync_write(db_path, "INSERT OR REPLACE INTO active_tasks (session_id, status, message_count, last_update) VALUES (?, ?, ?, CURRENT_TIMESTAMP)", (sid, "正在决策如何回应...", 3))
+        _sync_write(db_path, "DELETE FROM active_tasks WHERE session_id = ?", (sid,))
+    return time.perf_counter() - start
+
+def run_write_behind(messages: int) -> tuple[float, float]:
+    from bot_agent import monitor
+    start = time.perf_counter()
+    for i in range(messages):
+        sid = f"group_{i % 20}"
+        monitor.record_user_activity(sid, str(10000 + i % 50), "群友")
+        monitor.update_active_task(sid, "正在进行准入决策...", 3)
+        monitor.log_ai_decision("entry", sid, {"reply": False}, "bench", "prompt" * 200, 0.5)
+        monitor.log_ai_interaction(_payload(i), _response(i), "bench", 0.5, call_type="entry", session_id=sid)
+        monitor.log_json_outcome("entry", sid, False, 1, 0, True)
+        monitor.update_active_task(sid, "正在决策如何回应...", 3)
+        monitor.remove_active_task(sid)
+    blocked = time.perf_counter() - start
+    start = time.perf_counter()
+    monitor.flush_monitor(timeout=60)
+    return blocked, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="监控日志写入方式对比")
+    parser.add_argument("--messages", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="monitor_bench_")
+    os.chdir(workdir)
+    from bot_agent import monitor
+    monitor.init_db()
+    db_path = os.path.join(workdir, monitor.DB_PATH)
+    monitor.monitor_writer.db_path = db_path
+
+    sync_total = run_sync(db_path, args.messages)
+    blocked, flush = run_write_behind(args.messages)
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM ai_logs").fetchone()[0]
+    conn.close()
+
+    n = args.messages
+    print(f"消息数: {n}，每条 7 次监控写入")
+    print(f"同步写入: 总计 {sync_total:.2f}s，每条消息阻塞 {sync_total / n * 1000:.2f}ms")
+    print(f"后台写入: 总计 {blocked:.2f}s，每条消息阻塞 {blocked / n * 1000:.3f}ms (flush 剩余积压 {flush:.2f}s)")
+    print(f"ai_logs 行数: {rows} (应为 {2 * n})，写入记录 {monitor.monitor_writer.written}，丢弃 {monitor.monitor_writer.dropped}")
+
+if __name__ == "__main__":
+    main()
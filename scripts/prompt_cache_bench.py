@@ -0,0 +1,83 @@
+"""
+===============================================================================
+TOOL SCRIPT: Prompt Cache Benchmark
+DESCRIPTION: 对比上下文缓存 (llm.context_cache) 开关前后每次回复的输入 token
+STATUS: EXPERIMENTAL
+--------------------------------------------------------------------------------
+USAGE:
+    ./.venv/bin/python scripts/mock_gemini_server.py --port 18080 --latency 0
+    ./.venv/bin/python scripts/prompt_cache_bench.py --port 18080 --turns 20
+
+DEPENDENCIES:
+    - httpx
+    - 本地替身服务 scripts/mock_gemini_server.py
+
+NOTES:
+    1. 使用合成的人格特质、印象与情节记忆模拟一个长期会话，每轮追加两条对话历史后请求一次回复。
+    2. 中途追加一条情节记忆，模拟前缀变化后的缓存重建。
+    3. token 数来自替身服务的 /stats (4 字符 ≈ 1 token)，"未缓存输入" 即按全价计费的部分。
+===============================================================================
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+
+def _build_memory(sid: str):
+    personas = {sid: [f"特质{i}: 说话简短、喜欢吐槽、对游戏话题很熟悉" for i in range(40)]}
+    impressions = {sid: [f"印象{i}: 经常深夜在线，喜欢聊原神和猫" for i in range(30)]}
+    episodic = {sid: [{"time": f"2026-01-{i % 28 + 1:02d} 20:00", "summary": f"第{i}次聊天：大家讨论了新版本的角色强度、抽卡运气和周末的开黑安排。"} for i in range(40)]}
+    return personas, impressions, episodic
+
+async def _run(turns: int, use_cache: bool, stats_url: str) -> dict:
+    import httpx
+    from bot_agent import config
+    from bot_agent.memory import prompt
+    from bot_agent.llm import get_json_response, get_http_client
+
+    sid = "bench:default"
+    personas, impressions, episodic = _build_memory(sid)
+    history = {sid: []}
+    config.LLM_CONTEXT_CACHE = use_cache
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{stats_url}/reset")
+        for turn in range(turns):
+            history[sid].append({"role": "user", "content": f"第{turn}轮：今天抽到了吗", "time": "2026-01-01 20:00", "nickname": "群友", "user_id": "10001"})
+            history[sid].append({"role": "assistant", "content": "没有 又歪了", "time": "2026-01-01 20:00"})
+            if turn == turns // 2:
+                episodic[sid].append({"time": "2026-02-01 20:00", "summary": "新的情节：群友分享了抽卡截图。"})
+            prefix, suffix = prompt.build_prompt_parts(sid, "<user>在吗</user>", history, episodic, personas, impressions, 100, "normal", {}, None, True)
+            await get_json_response(suffix, '{"thought": "string", "replies": ["string"]}', call_type="reply", session_id=sid, prompt_prefix=prefix, cache_key=sid)
+        stats = (await client.get(stats_url)).json()
+    await get_http_client().aclose()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="上下文缓存输入 token 对比")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+    base = f"http://{args.host}:{args.port}"
+    os.environ["GEMINI_URL"] = f"{base}/v1beta/models/gemini-3-flash:generateContent"
+
+    from bot_agent.monitor import init_db
+    init_db()
+    results = {}
+    for use_cache in (False, True):
+        results[use_cache] = asyncio.run(_run(args.turns, use_cache, f"{base}/stats"))
+
+    print(f"{'模式':<10}{'请求数':>8}{'输入/次':>10}{'缓存命中/次':>12}{'未缓存输入/次':>14}{'创建缓存':>10}")
+    for use_cache, s in results.items():
+        n = max(1, s["requests"])
+        print(f"{'缓存' if use_cache else '无缓存':<10}{s['requests']:>8}{s['prompt_tokens'] / n:>10.0f}{s['cached_tokens'] / n:>12.0f}{s['uncached_prompt_tokens'] / n:>14.0f}{s['caches_created']:>10}")
+    before = results[False]["uncached_prompt_tokens"]
+    after = results[True]["uncached_prompt_tokens"]
+    if before:
+        print(f"每次回复的未缓存输入 token 减少 {1 - after / before:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,62 @@
 /**
  * API 调用封装
  */
+// 拼接分页查询参数，忽略空值
+function pageQuery(limit, filters) {
+    const params = new URLSearchParams({ limit });
+    for (const [key, value] of Object.entries(filters)) {
+        if (value !== null && value !== undefined && value !== '') params.set(key, value);
+    }
+    return params.toString();
+}
+
+// 记忆状态接口读取机器人进程的实时数据，机器人未运行时返回 503：抛出带说明的错误
+async function liveJSON(response) {
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.message || `HTTP ${response.status}`);
+    return data;
+}
+
 const API = {
-    async getAILogs(limit = 50) {
-        const response = await fetch(`/api/ai-logs?limit=${limit}`);
+    // filters: cursor / session_id / call_type / model / min_duration / since / until，返回 {items, next_cursor}
+    async getAILogs(limit = 50, filters = {}) {
+        const response = await fetch(`/api/ai-logs?${pageQuery(limit, filters)}`);
+        return await response.json();
+    },
+    async getAILogDetail(id, images = false) {
+        const response = await fetch(`/api/ai-logs/${id}?images=${images}`);
+        return await response.json();
+    },
+    async getDecisionPrompt(id) {
+        const response = await fetch(`/api/ai-decisions/${id}/prompt`);
         return await response.json();
     },
-    async getAIDecisions(limit = 50) {
-        const response = await fetch(`/api/ai-decisions?limit=${limit}`);
+    // filters: cursor / session_id / decision_type / model / min_duration / since / until，返回 {items, next_cursor}
+    async getAIDecisions(limit = 50, filters = {}) {
+        const response = await fetch(`/api/ai-decisions?${pageQuery(limit, filters)}`);
+        return await response.json();
+    },
+    // filters: kinds / session_id / since / until，返回 {items}，按相关度排序
+    async search(q, limit = 50, filters = {}) {
+        const response = await fetch(`/api/search?${pageQuery(limit, { q, ...filters })}`);
         return await response.json();
     },
     async getActiveTasks() {
         const response = await fetch('/api/active-tasks');
         return await response.json();
     },
+    async getLLMEndpoints() {
+        const response = await fetch('/api/llm-endpoints');
+        return await response.json();
+    },
+    async getLLMRoutes(hours = 24) {
+        const response = await fetch(`/api/llm-routes?hours=${hours}`);
+        return await response.json();
+    },
+    async getMetrics() {
+        const response = await fetch('/api/metrics');
+        return await response.json();
+    },
     async getUserActivity(sessionId = null, limit = 20) {
         let url = `/api/user-activity?limit=${limit}`;
         if (sessionId) url += `&session_id=${sessionId}`;
@@ -54,7 +97,7 @@ const API = {
     },
     async getActivePersonas() {
         const response = await fetch('/api/active-personas');
-        return await response.json();
+        return await liveJSON(response);
     },
     async getInitialTraits() {
         const response = await fetch('/api/initial-traits');
@@ -62,7 +105,7 @@ const API = {
     },
     async getPersonas() {
         const response = await fetch('/api/personas');
-        return await response.json();
+        return await liveJSON(response);
     },
     async addBasePersona(name, description) {
         const response = await fetch('/api/base-personas', {
@@ -114,7 +157,7 @@ const API = {
     },
     async getImpressions() {
         const response = await fetch('/api/impressions');
-        return await response.json();
+        return await liveJSON(response);
     },
     async updateImpressions(sid, impressions) {
         const response = await fetch('/api/impressions', {
@@ -126,6 +169,37 @@ const API = {
     },
     async getChatHistory() {
         const response = await fetch('/api/chat-history');
+        return await liveJSON(response);
+    },
+    async getChatSessions() {
+        const response = await fetch('/api/chat-history/sessions');
+        return await liveJSON(response);
+    },
+    // 按下标分段读取一个会话：{ before, after, limit }，返回 { items, total, has_before, has_after }
+    async getChatWindow(sid, params = {}) {
+        const query = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined && v !== null));
+        const response = await fetch(`/api/chat-history/${encodeURIComponent(sid)}?${query}`);
+        return await liveJSON(response);
+    },
+    // 单条消息的增改删（按消息 id），只写一条日志记录
+    async addChatMessage(sid, message) {
+        const response = await fetch(`/api/chat-history/${encodeURIComponent(sid)}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(message)
+        });
+        return await response.json();
+    },
+    async patchChatMessage(sid, id, fields) {
+        const response = await fetch(`/api/chat-history/${encodeURIComponent(sid)}/${id}`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(fields)
+        });
+        return await response.json();
+    },
+    async deleteChatMessage(sid, id) {
+        const response = await fetch(`/api/chat-history/${encodeURIComponent(sid)}/${id}`, { method: 'DELETE' });
         return await response.json();
     },
     async updateChatHistory(sid, messages) {
@@ -138,6 +212,35 @@ const API = {
     },
     async getEpisodicMemory() {
         const response = await fetch('/api/episodic-memory');
+        return await liveJSON(response);
+    },
+    async getEpisodicSessions() {
+        const response = await fetch('/api/episodic-memory/sessions');
+        return await liveJSON(response);
+    },
+    async getEpisodicWindow(sid, params = {}) {
+        const query = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined && v !== null));
+        const response = await fetch(`/api/episodic-memory/${encodeURIComponent(sid)}?${query}`);
+        return await liveJSON(response);
+    },
+    async addEpisode(sid, episode) {
+        const response = await fetch(`/api/episodic-memory/${encodeURIComponent(sid)}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(episode)
+        });
+        return await response.json();
+    },
+    async patchEpisode(sid, id, fields) {
+        const response = await fetch(`/api/episodic-memory/${encodeURIComponent(sid)}/${id}`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(fields)
+        });
+        return await response.json();
+    },
+    async deleteEpisode(sid, id) {
+        const response = await fetch(`/api/episodic-memory/${encodeURIComponent(sid)}/${id}`, { method: 'DELETE' });
         return await response.json();
     },
     async updateEpisodicMemory(sid, memories) {
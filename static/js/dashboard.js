@@ -79,14 +79,46 @@ function renderRecentConfigChanges(changes) {
     `).join('');
 }
 
-// 加载活跃任务
-async function loadActiveTasks() {
+// 实时事件（SSE）：活跃任务与最近的调用 / 决策由机器人进程推送，不再轮询
+let liveTasks = {};
+let liveConnected = true;
+let recentAILogs = [];
+let recentAIDecisions = [];
+const RECENT_LIMIT = 5;
+
+function connectLiveEvents() {
+    const source = new EventSource('/api/events');
+    source.addEventListener('snapshot', e => {
+        const data = JSON.parse(e.data);
+        liveConnected = data.connected;
+        liveTasks = Object.fromEntries(data.active_tasks.map(t => [t.session_id, t]));
+        renderActiveTasks();
+    });
+    source.addEventListener('task', e => {
+        const data = JSON.parse(e.data);
+        if (data.task) liveTasks[data.session_id] = data.task;
+        else delete liveTasks[data.session_id];
+        renderActiveTasks();
+    });
+    source.addEventListener('ai_log', e => {
+        recentAILogs = [JSON.parse(e.data), ...recentAILogs].slice(0, RECENT_LIMIT);
+        renderRecentAILogs(recentAILogs);
+    });
+    source.addEventListener('ai_decision', e => {
+        recentAIDecisions = [JSON.parse(e.data), ...recentAIDecisions].slice(0, RECENT_LIMIT);
+        renderRecentAIDecisions(recentAIDecisions);
+    });
+    // 连接断开时 EventSource 会自动重连，重连后先收到新的 snapshot
+}
+
+// 渲染活跃任务（按最近更新时间倒序）
+function renderActiveTasks() {
     try {
-        const tasks = await API.getActiveTasks();
+        const tasks = Object.values(liveTasks).sort((a, b) => b.updated_at - a.updated_at);
         const container = document.getElementById('active-tasks-container');
         const countBadge = document.getElementById('active-tasks-count');
         
-        if (countBadge) countBadge.textContent = `活跃: ${tasks.length}`;
+        if (countBadge) countBadge.textContent = liveConnected ? `活跃: ${tasks.length}` : '机器人未连接';
         if (!container) return;
         
         if (tasks.length === 0) {
@@ -139,17 +171,126 @@ async function loadActiveTasks() {
             `;
         }).join('');
     } catch (error) {
-        console.error('Failed to load active tasks:', error);
+        console.error('Failed to render active tasks:', error);
+    }
+}
+
+// 加载 LLM 端点状态
+async function loadLLMEndpoints() {
+    try {
+        const endpoints = await API.getLLMEndpoints();
+        const container = document.getElementById('llm-endpoints-container');
+        if (!container) return;
+
+        if (endpoints.length === 0) {
+            container.innerHTML = '<div class="col-span-full py-4 text-center text-gray-400">暂无端点数据</div>';
+            return;
+        }
+
+        const stateStyles = {
+            closed: { color: 'green', text: '正常' },
+            half_open: { color: 'yellow', text: '半开 (探测中)' },
+            open: { color: 'red', text: '熔断' }
+        };
+        const fmt = (v) => v === null || v === undefined ? '-' : `${v.toFixed(2)}s`;
+
+        container.innerHTML = endpoints.map(ep => {
+            const style = stateStyles[ep.state] || { color: 'gray', text: ep.state };
+            return `
+                <div class="bg-white p-5 rounded-xl shadow-md border-l-4 border-${style.color}-500">
+                    <div class="flex items-center justify-between">
+                        <p class="text-sm font-bold text-gray-800 truncate" title="${ep.url}">${ep.url}</p>
+                        <span class="text-[10px] bg-${style.color}-100 text-${style.color}-600 px-1.5 py-0.5 rounded font-bold ml-2 flex-shrink-0">${style.text}</span>
+                    </div>
+                    <div class="grid grid-cols-2 gap-1 mt-2 text-xs text-gray-600">
+                        <span>EWMA: ${fmt(ep.ewma_latency)}</span>
+                        <span>P95: ${fmt(ep.p95_latency)}</span>
+                        <span>请求: ${ep.total_requests}</span>
+                        <span>失败: ${ep.total_failures} (连续 ${ep.consecutive_failures})</span>
+                    </div>
+                    <div class="text-[10px] text-gray-400 mt-2 text-right">${ep.last_update}</div>
+                </div>
+            `;
+        }).join('');
+    } catch (error) {
+        console.error('Failed to load LLM endpoints:', error);
+    }
+}
+
+async function loadLLMRoutes() {
+    try {
+        const data = await API.getLLMRoutes(24);
+        const tbody = document.getElementById('llm-routes-body');
+        if (!tbody) return;
+
+        if (data.stats.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="6" class="px-4 py-4 text-center text-gray-400">暂无调用数据</td></tr>';
+            return;
+        }
+
+        const fmt = (v) => v === null || v === undefined ? '-' : `${v.toFixed(2)}s`;
+        tbody.innerHTML = data.stats.map(row => {
+            const route = data.routes[row.call_type];
+            const budget = route && route.thinking_budget !== null ? `思考预算 ${route.thinking_budget}` : '';
+            return `
+                <tr class="border-b text-sm text-gray-700">
+                    <td class="px-4 py-2 font-medium">${row.call_type || 'unknown'}</td>
+                    <td class="px-4 py-2">${row.model || '-'} <span class="text-[10px] text-gray-400">${budget}</span></td>
+                    <td class="px-4 py-2">${row.calls}</td>
+                    <td class="px-4 py-2">${fmt(row.p50_duration)} / ${fmt(row.p95_duration)}</td>
+                    <td class="px-4 py-2">${fmt(row.avg_queue_wait)}</td>
+                    <td class="px-4 py-2">${row.prompt_tokens} / ${row.candidate_tokens} / ${row.thought_tokens}</td>
+                </tr>
+            `;
+        }).join('');
+    } catch (error) {
+        console.error('Failed to load LLM routes:', error);
+    }
+}
+
+// 加载延迟指标（直方图显示分位数，计数器 / 仪表显示当前值）
+async function loadMetrics() {
+    try {
+        const data = await API.getMetrics();
+        const tbody = document.getElementById('metrics-body');
+        if (!tbody) return;
+        const windowLabel = document.getElementById('metrics-window');
+        if (windowLabel) windowLabel.textContent = `本次启动以来 / 最近 ${Math.round(data.window / 60)} 分钟 · Prometheus: /metrics`;
+
+        if (data.metrics.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="6" class="px-4 py-4 text-center text-gray-400">暂无指标数据</td></tr>';
+            return;
+        }
+
+        const fmt = (v) => v === null || v === undefined ? '-' : (v < 1 ? `${(v * 1000).toFixed(0)}ms` : `${v.toFixed(2)}s`);
+        const labels = (l) => Object.entries(l).map(([k, v]) => `${k}=${v}`).join(' ');
+        tbody.innerHTML = data.metrics.map(m => {
+            const isHistogram = m.kind === 'histogram';
+            return `
+                <tr class="border-b text-sm text-gray-700" title="${m.help || ''}">
+                    <td class="px-4 py-2 font-medium">${m.name}</td>
+                    <td class="px-4 py-2 text-xs text-gray-500">${labels(m.labels) || '-'}</td>
+                    <td class="px-4 py-2">${isHistogram ? m.count : m.value}</td>
+                    <td class="px-4 py-2">${isHistogram ? `${fmt(m.p50)} / ${fmt(m.p95)} / ${fmt(m.p99)}` : '-'}</td>
+                    <td class="px-4 py-2">${isHistogram ? `${fmt(m.recent_p50)} / ${fmt(m.recent_p95)} / ${fmt(m.recent_p99)} <span class="text-[10px] text-gray-400">(${m.recent_count})</span>` : '-'}</td>
+                    <td class="px-4 py-2">${isHistogram ? fmt(m.max) : '-'}</td>
+                </tr>
+            `;
+        }).join('');
+    } catch (error) {
+        console.error('Failed to load metrics:', error);
     }
 }
 
 // 仪表盘数据加载
 async function loadDashboardData() {
     try {
-        await loadActiveTasks();
+        await loadLLMEndpoints();
+        await loadLLMRoutes();
+        await loadMetrics();
 
-        const logs = await API.getAILogs(5);
-        const decisions = await API.getAIDecisions(5);
+        const logs = (await API.getAILogs(RECENT_LIMIT)).items;
+        const decisions = (await API.getAIDecisions(RECENT_LIMIT)).items;
         const configChanges = await API.getConfigChanges(5);
         const activity = await API.getUserActivity(null, 5);
         
@@ -157,8 +298,9 @@ async function loadDashboardData() {
         document.getElementById('ai-decisions-count').textContent = decisions.length >= 50 ? '50+' : decisions.length;
         document.getElementById('config-changes-count').textContent = configChanges.length >= 50 ? '50+' : configChanges.length;
         
-        renderRecentAILogs(logs);
-        renderRecentAIDecisions(decisions);
+        [recentAILogs, recentAIDecisions] = [logs, decisions];
+        renderRecentAILogs(recentAILogs);
+        renderRecentAIDecisions(recentAIDecisions);
         renderUserActivity(activity);
         renderRecentConfigChanges(configChanges);
     } catch (error) {
@@ -4,11 +4,23 @@
 
 let allAILogs = [];
 let allAIDecisions = [];
+// 游标分页：下一页的 cursor，为 null 时没有更多
+let aiLogsCursor = null;
+let aiDecisionsCursor = null;
 
-// 加载 AI 交互记录
-async function loadAILogs() {
+// 切换“加载更多”按钮
+function toggleLoadMore(id, cursor) {
+    const btn = document.getElementById(id);
+    if (btn) btn.classList.toggle('hidden', cursor === null);
+}
+
+// 加载 AI 交互记录（append 为 true 时加载下一页）
+async function loadAILogs(append = false) {
     try {
-        allAILogs = await API.getAILogs();
+        const page = await API.getAILogs(50, { cursor: append ? aiLogsCursor : null });
+        allAILogs = append ? allAILogs.concat(page.items) : page.items;
+        aiLogsCursor = page.next_cursor;
+        toggleLoadMore('ai-logs-more', aiLogsCursor);
         const tbody = document.getElementById('ai-logs-body');
         if (!tbody) return;
         
@@ -35,9 +47,15 @@ async function loadAILogs() {
 }
 
 // 加载 AI 决策记录
-async function loadAIDecisions() {
+async function loadAIDecisions(append = false) {
     try {
-        allAIDecisions = await API.getAIDecisions();
+        // 类型过滤按钮（全部 / 准入 / 微观 / 宏观）
+        const active = document.querySelector('#ai-decisions .filter-btn.active');
+        const decisionType = active && active.dataset.filter !== 'all' ? active.dataset.filter : null;
+        const page = await API.getAIDecisions(50, { cursor: append ? aiDecisionsCursor : null, decision_type: decisionType });
+        allAIDecisions = append ? allAIDecisions.concat(page.items) : page.items;
+        aiDecisionsCursor = page.next_cursor;
+        toggleLoadMore('ai-decisions-more', aiDecisionsCursor);
         const tbody = document.getElementById('ai-decisions-body');
         if (!tbody) return;
         
@@ -91,13 +109,21 @@ async function loadConfigChanges() {
     }
 }
 
-// 显示 AI 日志详情
-function showAILogDetail(index, type) {
+// 显示 AI 日志详情（列表只含轻量列，请求体 / 响应体按需从后端读取并还原）
+async function showAILogDetail(index, type) {
     const log = allAILogs[index];
     if (!log) return;
     const title = type === 'request' ? '请求详情' : '响应详情';
-    const content = type === 'request' ? log.request_payload : log.response_body;
-    showDetail(title, content);
+    let detail = log;
+    if ((type === 'request' && log.request_payload == null) || (type === 'response' && log.response_body == null)) {
+        try {
+            detail = await API.getAILogDetail(log.id);
+        } catch (error) {
+            console.error('Failed to load AI log detail:', error);
+        }
+    }
+    const content = type === 'request' ? detail.request_payload : detail.response_body;
+    showDetail(title, content ?? (log.payload_skipped ? '(负载较高，本次请求体未采样)' : '(无内容)'));
 }
 
 // 显示 AI 决策详情
@@ -40,6 +40,7 @@ document.addEventListener('DOMContentLoaded', () => {
             document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
             btn.classList.add('active');
             // 具体的过滤逻辑可以在各自的 JS 中根据 active 按钮状态来处理
+            if (btn.closest('#ai-decisions')) loadAIDecisions();
         });
     });
 
@@ -49,11 +50,14 @@ document.addEventListener('DOMContentLoaded', () => {
     // 初始化页面数据
     loadDashboardData();
 
-    // 每 3 秒自动刷新仪表盘
+    // 活跃任务与最近调用 / 决策通过 SSE 实时推送
+    connectLiveEvents();
+
+    // 其余统计面板每 30 秒刷新
     setInterval(() => {
         const activeSection = document.querySelector('.content-section.active');
         if (activeSection && activeSection.id === 'dashboard') {
             loadDashboardData();
         }
-    }, 3000);
+    }, 30000);
 });
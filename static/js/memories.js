@@ -3,19 +3,27 @@
  */
 
 let currentImpressionsSid = '';
+// 未驻留内存的会话只有 ID，打开时由机器人从存储加载
+const DORMANT_HINT = '<div class="text-xs text-gray-400 italic">未加载 · 打开时从存储读取</div>';
 
 // 加载记忆数据
 async function loadMemories() {
     try {
         const impressionsData = await API.getImpressions();
-        const chatHistoryData = await API.getChatHistory();
-        const episodicMemoryData = await API.getEpisodicMemory();
+        // 聊天历史与情节记忆只加载会话列表，记录在打开会话时分段读取
+        const chatSessions = await API.getChatSessions();
+        const episodicSessions = await API.getEpisodicSessions();
         
         renderImpressions(impressionsData);
-        renderChatHistory(chatHistoryData);
-        renderEpisodicMemory(episodicMemoryData);
+        renderChatHistory(chatSessions);
+        renderEpisodicMemory(episodicSessions);
     } catch (error) {
         console.error('Failed to load memories:', error);
+        // 机器人未运行时记忆数据不可用
+        for (const id of ['impressions', 'chat-history', 'episodic-memory']) {
+            const container = document.getElementById(id);
+            if (container) container.innerHTML = `<div class="text-center py-8 text-gray-400 italic">${htmlEscape(error.message)}</div>`;
+        }
     }
 }
 
@@ -35,36 +43,36 @@ function renderImpressions(data) {
     `).join('') : '<div class="text-center py-8 text-gray-400 italic">暂无印象记录</div>';
 }
 
-function renderChatHistory(data) {
+function renderChatHistory(sessions) {
     const container = document.getElementById('chat-history');
     if (!container) return;
-    container.innerHTML = Object.entries(data).length > 0 ? Object.entries(data).map(([sid, messages]) => `
-        <div class="bg-white p-4 rounded-lg shadow-sm border border-gray-200 cursor-pointer hover:bg-gray-50 transition-colors group" onclick="editChatHistory('${sid}')">
+    container.innerHTML = sessions.length > 0 ? sessions.map(s => `
+        <div class="bg-white p-4 rounded-lg shadow-sm border border-gray-200 cursor-pointer hover:bg-gray-50 transition-colors group" onclick="editChatHistory('${s.session_id}')">
             <div class="flex justify-between items-start mb-2">
-                <div class="font-medium text-gray-800 truncate flex-1 mr-2">${sid}</div>
+                <div class="font-medium text-gray-800 truncate flex-1 mr-2">${s.session_id}</div>
                 <button class="text-blue-500 opacity-0 group-hover:opacity-100 transition-opacity">
                     <i class="fas fa-edit"></i>
                 </button>
             </div>
-            <div class="text-xs text-gray-500">消息总数: <span class="font-bold text-blue-600">${messages.length}</span></div>
-            ${messages.length > 0 ? `<div class="mt-2 text-[10px] text-gray-400 truncate">${htmlEscape(messages[messages.length-1].content)}</div>` : ''}
+            ${s.resident ? `<div class="text-xs text-gray-500">消息总数: <span class="font-bold text-blue-600">${s.count}</span> · ${s.chars} 字</div>` : DORMANT_HINT}
+            ${s.count > 0 ? `<div class="mt-2 text-[10px] text-gray-400 truncate">${htmlEscape(s.last_preview)}</div>` : ''}
         </div>
     `).join('') : '<div class="text-center py-8 text-gray-400 italic">暂无历史记录</div>';
 }
 
-function renderEpisodicMemory(data) {
+function renderEpisodicMemory(sessions) {
     const container = document.getElementById('episodic-memory');
     if (!container) return;
-    container.innerHTML = Object.entries(data).length > 0 ? Object.entries(data).map(([sid, memories]) => `
-        <div class="bg-white p-4 rounded-lg shadow-sm border border-gray-200 cursor-pointer hover:bg-gray-50 transition-colors group" onclick="editEpisodic('${sid}')">
+    container.innerHTML = sessions.length > 0 ? sessions.map(s => `
+        <div class="bg-white p-4 rounded-lg shadow-sm border border-gray-200 cursor-pointer hover:bg-gray-50 transition-colors group" onclick="editEpisodic('${s.session_id}')">
             <div class="flex justify-between items-start mb-2">
-                <div class="font-medium text-gray-800 truncate flex-1 mr-2">${sid}</div>
+                <div class="font-medium text-gray-800 truncate flex-1 mr-2">${s.session_id}</div>
                 <button class="text-purple-500 opacity-0 group-hover:opacity-100 transition-opacity">
                     <i class="fas fa-history"></i>
                 </button>
             </div>
-            <div class="text-xs text-gray-500">情节片段: <span class="font-bold text-purple-600">${memories.length}</span></div>
-            ${memories.length > 0 ? `<div class="mt-2 text-[10px] text-gray-400 italic truncate">${htmlEscape(memories[memories.length-1].summary)}</div>` : ''}
+            ${s.resident ? `<div class="text-xs text-gray-500">情节片段: <span class="font-bold text-purple-600">${s.count}</span> · ${s.chars} 字</div>` : DORMANT_HINT}
+            ${s.count > 0 ? `<div class="mt-2 text-[10px] text-gray-400 italic truncate">${htmlEscape(s.last_preview)}</div>` : ''}
         </div>
     `).join('') : '<div class="text-center py-8 text-gray-400 italic">暂无记忆记录</div>';
 }
@@ -3,24 +3,69 @@
  */
 
 let currentChatHistorySid = '';
+// 已加载的最早一条消息的下标；大于 0 表示更早的消息尚未加载
+let chatHistoryStart = 0;
+const CHAT_PAGE_SIZE = 50;
+// 已加载消息的原始内容（按 id）与界面上删除的消息 id；保存时只提交有变化的消息
+let chatOriginals = new Map();
+let chatDeleted = new Set();
 
 async function editChatHistory(sid) {
     currentChatHistorySid = sid;
     document.getElementById('chat-history-sid').textContent = sid;
-    const chatData = await API.getChatHistory();
-    const messages = chatData[sid] || [];
     const container = document.getElementById('chat-history-items');
     container.innerHTML = '';
-    messages.forEach((msg, index) => addChatMessageUI(msg.role, msg.content, msg.time, index, msg.nickname, msg.user_id));
-    if (messages.length === 0) container.innerHTML = '<div class="text-center py-8 text-gray-400 italic">暂无历史记录</div>';
+    chatOriginals = new Map();
+    chatDeleted = new Set();
+    try {
+        // 先只加载最新的一页，更早的消息按需加载
+        const page = await API.getChatWindow(sid, { limit: CHAT_PAGE_SIZE });
+        page.items.forEach(msg => addChatMessageUI(msg.role, msg.content, msg.time, msg.id, msg.nickname, msg.user_id));
+        chatHistoryStart = page.items.length > 0 ? page.items[0].index : 0;
+        if (page.items.length === 0) container.innerHTML = '<div class="text-center py-8 text-gray-400 italic">暂无历史记录</div>';
+        updateChatLoadEarlier();
+    } catch (error) {
+        container.innerHTML = `<div class="text-center py-8 text-gray-400 italic">${htmlEscape(error.message)}</div>`;
+    }
     document.getElementById('manage-chat-history-modal').classList.remove('hidden');
 }
 
-function addChatMessageUI(role, content, time, index, nickname, sender_id) {
+function updateChatLoadEarlier() {
+    const container = document.getElementById('chat-history-items');
+    let button = document.getElementById('chat-load-earlier');
+    if (chatHistoryStart <= 0) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'chat-load-earlier';
+        button.className = 'w-full py-2 text-sm text-blue-600 bg-white border border-dashed border-blue-200 rounded-lg hover:bg-blue-50';
+        button.onclick = loadEarlierChatMessages;
+        container.prepend(button);
+    }
+    button.innerHTML = `<i class="fas fa-angle-double-up mr-2"></i>加载更早的消息（还有 ${chatHistoryStart} 条）`;
+}
+
+async function loadEarlierChatMessages() {
+    const page = await API.getChatWindow(currentChatHistorySid, { before: chatHistoryStart, limit: CHAT_PAGE_SIZE });
+    const container = document.getElementById('chat-history-items');
+    const first = container.querySelector('.chat-message-item');
+    page.items.forEach(msg => addChatMessageUI(msg.role, msg.content, msg.time, msg.id, msg.nickname, msg.user_id, first));
+    chatHistoryStart = page.items.length > 0 ? page.items[0].index : 0;
+    updateChatLoadEarlier();
+}
+
+function addChatMessageUI(role, content, time, id, nickname, sender_id, insertBefore = null) {
     const container = document.getElementById('chat-history-items');
     if (container.querySelector('.italic')) container.innerHTML = '';
     const item = document.createElement('div');
     item.className = 'bg-white p-5 rounded-xl shadow-sm border border-gray-200 chat-message-item transition-all hover:shadow-md';
+    // 新添加的消息没有 id
+    if (id) {
+        item.dataset.id = id;
+        chatOriginals.set(String(id), { role, content: content || '', time: time || '', nickname: nickname || '', user_id: sender_id || '' });
+    }
     item.innerHTML = `
         <div class="grid grid-cols-12 gap-4">
             <div class="col-span-3 space-y-3 border-r pr-4">
@@ -50,25 +95,31 @@ function addChatMessageUI(role, content, time, index, nickname, sender_id) {
                     <label class="block text-[10px] font-bold text-gray-400 uppercase mb-1">发送时间</label>
                     <input type="text" class="time-input w-full p-1 border rounded text-[10px] text-gray-500" value="${time || ''}">
                 </div>
-                <button class="w-full mt-4 py-2 px-3 bg-red-50 text-red-500 hover:bg-red-500 hover:text-white rounded-lg transition-all flex items-center justify-center group" onclick="this.closest('.chat-message-item').remove()">
+                <button class="w-full mt-4 py-2 px-3 bg-red-50 text-red-500 hover:bg-red-500 hover:text-white rounded-lg transition-all flex items-center justify-center group" onclick="removeChatMessageUI(this)">
                     <i class="fas fa-trash-alt mr-2"></i>
                     <span class="text-xs font-bold">删除该条</span>
                 </button>
             </div>
         </div>
     `;
-    container.appendChild(item);
+    container.insertBefore(item, insertBefore);
+}
+
+function removeChatMessageUI(button) {
+    const item = button.closest('.chat-message-item');
+    if (item.dataset.id) chatDeleted.add(item.dataset.id);
+    item.remove();
 }
 
 function addChatMessage() {
-    addChatMessageUI('user', '', new Date().toLocaleString(), Date.now());
+    addChatMessageUI('user', '', new Date().toLocaleString(), null);
     const container = document.getElementById('chat-history-items');
     container.scrollTop = container.scrollHeight;
 }
 
 async function saveChatHistory() {
     const items = document.querySelectorAll('.chat-message-item');
-    const messages = [];
+    const added = [], patched = [];
     items.forEach(item => {
         let role = item.querySelector('.role-select').value;
         const select = item.querySelector('.role-select');
@@ -77,21 +128,33 @@ async function saveChatHistory() {
             const match = selectedOptionText.match(/\((.*)\)/);
             if (match) role = match[1];
         }
-        messages.push({
+        const message = {
             role: role,
             content: item.querySelector('.content-textarea').value,
             time: item.querySelector('.time-input').value,
             nickname: item.querySelector('.nickname-input').value,
             user_id: item.querySelector('.sender-id-input').value
-        });
+        };
+        if (!item.dataset.id) {
+            added.push(message);
+            return;
+        }
+        const original = chatOriginals.get(item.dataset.id);
+        const fields = Object.fromEntries(Object.entries(message).filter(([k, v]) => original[k] !== v));
+        if (Object.keys(fields).length > 0) patched.push([item.dataset.id, fields]);
     });
+    // 逐条提交修改、删除与新增的消息，未改动的消息不提交
     try {
-        const result = await API.updateChatHistory(currentChatHistorySid, messages);
-        if (result.success) {
+        const results = [];
+        for (const [id, fields] of patched) results.push(await API.patchChatMessage(currentChatHistorySid, id, fields));
+        for (const id of chatDeleted) results.push(await API.deleteChatMessage(currentChatHistorySid, id));
+        for (const message of added) results.push(await API.addChatMessage(currentChatHistorySid, message));
+        const failed = results.find(result => !result.success);
+        if (!failed) {
             alert('聊天历史已更新');
             closeManageChatHistoryModal();
             loadMemories();
-        } else alert('保存失败: ' + result.message);
+        } else alert('保存失败: ' + failed.message);
     } catch (error) { console.error('Failed to save chat history:', error); }
 }
 
@@ -3,24 +3,67 @@
  */
 
 let currentEpisodicSid = '';
+// 已加载的最早一条记忆的下标；大于 0 表示更早的记忆尚未加载
+let episodicStart = 0;
+const EPISODIC_PAGE_SIZE = 50;
+// 已加载记忆的原始内容（按 id）与界面上删除的记忆 id；保存时只提交有变化的记忆
+let episodicOriginals = new Map();
+let episodicDeleted = new Set();
 
 async function editEpisodic(sid) {
     currentEpisodicSid = sid;
     document.getElementById('episodic-sid').textContent = sid;
-    const episodicData = await API.getEpisodicMemory();
-    const memories = episodicData[sid] || [];
     const container = document.getElementById('episodic-items');
     container.innerHTML = '';
-    memories.forEach((mem, index) => addEpisodicUI(mem.summary, mem.time, index));
-    if (memories.length === 0) container.innerHTML = '<div class="text-center py-8 text-gray-400 italic">暂无记忆记录</div>';
+    episodicOriginals = new Map();
+    episodicDeleted = new Set();
+    try {
+        const page = await API.getEpisodicWindow(sid, { limit: EPISODIC_PAGE_SIZE });
+        page.items.forEach(mem => addEpisodicUI(mem.summary, mem.time, mem.id));
+        episodicStart = page.items.length > 0 ? page.items[0].index : 0;
+        if (page.items.length === 0) container.innerHTML = '<div class="text-center py-8 text-gray-400 italic">暂无记忆记录</div>';
+        updateEpisodicLoadEarlier();
+    } catch (error) {
+        container.innerHTML = `<div class="text-center py-8 text-gray-400 italic">${htmlEscape(error.message)}</div>`;
+    }
     document.getElementById('manage-episodic-modal').classList.remove('hidden');
 }
 
-function addEpisodicUI(summary, time, index) {
+function updateEpisodicLoadEarlier() {
+    const container = document.getElementById('episodic-items');
+    let button = document.getElementById('episodic-load-earlier');
+    if (episodicStart <= 0) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'episodic-load-earlier';
+        button.className = 'w-full mb-4 py-2 text-sm text-purple-600 bg-white border border-dashed border-purple-200 rounded-lg hover:bg-purple-50';
+        button.onclick = loadEarlierEpisodic;
+        container.prepend(button);
+    }
+    button.innerHTML = `<i class="fas fa-angle-double-up mr-2"></i>加载更早的记忆（还有 ${episodicStart} 条）`;
+}
+
+async function loadEarlierEpisodic() {
+    const page = await API.getEpisodicWindow(currentEpisodicSid, { before: episodicStart, limit: EPISODIC_PAGE_SIZE });
+    const container = document.getElementById('episodic-items');
+    const first = container.querySelector('.episodic-item');
+    page.items.forEach(mem => addEpisodicUI(mem.summary, mem.time, mem.id, first));
+    episodicStart = page.items.length > 0 ? page.items[0].index : 0;
+    updateEpisodicLoadEarlier();
+}
+
+function addEpisodicUI(summary, time, id, insertBefore = null) {
     const container = document.getElementById('episodic-items');
     if (container.querySelector('.italic')) container.innerHTML = '';
     const item = document.createElement('div');
     item.className = 'relative pl-8 pb-8 episodic-item group';
+    if (id) {
+        item.dataset.id = id;
+        episodicOriginals.set(String(id), { summary: summary || '', time: time || '' });
+    }
     item.innerHTML = `
         <div class="absolute left-3 top-0 bottom-0 w-0.5 bg-purple-200 group-last:bg-transparent"></div>
         <div class="absolute left-0 top-1 w-6.5 h-6.5 rounded-full bg-white border-2 border-purple-500 flex items-center justify-center z-10">
@@ -41,7 +84,7 @@ function addEpisodicUI(summary, time, index) {
                         </div>
                     </div>
                     <div class="flex items-center justify-end space-x-2 mt-4">
-                        <button class="text-xs px-3 py-1.5 text-red-500 hover:bg-red-50 rounded-md transition-colors flex items-center" onclick="this.closest('.episodic-item').remove()">
+                        <button class="text-xs px-3 py-1.5 text-red-500 hover:bg-red-50 rounded-md transition-colors flex items-center" onclick="removeEpisodicUI(this)">
                             <i class="fas fa-trash-alt mr-1.5"></i>删除
                         </button>
                     </div>
@@ -49,31 +92,48 @@ function addEpisodicUI(summary, time, index) {
             </div>
         </div>
     `;
-    container.appendChild(item);
+    container.insertBefore(item, insertBefore);
+}
+
+function removeEpisodicUI(button) {
+    const item = button.closest('.episodic-item');
+    if (item.dataset.id) episodicDeleted.add(item.dataset.id);
+    item.remove();
 }
 
 function addEpisodicItem() {
-    addEpisodicUI('', new Date().toLocaleString(), Date.now());
+    addEpisodicUI('', new Date().toLocaleString(), null);
     const container = document.getElementById('episodic-items');
     container.scrollTop = container.scrollHeight;
 }
 
 async function saveEpisodicHistory() {
     const items = document.querySelectorAll('.episodic-item');
-    const memories = [];
+    const added = [], patched = [];
     items.forEach(item => {
-        memories.push({
+        const episode = {
             summary: item.querySelector('.summary-textarea').value,
             time: item.querySelector('.time-input').value
-        });
+        };
+        if (!item.dataset.id) {
+            added.push(episode);
+            return;
+        }
+        const original = episodicOriginals.get(item.dataset.id);
+        const fields = Object.fromEntries(Object.entries(episode).filter(([k, v]) => original[k] !== v));
+        if (Object.keys(fields).length > 0) patched.push([item.dataset.id, fields]);
     });
     try {
-        const result = await API.updateEpisodicMemory(currentEpisodicSid, memories);
-        if (result.success) {
+        const results = [];
+        for (const [id, fields] of patched) results.push(await API.patchEpisode(currentEpisodicSid, id, fields));
+        for (const id of episodicDeleted) results.push(await API.deleteEpisode(currentEpisodicSid, id));
+        for (const episode of added) results.push(await API.addEpisode(currentEpisodicSid, episode));
+        const failed = results.find(result => !result.success);
+        if (!failed) {
             alert('情节记忆已更新');
             closeManageEpisodicModal();
             loadMemories();
-        } else alert('保存失败: ' + result.message);
+        } else alert('保存失败: ' + failed.message);
     } catch (error) { console.error('Failed to save episodic history:', error); }
 }
 
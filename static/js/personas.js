@@ -8,9 +8,12 @@ let currentInitialTraits = {};
 async function loadPersonas() {
     try {
         currentBasePersonas = await API.getBasePersonas();
-        const activePersonasData = await API.getActivePersonas();
         currentInitialTraits = await API.getInitialTraits();
-        const runtimePersonas = await API.getPersonas();
+        // 运行时人格来自机器人进程，机器人未运行时只显示配置中的人格
+        const [activePersonasData, runtimePersonas] = await Promise.all([API.getActivePersonas(), API.getPersonas()]).catch(error => {
+            console.error('Failed to load runtime personas:', error);
+            return [{}, {}];
+        });
         
         renderBasePersonas();
         renderActivePersonas(activePersonasData, runtimePersonas);
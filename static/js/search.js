@@ -0,0 +1,68 @@
+/**
+ * 全文搜索逻辑
+ */
+
+let searchResults = [];
+
+const SEARCH_KIND_TEXT = { ai_log: 'AI 交互', decision: '决策', chat: '聊天记录' };
+
+// datetime-local 输入（浏览器本地时间）转为接口使用的 UTC 时间
+function toUTCString(value) {
+    return value ? new Date(value).toISOString().slice(0, 19).replace('T', ' ') : null;
+}
+
+async function runSearch() {
+    const q = document.getElementById('search-query').value.trim();
+    const status = document.getElementById('search-status');
+    const tbody = document.getElementById('search-body');
+    if (!q || !tbody) return;
+    status.textContent = '搜索中...';
+    try {
+        const started = performance.now();
+        const result = await API.search(q, 50, {
+            kinds: document.getElementById('search-kind').value,
+            session_id: document.getElementById('search-session').value.trim(),
+            since: toUTCString(document.getElementById('search-since').value),
+            until: toUTCString(document.getElementById('search-until').value)
+        });
+        searchResults = result.items;
+        status.textContent = result.error ? `搜索失败: ${result.error}` : `共 ${searchResults.length} 条结果，耗时 ${Math.round(performance.now() - started)}ms`;
+        // snippet 已由后端转义，命中部分包在 <mark> 中
+        tbody.innerHTML = searchResults.map((item, index) => `
+            <tr class="border-b hover:bg-gray-50 transition-colors">
+                <td class="px-6 py-4 text-sm text-gray-600 whitespace-nowrap">${item.timestamp ?? ''}</td>
+                <td class="px-6 py-4 text-sm text-green-600 font-medium whitespace-nowrap">${SEARCH_KIND_TEXT[item.kind] || item.kind}${item.decision_type ? ` · ${htmlEscape(item.decision_type)}` : ''}${item.call_type ? ` · ${htmlEscape(item.call_type)}` : ''}</td>
+                <td class="px-6 py-4 text-sm text-gray-800">${htmlEscape(item.session_id ?? '')}${item.role ? `<div class="text-xs text-gray-500">${htmlEscape(item.role)}</div>` : ''}</td>
+                <td class="px-6 py-4 text-sm text-gray-600">${item.snippet}</td>
+                <td class="px-6 py-4">
+                    ${item.kind === 'chat' ? '' : `<button class="text-blue-500 hover:text-blue-700" onclick="showSearchResult(${index})"><i class="fas fa-eye mr-1"></i>查看</button>`}
+                </td>
+            </tr>
+        `).join('');
+    } catch (error) {
+        status.textContent = '搜索失败';
+        console.error('Failed to search:', error);
+    }
+}
+
+// 交互记录显示完整响应；决策显示提示词（从关联请求体还原）
+async function showSearchResult(index) {
+    const item = searchResults[index];
+    if (!item) return;
+    try {
+        if (item.kind === 'ai_log') {
+            const detail = await API.getAILogDetail(item.id);
+            showDetail('响应详情', detail.response_body ?? '(无内容)');
+        } else {
+            const data = await API.getDecisionPrompt(item.id);
+            showDetail('决策提示词', data.prompt ?? '(无内容)');
+        }
+    } catch (error) {
+        console.error('Failed to load search result:', error);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const input = document.getElementById('search-query');
+    if (input) input.addEventListener('keydown', (e) => { if (e.key === 'Enter') runSearch(); });
+});